@@ -0,0 +1,100 @@
+"""
+Admission control for expensive endpoints.
+
+Each lane admits a fixed number of concurrent requests and lets a bounded
+number wait for a short time. When the lane is full a request is rejected at
+once with 429; one that waited and still found no free slot gets 503. Both
+carry a Retry-After hint, so heavy work sheds load before it reaches Neo4j and
+cheap endpoints, which have no lane, keep their latency.
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+
+class Rejected(Exception):
+    def __init__(self, lane: str, status: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.lane = lane
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """One admitted request; release exactly once."""
+
+    __slots__ = ("_lane", "_released")
+
+    def __init__(self, lane: "Lane"):
+        self._lane = lane
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._lane._release()
+
+
+class Lane:
+    def __init__(self, name: str, limit: int, queue: int = 0, wait_seconds: float = 1.0,
+                 retry_after: int = 1):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.wait_seconds = wait_seconds
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> Ticket:
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                return Ticket(self)
+            if self.waiting >= self.queue:
+                self.rejected += 1
+                raise Rejected(self.name, 429, self.retry_after, f"too many concurrent {self.name} requests")
+            self.waiting += 1
+            deadline = time.monotonic() + self.wait_seconds
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise Rejected(self.name, 503, self.retry_after, f"{self.name} capacity exhausted")
+                    self._cond.wait(remaining)
+                self.active += 1
+                return Ticket(self)
+            finally:
+                self.waiting -= 1
+
+    def _release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+class Admission:
+    def __init__(self):
+        self.lanes: Dict[str, Lane] = {}
+
+    def add(self, lane: Lane) -> Lane:
+        self.lanes[lane.name] = lane
+        return lane
+
+    def acquire(self, name: str) -> Optional[Ticket]:
+        """A ticket for lane ``name``, or None when the lane is not limited."""
+        lane = self.lanes.get(name)
+        return lane.acquire() if lane else None
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """'lists=2,paths=4' -> {'lists': 2, 'paths': 4}; malformed entries are ignored."""
+    limits = {}
+    for item in (spec or "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip().isdigit():
+            limits[name.strip()] = int(value)
+    return limits
@@ -1,12 +1,30 @@
-from flask import Flask, Response, request, jsonify,stream_with_context
+from flask import Flask, Response, request, jsonify,stream_with_context, send_file
 from flask_cors import CORS
+import functools
+import hashlib
+import math
 import os
+import tempfile
 from dotenv import load_dotenv
 import time
+from datetime import datetime, timezone
 import json
 import csv
 import io
-from database import Neo4jDriver, seed_data
+from database import Neo4jDriver, seed_data, AMOUNT_BUCKET_EDGES, FACET_INTERVALS, LANE_HEAVY
+from ingest import IngestQueue, DurableIngest, ReceiptStore, RecentKeys, QueueFull
+from wal import WriteAheadLog
+from jobs import JobRegistry
+from export_jobs import ExportJobs, FORMATS as EXPORT_FORMATS
+from scoring import RiskScorer, ScoringPipeline
+from singleflight import SingleFlight
+from admission import Admission, Lane, Rejected, parse_limits
+import archive
+import compression
+import entity_resolution
+import cycles
+import centrality
+import metrics
 from models import (
     User, Transaction, UserRelationships, TransactionRelationships,
     ShortestPathResponse, TransactionClustersResponse, Statistics
@@ -23,12 +41,82 @@ neo4j_uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 neo4j_user = os.getenv("NEO4J_USER", "neo4j")
 neo4j_pass = os.getenv("NEO4J_PASS", "password")
 seed_data_flag = os.getenv("SEED_DATA", "false").lower() == "true"
+migrate_identifiers_flag = os.getenv("MIGRATE_IDENTIFIER_NODES", "false").lower() == "true"
 port = int(os.getenv("PORT", "8080"))
+ingest_mode = os.getenv("INGEST_MODE", "sync").lower()
+ingest_queue_size = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+ingest_batch_size = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+ingest_flush_ms = int(os.getenv("INGEST_FLUSH_MS", "50"))
+wal_dir = os.getenv("INGEST_WAL_DIR", "")
+wal_segment_mb = int(os.getenv("INGEST_WAL_SEGMENT_MB", "16"))
+wal_fsync_ms = int(os.getenv("INGEST_WAL_FSYNC_MS", "5"))
+wal_replay_seconds = float(os.getenv("INGEST_WAL_REPLAY_SECONDS", "5"))
+idempotency_cache_size = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "100000"))
+max_batch_size = int(os.getenv("INGEST_MAX_BATCH", "1000"))
+risk_scoring_enabled = os.getenv("RISK_SCORING_ENABLED", "true").lower() == "true"
+risk_max_entities = int(os.getenv("RISK_MAX_ENTITIES", "200000"))
+cycle_max_length = int(os.getenv("CYCLE_MAX_LENGTH", "8"))
+metrics_enabled = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+neo4j_profile = os.getenv("NEO4J_PROFILE", "false").lower() == "true"
+slow_query_ms = float(os.getenv("SLOW_QUERY_MS", "500"))
+job_workers = int(os.getenv("JOB_WORKERS", "2"))
+export_dir = os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "txgraph-exports"))
+export_partition_size = int(os.getenv("EXPORT_PARTITION_SIZE", "50000"))
+export_read_workers = int(os.getenv("EXPORT_READ_WORKERS", "4"))
+export_encode_workers = int(os.getenv("EXPORT_ENCODE_WORKERS", str(os.cpu_count() or 1)))
+delta_lag_ms = int(os.getenv("DELTA_EXPORT_LAG_MS", "5000"))
+list_fetch_size = int(os.getenv("LIST_STREAM_FETCH_SIZE", "2000"))
+relationship_batch_max = int(os.getenv("RELATIONSHIP_BATCH_MAX", "100"))
+analytics_reuse_seconds = float(os.getenv("ANALYTICS_REUSE_SECONDS", "2"))
+graph_version_poll_seconds = float(os.getenv("GRAPH_VERSION_POLL_SECONDS", "1"))
+neo4j_light_timeout = float(os.getenv("NEO4J_LIGHT_TIMEOUT_SECONDS", "10")) or None
+neo4j_heavy_timeout = float(os.getenv("NEO4J_HEAVY_TIMEOUT_SECONDS", "120")) or None
+neo4j_light_pool_size = int(os.getenv("NEO4J_LIGHT_POOL_SIZE", "100"))
+neo4j_heavy_pool_size = int(os.getenv("NEO4J_HEAVY_POOL_SIZE", "16"))
+neo4j_acquisition_timeout = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT_SECONDS", "5"))
+admission_limits = parse_limits(os.getenv("ADMISSION_LIMITS", "lists=2,paths=4,clusters=2,export=2"))
+admission_queue = int(os.getenv("ADMISSION_QUEUE", "4"))
+admission_wait_seconds = float(os.getenv("ADMISSION_WAIT_SECONDS", "1"))
+admission_retry_after = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+compression_enabled = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+compression_min_bytes = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+compression_level = int(os.getenv("COMPRESSION_LEVEL", "6"))
+archive_dir = os.getenv("ARCHIVE_DIR", "")
+archive_hot_days = int(os.getenv("ARCHIVE_HOT_DAYS", "90"))
+archive_batch_size = int(os.getenv("ARCHIVE_BATCH_SIZE", "10000"))
+archive_interval_hours = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "0"))
+archive_compression = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+entity_resolution_enabled = os.getenv("ENTITY_RESOLUTION_ENABLED", "true").lower() == "true"
+entity_threshold = float(os.getenv("ENTITY_RESOLUTION_THRESHOLD", "0.85"))
+entity_batch_size = int(os.getenv("ENTITY_RESOLUTION_BATCH_SIZE", "500"))
+entity_max_block_size = int(os.getenv("ENTITY_RESOLUTION_MAX_BLOCK_SIZE", "200"))
+entity_interval = float(os.getenv("ENTITY_RESOLUTION_INTERVAL_SECONDS", "5"))
+
+if metrics_enabled:
+    metrics.instrument_driver(Neo4jDriver, profile=neo4j_profile, slow_query_ms=slow_query_ms)
+    metrics.instrument_app(app)
+
+if compression_enabled:
+    compression.install(app, min_size=compression_min_bytes, level=compression_level)
 
 # Connect to database
 try:
-    db = Neo4jDriver(neo4j_uri, neo4j_user, neo4j_pass)
+    db = Neo4jDriver(
+        neo4j_uri, neo4j_user, neo4j_pass,
+        light_timeout=neo4j_light_timeout,
+        heavy_timeout=neo4j_heavy_timeout,
+        light_pool_size=neo4j_light_pool_size,
+        heavy_pool_size=neo4j_heavy_pool_size,
+        acquisition_timeout=neo4j_acquisition_timeout,
+        version_poll_seconds=graph_version_poll_seconds
+    )
     print("Connected to Neo4j successfully")
+    db.ensure_schema()
+
+    # Convert pre-existing SHARED_* edges into Device / Email / Phone nodes
+    if migrate_identifiers_flag:
+        db.migrate_identifier_nodes()
+        print("Identifier nodes migrated")
     
     # Seed data if requested
     if seed_data_flag:
@@ -39,6 +127,122 @@ except Exception as e:
     print(f"Database connection failed: {e}")
     exit(1)
 
+# Background jobs; the export encoder processes are forked here, before any
+# other threads are started
+jobs = JobRegistry(max_workers=job_workers)
+graph_exports = ExportJobs(
+    db,
+    jobs,
+    export_dir,
+    partition_size=export_partition_size,
+    read_workers=export_read_workers,
+    encode_workers=export_encode_workers
+)
+graph_exports.load_existing()
+
+# Hot/cold tiering: transactions older than the hot window move to Parquet
+# files and are still served for date ranges that reach back that far
+transaction_archive = None
+retention = None
+if archive_dir:
+    if archive.available():
+        transaction_archive = archive.TransactionArchive(archive_dir, archive_compression)
+        retention = archive.Retention(
+            transaction_archive, db, jobs, archive_hot_days,
+            batch_size=archive_batch_size, interval=archive_interval_hours * 3600
+        )
+        retention.start()
+    else:
+        print("ARCHIVE_DIR is set but pyarrow is not installed; archival is disabled")
+
+# Users are written with normalized identifier keys and blocks; the resolver
+# scores candidates within blocks and links matches in batches
+entity_resolver = None
+if entity_resolution_enabled:
+    entity_resolver = entity_resolution.EntityResolver(
+        db, threshold=entity_threshold, batch_size=entity_batch_size,
+        max_block_size=entity_max_block_size, interval=entity_interval
+    )
+    entity_resolver.start()
+
+receipts = ReceiptStore()
+# Client idempotency keys of recently committed transactions
+recent_keys = RecentKeys(idempotency_cache_size)
+
+# Velocity / anomaly scoring of committed transactions
+scoring = None
+if risk_scoring_enabled:
+    scoring = ScoringPipeline(db, RiskScorer(max_entities=risk_max_entities))
+    scoring.start()
+
+# Write-ahead log: writes are logged before they are applied and replayed
+# if Neo4j was unavailable
+wal = None
+durable_ingest = None
+if wal_dir:
+    wal = WriteAheadLog(
+        wal_dir,
+        segment_bytes=wal_segment_mb * 1024 * 1024,
+        fsync_interval=wal_fsync_ms / 1000.0
+    )
+    durable_ingest = DurableIngest(
+        db, wal, receipts, replay_interval=wal_replay_seconds,
+        recent_keys=recent_keys, scoring=scoring
+    )
+    try:
+        replayed = durable_ingest.replay_pending(older_than=0)
+        if replayed:
+            print(f"Replayed {replayed} logged writes")
+    except Exception as e:
+        print(f"WAL replay failed, will retry in background: {e}")
+    durable_ingest.start()
+
+# Write-behind queue used by asynchronous transaction ingestion
+ingest_queue = IngestQueue(
+    db,
+    receipts,
+    max_size=ingest_queue_size,
+    batch_size=ingest_batch_size,
+    flush_interval=ingest_flush_ms / 1000.0,
+    wal=wal,
+    recent_keys=recent_keys,
+    scoring=scoring
+)
+ingest_queue.start()
+
+metrics.registry.register(metrics.Gauge(
+    "ingest_queue_depth", "Transactions waiting in the write-behind queue", ingest_queue.depth))
+idempotent_replays = metrics.registry.register(metrics.Counter(
+    "ingest_idempotent_replays_total", "Retried transactions answered from the recent-keys cache"))
+if scoring:
+    metrics.registry.register(metrics.Gauge(
+        "risk_scores_pending", "Risk scores waiting to be written to Neo4j", scoring.depth))
+    metrics.registry.register(metrics.Gauge(
+        "risk_scorer_tracked_entities", "Users, devices and pairs with velocity counters",
+        scoring.scorer.tracked))
+if wal:
+    metrics.registry.register(metrics.Gauge(
+        "ingest_wal_unacked_records", "Logged writes not yet applied to Neo4j", wal.unacked_count))
+
+# Identical concurrent analytics requests share one query and one encoded body
+analytics_flight = SingleFlight(reuse_seconds=analytics_reuse_seconds)
+coalesced_requests = metrics.registry.register(metrics.Counter(
+    "analytics_requests_total", "Analytics requests by how they were answered",
+    ("endpoint", "source")))
+
+# Concurrency limits for the endpoints that read large parts of the graph;
+# endpoints without a lane are never throttled
+admission = Admission()
+for lane_name, limit in admission_limits.items():
+    if limit > 0:
+        lane = admission.add(Lane(lane_name, limit, queue=admission_queue,
+                                  wait_seconds=admission_wait_seconds, retry_after=admission_retry_after))
+        metrics.registry.register(metrics.Gauge(
+            f"admission_{lane_name}_active", f"Requests running in the {lane_name} lane",
+            lambda lane=lane: lane.active))
+admission_rejections = metrics.registry.register(metrics.Counter(
+    "admission_rejections_total", "Requests turned away by admission control", ("lane", "status")))
+
 
 # Helper function to convert dataclass to dict
 def to_dict(obj):
@@ -64,6 +268,79 @@ def to_dict(obj):
     return obj
 
 
+# ===== METRICS =====
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ===== ADMISSION AND CONDITIONAL GET =====
+
+def rejected_response(e):
+    admission_rejections.inc(e.lane, str(e.status))
+    return jsonify({"error": str(e)}), e.status, {"Retry-After": str(e.retry_after)}
+
+
+def admit(lane, handler):
+    """
+    Run ``handler`` holding a slot in ``lane``. A streamed response keeps
+    its slot until the stream is closed.
+    """
+    try:
+        ticket = admission.acquire(lane)
+    except Rejected as e:
+        return rejected_response(e)
+    if ticket is None:
+        return handler()
+    try:
+        response = app.make_response(handler())
+    except BaseException:
+        ticket.release()
+        raise
+    if response.is_streamed:
+        response.call_on_close(ticket.release)
+    else:
+        ticket.release()
+    return response
+
+
+def versioned(fn=None, *, scores=False):
+    """
+    Conditional GET for a read route. The ETag combines the graph version
+    (bumped by every write through the driver, see GraphVersion) with the
+    request URL and Accept header, so a matching If-None-Match is answered
+    with 304 before the route runs or Neo4j is queried. Routes that show
+    risk or centrality scores pass ``scores=True`` to include score writes.
+    """
+    if fn is None:
+        return functools.partial(versioned, scores=scores)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = f"{request.full_path}|{request.headers.get('Accept', '')}"
+        etag = f"{db.version.current(scores)}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+        response = app.make_response(fn(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag, weak=True)
+        return response
+    return wrapper
+
+
+def admitted(lane):
+    """Route decorator: the whole handler runs under admission control."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return admit(lane, lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
 # ===== USER ROUTES =====
 
 @app.route('/api/users', methods=['POST'])
@@ -77,13 +354,19 @@ def create_user():
         if not all([name, email, phone]):
             return jsonify({"error": "missing required fields"}), 400
         
-        user_id = db.create_user(name, email, phone)
+        if durable_ingest:
+            user_id, key = durable_ingest.create_user(name, email, phone)
+            if user_id is None:
+                return pending_response(key)
+        else:
+            user_id = db.create_user(name, email, phone)
         return jsonify({"id": user_id}), 201
     except Exception as e:
         return jsonify({"error": "create user failed"}), 500
 
 
 @app.route('/api/users', methods=['GET'])
+@versioned
 def get_all_users():
     try:
         # Check if pagination parameters are provided
@@ -97,18 +380,92 @@ def get_all_users():
             return jsonify({
                 "data": [to_dict(u) for u in result["data"]],
                 "total": result["total"],
+                "totalIsApproximate": result["totalIsApproximate"],
                 "page": result["page"],
                 "pageSize": result["pageSize"],
-                "totalPages": result["totalPages"]
+                "totalPages": result["totalPages"],
+                "hasMore": result["hasMore"],
+                "nextPage": result["nextPage"]
             }), 200
         else:
-            # Return all users (backward compatibility)
-            users = db.get_all_users()
-            return jsonify([to_dict(u) for u in users]), 200
+            # Return all users (backward compatibility), streamed
+            return admit("lists", lambda: stream_list(db.stream_users(list_fetch_size)))
     except Exception as e:
         return jsonify({"error": "fetch users failed"}), 500
 
 
+@app.route('/api/users/search', methods=['GET'])
+@versioned
+def search_users():
+    try:
+        query = request.args.get('q', default='', type=str)
+        page = request.args.get('page', default=1, type=int)
+        page_size = request.args.get('pageSize', default=20, type=int)
+        result = db.search_users(query, page, page_size)
+        return jsonify(search_response(result)), 200
+    except Exception as e:
+        return jsonify({"error": "search users failed"}), 500
+
+
+def wants_ndjson():
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+
+def stream_list(records, chunk_records=500):
+    """
+    Stream a full list as NDJSON (one record per line) when the client asks
+    for it, otherwise as one JSON array. Either way records are encoded as the
+    Neo4j result is consumed, so memory stays flat however large the list is.
+    """
+    records = iter(records)
+    # Pull the first record now so connection and query errors still become a 500
+    first = next(records, None)
+    ndjson = wants_ndjson()
+
+    def encoded():
+        if first is None:
+            return
+        yield json.dumps(to_dict(first), default=str)
+        for record in records:
+            yield json.dumps(to_dict(record), default=str)
+
+    def generate():
+        # Records are written in chunks rather than one write per record
+        separator = "\n" if ndjson else ","
+        chunk = []
+        started = False
+        if not ndjson:
+            yield "["
+        for line in encoded():
+            chunk.append(line)
+            if len(chunk) >= chunk_records:
+                yield (separator if started else "") + separator.join(chunk)
+                started = True
+                chunk = []
+        if chunk:
+            yield (separator if started else "") + separator.join(chunk)
+            started = True
+        yield ("\n" if started else "") if ndjson else "]"
+
+    mimetype = "application/x-ndjson" if ndjson else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def search_response(result):
+    return {
+        "data": [dict(to_dict(hit.node), score=hit.score) for hit in result["data"]],
+        "total": result["total"],
+        "totalIsApproximate": result["totalIsApproximate"],
+        "page": result["page"],
+        "pageSize": result["pageSize"],
+        "totalPages": result["totalPages"],
+        "hasMore": result["hasMore"],
+        "nextPage": result["nextPage"]
+    }
+
+
 # ===== TRANSACTION ROUTES =====
 
 @app.route('/api/transactions', methods=['POST'])
@@ -122,20 +479,176 @@ def create_transaction():
         timestamp = data.get('timestamp')
         description = data.get('description', '')
         device_id = data.get('deviceId', '')
+        external_id = request.headers.get('Idempotency-Key') or data.get('externalId')
         
         if not all([from_user_id, to_user_id, amount, timestamp]):
             return jsonify({"error": "missing required fields"}), 400
-        
-        tx_id = db.create_transaction(
-            from_user_id, to_user_id, amount,
-            currency, timestamp, description, device_id
-        )
-        return jsonify({"id": tx_id}), 201
+        amount, timestamp, error = parse_transaction_fields(amount, timestamp)
+        if error:
+            return jsonify({"error": error}), 400
+
+        # A retry of a recently committed request never reaches Neo4j
+        if external_id:
+            existing_id = recent_keys.get(external_id)
+            if existing_id is not None:
+                idempotent_replays.inc()
+                response = jsonify({"id": existing_id})
+                response.headers["Idempotent-Replayed"] = "true"
+                return response, 201
+
+        if wants_async_ingest():
+            receipt_id = ingest_queue.submit({
+                "fromId": from_user_id,
+                "toId": to_user_id,
+                "amount": amount,
+                "currency": currency,
+                "timestamp": timestamp,
+                "description": description,
+                "deviceId": device_id,
+                "externalId": external_id
+            })
+            response = jsonify({"receiptId": receipt_id, "status": "queued"})
+            response.headers["Location"] = f"/api/transactions/receipts/{receipt_id}"
+            return response, 202
+
+        if durable_ingest:
+            tx_id, created, key = durable_ingest.create_transaction(
+                from_user_id, to_user_id, amount,
+                currency, timestamp, description, device_id,
+                external_id=external_id
+            )
+            if tx_id is None:
+                return pending_response(key)
+        else:
+            tx_id, created = db.create_transaction(
+                from_user_id, to_user_id, amount,
+                currency, timestamp, description, device_id,
+                external_id=external_id
+            )
+        recent_keys.put(external_id, tx_id)
+        body = {"id": tx_id}
+        # A replay that missed the recent-keys cache was scored when it was created
+        if scoring and created:
+            score, reasons = scoring.observe(tx_id, {
+                "fromId": from_user_id, "toId": to_user_id, "amount": amount,
+                "deviceId": device_id, "timestamp": timestamp
+            })
+            body.update(riskScore=score, riskReasons=reasons)
+        return jsonify(body), 201
+    except QueueFull:
+        response = jsonify({"error": "ingest queue is full"})
+        response.headers["Retry-After"] = "1"
+        return response, 503
     except Exception as e:
         return jsonify({"error": "create transaction failed"}), 500
 
 
+@app.route('/api/transactions/batch', methods=['POST'])
+def create_transactions_batch():
+    try:
+        data = request.get_json(silent=True)
+        items = data.get('transactions') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "expected a non-empty list of transactions"}), 400
+        if len(items) > max_batch_size:
+            return jsonify({"error": f"at most {max_batch_size} transactions per batch"}), 400
+
+        results = [None] * len(items)
+        pending = []
+        for i, item in enumerate(items):
+            if not isinstance(item, dict) or not all(
+                item.get(k) for k in ('fromUserId', 'toUserId', 'amount', 'timestamp')
+            ):
+                results[i] = {"status": "failed", "error": "missing required fields"}
+                continue
+            amount, timestamp, error = parse_transaction_fields(item['amount'], item['timestamp'])
+            if error:
+                results[i] = {"status": "failed", "error": error}
+                continue
+            external_id = item.get('externalId')
+            existing_id = recent_keys.get(external_id) if external_id else None
+            if existing_id is not None:
+                idempotent_replays.inc()
+                results[i] = {"id": existing_id, "externalId": external_id, "status": "committed"}
+                continue
+            pending.append((i, {
+                "fromId": item['fromUserId'],
+                "toId": item['toUserId'],
+                "amount": amount,
+                "currency": item.get('currency', 'USD'),
+                "timestamp": timestamp,
+                "description": item.get('description', ''),
+                "deviceId": item.get('deviceId', ''),
+                "externalId": external_id
+            }))
+
+        if pending:
+            written = db.create_transactions_batch([row for _, row in pending])
+            for (i, row), result in zip(pending, written):
+                if result is None:
+                    results[i] = {"externalId": row["externalId"], "status": "failed", "error": "user not found"}
+                else:
+                    tx_id, created = result
+                    recent_keys.put(row["externalId"], tx_id)
+                    results[i] = {"id": tx_id, "externalId": row["externalId"], "status": "committed"}
+                    if scoring and created:
+                        score, reasons = scoring.observe(tx_id, row)
+                        results[i].update(riskScore=score, riskReasons=reasons)
+        return jsonify({"results": results}), 200
+    except Exception as e:
+        return jsonify({"error": "create transactions failed"}), 500
+
+
+def parse_transaction_fields(amount, timestamp):
+    """
+    ``(amount, timestamp, error)``: the amount as a finite float and the
+    timestamp as ISO 8601 Neo4j's datetime() accepts, so a malformed row is
+    rejected here instead of failing the write it would be batched into.
+    """
+    if isinstance(amount, bool):
+        return None, None, "amount must be a number"
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return None, None, "amount must be a number"
+    if not math.isfinite(amount):
+        return None, None, "amount must be a number"
+    if not isinstance(timestamp, str):
+        return None, None, "timestamp must be an ISO 8601 string"
+    try:
+        parsed = datetime.fromisoformat(timestamp.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None, None, "timestamp must be an ISO 8601 string"
+    return amount, parsed.isoformat(), None
+
+
+def wants_async_ingest():
+    # INGEST_MODE=async makes it the default; clients can opt in per request
+    if request.args.get('async', '').lower() in ('1', 'true'):
+        return True
+    if 'respond-async' in request.headers.get('Prefer', ''):
+        return True
+    return ingest_mode == 'async'
+
+
+def pending_response(key):
+    # Logged but not applied yet; the WAL replayer commits it once Neo4j is back
+    response = jsonify({"receiptId": key, "status": "pending"})
+    response.headers["Location"] = f"/api/ingest/receipts/{key}"
+    return response, 202
+
+
+@app.route('/api/ingest/receipts/<receipt_id>', methods=['GET'])
+@app.route('/api/transactions/receipts/<receipt_id>', methods=['GET'])
+def get_transaction_receipt(receipt_id):
+    receipt = receipts.get(receipt_id)
+    if not receipt:
+        return jsonify({"error": "receipt not found"}), 404
+    return jsonify(receipt), 200
+
+
 @app.route('/api/transactions', methods=['GET'])
+@versioned
 def get_all_transactions():
     try:
         # Check if pagination parameters are provided
@@ -158,22 +671,126 @@ def get_all_transactions():
                 min_amount, max_amount, currency,
                 start_date, end_date, description_query, device_query
             )
+            data = [to_dict(t) for t in result["data"]]
+            total = result["total"]
+
+            # Ranges reaching past the hot window continue into the archive;
+            # archived rows are all older, so they follow the hot ones
+            if transaction_archive and transaction_archive.covers(start_date, end_date):
+                archived, archived_total = transaction_archive.query(
+                    max(0, (page - 1) * page_size - total), page_size - len(data),
+                    min_amount, max_amount, currency,
+                    start_date, end_date, description_query, device_query
+                )
+                data.extend(dict(to_dict(t), archived=True) for t in archived)
+                total += archived_total
+
             return jsonify({
-                "data": [to_dict(t) for t in result["data"]],
-                "total": result["total"],
-                "page": result["page"],
-                "pageSize": result["pageSize"],
-                "totalPages": result["totalPages"]
+                "data": data,
+                "total": total,
+                "page": page,
+                "pageSize": page_size,
+                "totalPages": (total + page_size - 1) // page_size
             }), 200
         else:
-            # Return all transactions (backward compatibility)
-            transactions = db.get_all_transactions()
-            return jsonify([to_dict(t) for t in transactions]), 200
+            # Return all transactions (backward compatibility), streamed
+            return admit("lists", lambda: stream_list(db.stream_transactions(list_fetch_size)))
     except Exception as e:
         return jsonify({"error": "fetch transactions failed"}), 500
 
 
+@app.route('/api/transactions/search', methods=['GET'])
+@versioned
+def search_transactions():
+    try:
+        query = request.args.get('q', default='', type=str)
+        page = request.args.get('page', default=1, type=int)
+        page_size = request.args.get('pageSize', default=20, type=int)
+        result = db.search_transactions(query, page, page_size)
+        return jsonify(search_response(result)), 200
+    except Exception as e:
+        return jsonify({"error": "search transactions failed"}), 500
+
+
+@app.route('/api/transactions/risky', methods=['GET'])
+@versioned(scores=True)
+def get_risky_transactions():
+    try:
+        limit = min(request.args.get('limit', default=50, type=int), 1000)
+        min_score = request.args.get('minScore', default=0.0, type=float)
+        risky = db.get_risky_transactions(limit, min_score)
+        return jsonify([
+            dict(to_dict(r.transaction), riskScore=r.riskScore, riskReasons=r.riskReasons)
+            for r in risky
+        ]), 200
+    except Exception as e:
+        return jsonify({"error": "fetch risky transactions failed"}), 500
+
+
+@app.route('/api/transactions/facets', methods=['GET'])
+@versioned
+def get_transaction_facets():
+    try:
+        filters = (
+            request.args.get('minAmount', type=float),
+            request.args.get('maxAmount', type=float),
+            request.args.get('currency', type=str),
+            request.args.get('startDate', type=str),
+            request.args.get('endDate', type=str),
+            request.args.get('description', type=str),
+            request.args.get('deviceId', type=str),
+        )
+        interval = request.args.get('interval', default='month', type=str)
+        if interval not in FACET_INTERVALS:
+            return jsonify({"error": f"interval must be one of: {', '.join(FACET_INTERVALS)}"}), 400
+        top_devices = min(max(request.args.get('topDevices', default=10, type=int), 1), 100)
+
+        def build():
+            parts = [db.get_transaction_facets(*filters, interval=interval, top_devices=top_devices)]
+            # Same rule as the listing: date filters before the watermark
+            # also count archived transactions
+            if transaction_archive and transaction_archive.covers(filters[3], filters[4]):
+                parts.append(transaction_archive.facets(interval, top_devices, AMOUNT_BUCKET_EDGES, *filters))
+            return dict(facet_response(parts, top_devices), interval=interval, includesArchive=len(parts) > 1)
+
+        return coalesced(("transactions/facets", filters, interval, top_devices), build)
+    except Exception as e:
+        return jsonify({"error": "fetch transaction facets failed"}), 500
+
+
+def facet_response(parts, top_devices):
+    """Sum facet counts from the graph and the archive into the response shape."""
+    def merged(facet, key):
+        totals = {}
+        for part in parts:
+            for entry in part[facet]:
+                totals[entry[key]] = totals.get(entry[key], 0) + entry["count"]
+        return totals
+
+    def largest_first(totals):
+        return [{"value": v, "count": n} for v, n in sorted(totals.items(), key=lambda i: (-i[1], i[0]))]
+
+    buckets = merged("amounts", "bucket")
+    edges = AMOUNT_BUCKET_EDGES
+    return {
+        "total": sum(part["total"] for part in parts),
+        "currencies": largest_first(merged("currencies", "value")),
+        # Every bucket, empty ones included, so the histogram has a fixed shape
+        "amounts": [
+            {
+                "min": edges[i - 1] if i else None,
+                "max": edges[i] if i < len(edges) else None,
+                "count": buckets.get(i, 0)
+            }
+            for i in range(len(edges) + 1)
+        ],
+        "dates": [{"period": p, "count": n} for p, n in sorted(merged("dates", "period").items())],
+        "devices": largest_first(merged("devices", "value"))[:top_devices],
+    }
+
+
 @app.route('/api/transactions/currencies', methods=['GET'])
+@versioned
 def get_currencies():
     try:
         currencies = db.get_all_currencies()
@@ -182,9 +799,32 @@ def get_currencies():
         return jsonify({"error": "fetch currencies failed"}), 500
 
 
+# ===== DEVICE ROUTES =====
+
+@app.route('/api/devices/<device_id>/transactions', methods=['GET'])
+@versioned
+def get_device_transactions(device_id):
+    try:
+        page = request.args.get('page', default=1, type=int)
+        page_size = request.args.get('pageSize', default=20, type=int)
+        result = db.get_device_transactions(device_id, page, page_size)
+        if result is None:
+            return jsonify({"error": "device not found"}), 404
+        return jsonify({
+            "data": [to_dict(t) for t in result["data"]],
+            "total": result["total"],
+            "page": result["page"],
+            "pageSize": result["pageSize"],
+            "totalPages": result["totalPages"]
+        }), 200
+    except Exception as e:
+        return jsonify({"error": "fetch device transactions failed"}), 500
+
+
 # ===== RELATIONSHIP ROUTES =====
 
 @app.route('/api/relationships/user/<int:user_id>', methods=['GET'])
+@versioned
 def get_user_relationships(user_id):
     try:
         user, connections = db.get_user_relationships(user_id)
@@ -194,7 +834,20 @@ def get_user_relationships(user_id):
         return jsonify({"error": "fetch user relationships failed"}), 500
 
 
+@app.route('/api/relationships/user/<int:user_id>/entities', methods=['GET'])
+@versioned
+def get_user_entities(user_id):
+    try:
+        matches = db.get_entity_matches(user_id)
+        if matches is None:
+            return jsonify({"error": "user not found"}), 404
+        return jsonify({"userId": user_id, "matches": [to_dict(m) for m in matches]}), 200
+    except Exception as e:
+        return jsonify({"error": "fetch user entities failed"}), 500
+
+
 @app.route('/api/relationships/transaction/<int:tx_id>', methods=['GET'])
+@versioned
 def get_transaction_relationships(tx_id):
     try:
         transaction, connections = db.get_transaction_relationships(tx_id)
@@ -204,9 +857,60 @@ def get_transaction_relationships(tx_id):
         return jsonify({"error": "fetch transaction relationships failed"}), 500
 
 
+def parse_id_batch(data):
+    """Distinct integer ids from ``{"ids": [...]}``, or an error message."""
+    ids = (data or {}).get('ids')
+    if not isinstance(ids, list) or not ids:
+        return None, "ids must be a non-empty list"
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return None, "ids must be integers"
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > relationship_batch_max:
+        return None, f"at most {relationship_batch_max} ids per request"
+    return ids, None
+
+
+@app.route('/api/relationships/users:batch', methods=['POST'])
+def get_users_relationships_batch():
+    ids, error = parse_id_batch(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        found = db.get_users_relationships(ids)
+        return jsonify({
+            "data": {
+                str(user_id): to_dict(UserRelationships(user=user, connections=connections))
+                for user_id, (user, connections) in found.items()
+            },
+            "missing": [i for i in ids if i not in found]
+        }), 200
+    except Exception as e:
+        return jsonify({"error": "fetch user relationships failed"}), 500
+
+
+@app.route('/api/relationships/transactions:batch', methods=['POST'])
+def get_transactions_relationships_batch():
+    ids, error = parse_id_batch(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        found = db.get_transactions_relationships(ids)
+        return jsonify({
+            "data": {
+                str(tx_id): to_dict(TransactionRelationships(transaction=transaction, connections=connections))
+                for tx_id, (transaction, connections) in found.items()
+            },
+            "missing": [i for i in ids if i not in found]
+        }), 200
+    except Exception as e:
+        return jsonify({"error": "fetch transaction relationships failed"}), 500
+
+
 # ===== ANALYTICS ROUTES =====
 
 @app.route('/api/analytics/shortest-path/users/<int:from_id>/<int:to_id>', methods=['GET'])
+@versioned
+@admitted("paths")
 def get_user_shortest_path(from_id, to_id):
     try:
         segments = db.shortest_path_segments(from_id, to_id)
@@ -218,21 +922,213 @@ def get_user_shortest_path(from_id, to_id):
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/analytics/cycles', methods=['GET'])
+@versioned
+@admitted("paths")
+def get_user_cycles():
+    params, error = cycle_params(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    user_id = request.args.get('userId', type=int)
+    if user_id is None:
+        return jsonify({
+            "error": "userId is required; whole-graph scans run as jobs via POST /api/analytics/cycles/jobs"
+        }), 400
+    try:
+        result = cycles.user_cycles(db, user_id, params["maxLength"], params["minAmount"], params["windowMillis"])
+        return jsonify(dict(result, userId=user_id, **params)), 200
+    except Exception as e:
+        return jsonify({"error": "cycle search failed"}), 500
+
+
+@app.route('/api/analytics/cycles/jobs', methods=['POST'])
+def create_cycle_job():
+    params, error = cycle_params(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({"error": error}), 400
+    job = jobs.submit("cycles", lambda job: cycles.scan_cycles(
+        db, job, params["maxLength"], params["minAmount"], params["windowMillis"]
+    ), params)
+    response = jsonify(cycle_job_response(job, 1, 50))
+    response.headers["Location"] = f"/api/analytics/cycles/jobs/{job.id}"
+    return response, 202
+
+
+@app.route('/api/analytics/cycles/jobs/<job_id>', methods=['GET'])
+def get_cycle_job(job_id):
+    job = jobs.get(job_id)
+    if not job or job.kind != "cycles":
+        return jsonify({"error": "cycle job not found"}), 404
+    page = max(request.args.get('page', default=1, type=int), 1)
+    page_size = min(max(request.args.get('pageSize', default=50, type=int), 1), 1000)
+    return jsonify(cycle_job_response(job, page, page_size)), 200
+
+
+def cycle_params(args):
+    """maxLength / minAmount / window from query args or a JSON body."""
+    try:
+        max_length = int(args.get('maxLength', 4))
+        min_amount = float(args.get('minAmount', 0))
+    except (TypeError, ValueError):
+        return None, "maxLength and minAmount must be numbers"
+    if not 2 <= max_length <= cycle_max_length:
+        return None, f"maxLength must be between 2 and {cycle_max_length}"
+    window_ms = cycles.parse_duration(str(args.get('window', '24h')))
+    if not window_ms:
+        return None, "window must be a duration like 90s, 30m, 24h or 7d"
+    return {"maxLength": max_length, "minAmount": min_amount, "windowMillis": window_ms}, None
+
+
+def cycle_job_response(job, page, page_size):
+    # The full result can be large; only one page of it is returned
+    body = job.to_dict()
+    result = body.pop("result") or {}
+    found = result.get("cycles", [])
+    body.update({
+        "data": found[(page - 1) * page_size:page * page_size],
+        "total": len(found),
+        "truncated": result.get("truncated", False),
+        "page": page,
+        "pageSize": page_size,
+        "totalPages": (len(found) + page_size - 1) // page_size
+    })
+    return body
+
+
+@app.route('/api/analytics/centrality/jobs', methods=['POST'])
+def create_centrality_job():
+    data = request.get_json(silent=True) or {}
+    algorithms = data.get('algorithms', list(centrality.ALGORITHMS))
+    engine = data.get('engine', 'auto')
+    if not isinstance(algorithms, list) or not algorithms or \
+            any(a not in centrality.ALGORITHMS for a in algorithms):
+        return jsonify({"error": f"algorithms must be a list of: {', '.join(centrality.ALGORITHMS)}"}), 400
+    if engine not in centrality.ENGINES:
+        return jsonify({"error": f"engine must be one of: {', '.join(centrality.ENGINES)}"}), 400
+    job = jobs.submit(
+        "centrality",
+        lambda job: centrality.run(db, job, algorithms, engine),
+        {"algorithms": algorithms, "engine": engine}
+    )
+    response = jsonify(job.to_dict())
+    response.headers["Location"] = f"/api/analytics/centrality/jobs/{job.id}"
+    return response, 202
+
+
+@app.route('/api/analytics/centrality/jobs/<job_id>', methods=['GET'])
+def get_centrality_job(job_id):
+    job = jobs.get(job_id)
+    if not job or job.kind != "centrality":
+        return jsonify({"error": "centrality job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.route('/api/analytics/rankings', methods=['GET'])
+@versioned(scores=True)
+def get_user_rankings():
+    try:
+        metric = request.args.get('metric', default='pageRank', type=str)
+        if metric not in centrality.ALGORITHMS:
+            return jsonify({"error": f"metric must be one of: {', '.join(centrality.ALGORITHMS)}"}), 400
+        page = max(request.args.get('page', default=1, type=int), 1)
+        page_size = min(max(request.args.get('pageSize', default=20, type=int), 1), 1000)
+        result = db.get_user_rankings(metric, page, page_size)
+        return jsonify(dict(search_response(result), metric=metric)), 200
+    except Exception as e:
+        return jsonify({"error": "fetch rankings failed"}), 500
+
+
+def coalesced(key, build, lane=None):
+    """
+    Answer through the analytics single-flight: ``key`` is the endpoint name
+    followed by its normalized parameters, ``build`` returns the payload (or
+    None for "not found"). The payload is encoded once and the same bytes are
+    sent to every request that shared or reused it. Only the request that runs
+    ``build`` takes a slot in ``lane``; when it is rejected, so are the
+    requests waiting on it.
+
+    The key is prefixed with the graph version read before ``build`` runs, so
+    a request only joins or reuses a result at least as new as the version its
+    ETag was computed from; a write in between starts a new flight.
+    """
+    def run():
+        ticket = admission.acquire(lane) if lane else None
+        try:
+            payload = build()
+        finally:
+            if ticket:
+                ticket.release()
+        return None if payload is None else app.json.dumps(payload).encode("utf-8")
+
+    body, source = analytics_flight.do((db.version.current(),) + tuple(key), run)
+    coalesced_requests.inc(key[0], source)
+    if body is None:
+        return None
+    return Response(body, mimetype="application/json", headers={"X-Coalesced": source})
+
+
 @app.route('/api/analytics/transaction-clusters', methods=['GET'])
+@versioned
 def get_transaction_clusters():
     try:
-        clusters = db.cluster_transactions()
-        response = TransactionClustersResponse(clusters=clusters)
-        return jsonify(to_dict(response)), 200
+        return coalesced(
+            ("transaction-clusters",),
+            lambda: to_dict(TransactionClustersResponse(clusters=db.cluster_transactions())),
+            lane="clusters"
+        )
+    except Rejected as e:
+        return rejected_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/analytics/transaction-clusters/summary', methods=['GET'])
+@versioned
+def get_transaction_cluster_summary():
+    try:
+        page = max(request.args.get('page', default=1, type=int), 1)
+        page_size = min(max(request.args.get('pageSize', default=20, type=int), 1), 1000)
+        min_size = max(request.args.get('minSize', default=2, type=int), 1)
+
+        def build():
+            result = db.get_cluster_summaries(page, page_size, min_size)
+            return dict(result, data=[to_dict(c) for c in result["data"]], minSize=min_size)
+
+        return coalesced(("transaction-clusters/summary", page, page_size, min_size), build, lane="clusters")
+    except Rejected as e:
+        return rejected_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/analytics/transaction-clusters/<int:cluster_id>', methods=['GET'])
+@versioned
+def get_transaction_cluster(cluster_id):
+    try:
+        page = max(request.args.get('page', default=1, type=int), 1)
+        page_size = min(max(request.args.get('pageSize', default=50, type=int), 1), 1000)
+
+        def build():
+            result = db.get_cluster_members(cluster_id, page, page_size)
+            if result is None:
+                return None
+            return dict(result, cluster=to_dict(result["cluster"]), data=[to_dict(t) for t in result["data"]])
+
+        response = coalesced(("transaction-clusters/member", cluster_id, page, page_size), build, lane="clusters")
+        if response is None:
+            return jsonify({"error": "Transaction not found"}), 404
+        return response
+    except Rejected as e:
+        return rejected_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/api/analytics/statistics', methods=['GET'])
+@versioned
 def get_statistics():
     try:
-        stats = db.get_statistics()
-        return jsonify(to_dict(stats)), 200
+        return coalesced(("statistics",), lambda: to_dict(db.get_statistics()))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -250,6 +1146,8 @@ def safe(p):
         out[k] = v.isoformat() if hasattr(v, "isoformat") else v
     return json.dumps(out, ensure_ascii=False)
 @app.route("/api/export/csv")
+@versioned(scores=True)
+@admitted("export")
 def export_graph_csv_batched():
     def generate():
         BATCH_SIZE = 10000
@@ -257,72 +1155,207 @@ def export_graph_csv_batched():
         si = io.StringIO()
         writer = csv.writer(si)
 
+        # Bounds and batches go through the driver's heavy lane (timeout + metrics)
+        bounds = db.get_export_bounds(LANE_HEAVY)
+
         yield "# Nodes\n"
         yield "id,type,properties\n"
 
-        with db.driver.session() as session:
-            max_node_id_result = session.run("MATCH (n) RETURN max(id(n)) as m").single()
-            max_node_id = max_node_id_result["m"] if max_node_id_result and max_node_id_result["m"] is not None else -1
-            
-            current_id = 0
-            while current_id <= max_node_id:
-                q_nodes = """
-                MATCH (n)
-                WHERE id(n) >= $start AND id(n) < $end
-                RETURN id(n) AS id, labels(n)[0] AS type, properties(n) AS props
-                """
-                result = session.run(q_nodes, start=current_id, end=current_id + BATCH_SIZE)
-                
-                chunk_exists = False
-                for rec in result:
-                    chunk_exists = True
-                    props_str = json.dumps(rec["props"], default=str, ensure_ascii=False)
-                    writer.writerow([rec["id"], rec["type"], props_str])
-                
-                if chunk_exists:
-                    yield si.getvalue()
-                    si.seek(0)
-                    si.truncate(0)
-                
-                current_id += BATCH_SIZE
+        current_id = 0
+        while current_id <= bounds["maxNodeId"]:
+            rows = db.export_partition("nodes", current_id, current_id + BATCH_SIZE, LANE_HEAVY)
+            for node_id, node_type, props in rows:
+                props_str = json.dumps(props, default=str, ensure_ascii=False)
+                writer.writerow([node_id, node_type, props_str])
+
+            if rows:
+                yield si.getvalue()
+                si.seek(0)
+                si.truncate(0)
+
+            current_id += BATCH_SIZE
 
         yield "\n# Relationships\n"
         yield "source_id,source_type,relationship,target_id,target_type\n"
 
-        with db.driver.session() as session:
-            max_rel_id_result = session.run("MATCH ()-[r]->() RETURN max(id(r)) as m").single()
-            max_rel_id = max_rel_id_result["m"] if max_rel_id_result and max_rel_id_result["m"] is not None else -1
-            
-            current_id = 0
-            while current_id <= max_rel_id:
-                q_rels = """
-                MATCH (a)-[r]->(b)
-                WHERE id(r) >= $start AND id(r) < $end
-                RETURN id(a) AS src, labels(a)[0] AS srcType,
-                       type(r) AS rel, id(b) AS tgt, labels(b)[0] AS tgtType
-                """
-                result = session.run(q_rels, start=current_id, end=current_id + BATCH_SIZE)
-                
-                chunk_exists = False
-                for rec in result:
-                    chunk_exists = True
-                    writer.writerow([
-                        rec["src"],
-                        rec["srcType"],
-                        rec["rel"],
-                        rec["tgt"],
-                        rec["tgtType"]
-                    ])
-                
-                if chunk_exists:
-                    yield si.getvalue()
-                    si.seek(0)
-                    si.truncate(0)
-
-                current_id += BATCH_SIZE
+        current_id = 0
+        while current_id <= bounds["maxRelationshipId"]:
+            rows = db.export_partition("relationships", current_id, current_id + BATCH_SIZE, LANE_HEAVY)
+            for row in rows:
+                writer.writerow(row)
+
+            if rows:
+                yield si.getvalue()
+                si.seek(0)
+                si.truncate(0)
+
+            current_id += BATCH_SIZE
 
     return Response(stream_with_context(generate()), mimetype="text/csv",
                     headers={"Content-Disposition": "attachment; filename=graph_optimized.csv"})
+
+
+@app.route('/api/export/delta', methods=['GET'])
+@admitted("export")
+def export_delta():
+    since = parse_watermark(request.args.get('since', ''))
+    if since is None:
+        return jsonify({"error": "since must be a watermark (epoch ms) or an ISO 8601 time"}), 400
+    try:
+        # Never move backwards, even if since is ahead of the server clock
+        watermark = max(since, db.get_change_watermark(delta_lag_ms))
+    except Exception as e:
+        return jsonify({"error": "delta export failed"}), 500
+
+    def generate():
+        for kind, rec in db.stream_changes(since, watermark):
+            if kind == "node":
+                line = {"kind": kind, "id": rec["id"], "type": rec["type"], "properties": rec["props"]}
+            else:
+                line = dict(rec, kind=kind)
+            yield json.dumps(line, default=str, ensure_ascii=False) + "\n"
+        # Last line: pass it as ?since= on the next sync
+        yield json.dumps({"kind": "watermark", "watermark": watermark}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"X-Watermark": str(watermark)})
+
+
+def parse_watermark(value):
+    if value.isdigit():
+        return int(value)
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+@app.route('/api/export/jobs', methods=['POST'])
+def create_export_job():
+    try:
+        data = request.get_json(silent=True) or {}
+        fmt = data.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+        job = graph_exports.submit(fmt)
+        response = jsonify(export_job_response(job))
+        response.headers["Location"] = f"/api/export/jobs/{job.id}"
+        return response, 202
+    except Exception as e:
+        return jsonify({"error": "create export job failed"}), 500
+
+
+@app.route('/api/export/jobs/<job_id>', methods=['GET'])
+def get_export_job(job_id):
+    job = jobs.get(job_id)
+    if not job or job.kind != "export":
+        return jsonify({"error": "export job not found"}), 404
+    return jsonify(export_job_response(job)), 200
+
+
+@app.route('/api/export/jobs/<job_id>/download', methods=['GET'])
+def download_export_job(job_id):
+    job = jobs.get(job_id)
+    if not job or job.kind != "export":
+        return jsonify({"error": "export job not found"}), 404
+    if job.status != "completed":
+        return jsonify({"error": "export is not ready", "status": job.status}), 409
+
+    # Columnar exports have one file per table: ?table=users|transactions|edges
+    table = request.args.get('table')
+    path = graph_exports.file_path(job, table)
+    if not path:
+        if "files" in (job.result or {}):
+            return jsonify({"error": f"table must be one of: {', '.join(job.result['files'])}"}), 400
+        return jsonify({"error": "export file not found"}), 404
+    if table:
+        mimetype = EXPORT_FORMATS[job.params['format']]
+        download_name = f"graph-{job.id}-{os.path.basename(path)}"
+    else:
+        mimetype = "application/gzip"
+        download_name = f"graph-{job.id}.{job.params['format']}.gz"
+    # conditional=True answers Range / If-Range requests, so downloads can resume
+    return send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        max_age=0
+    )
+
+
+def export_job_response(job):
+    body = job.to_dict()
+    if job.status == "completed" and job.result:
+        if "files" in job.result:
+            body["downloadUrls"] = {
+                table: f"/api/export/jobs/{job.id}/download?table={table}" for table in job.result["files"]
+            }
+        else:
+            body["downloadUrl"] = f"/api/export/jobs/{job.id}/download"
+    return body
+
+
+# ===== ARCHIVE ROUTES =====
+
+@app.route('/api/archive', methods=['GET'])
+def get_archive():
+    if not transaction_archive:
+        return jsonify({"error": "archive is not enabled"}), 404
+    return jsonify(dict(transaction_archive.info(), hotDays=archive_hot_days)), 200
+
+
+@app.route('/api/archive/jobs', methods=['POST'])
+def create_archive_job():
+    if not retention:
+        return jsonify({"error": "archive is not enabled"}), 404
+    data = request.get_json(silent=True) or {}
+    hot_days = data.get('hotDays', archive_hot_days)
+    if not isinstance(hot_days, int) or isinstance(hot_days, bool) or hot_days < 0:
+        return jsonify({"error": "hotDays must be a non-negative integer"}), 400
+    job = retention.submit(hot_days)
+    response = jsonify(job.to_dict())
+    response.headers["Location"] = f"/api/archive/jobs/{job.id}"
+    return response, 202
+
+
+@app.route('/api/archive/jobs/<job_id>', methods=['GET'])
+def get_archive_job(job_id):
+    job = jobs.get(job_id)
+    if not job or job.kind != archive.JOB_KIND:
+        return jsonify({"error": "archive job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+# ===== ENTITY RESOLUTION ROUTES =====
+
+@app.route('/api/entity-resolution/jobs', methods=['POST'])
+def create_entity_resolution_job():
+    if not entity_resolver:
+        return jsonify({"error": "entity resolution is not enabled"}), 404
+    data = request.get_json(silent=True) or {}
+    backfill = data.get('backfill', True)
+    if not isinstance(backfill, bool):
+        return jsonify({"error": "backfill must be a boolean"}), 400
+    run = entity_resolver.backfill if backfill else entity_resolver.resolve_pending
+    job = jobs.submit(entity_resolution.JOB_KIND, run, {"backfill": backfill})
+    response = jsonify(job.to_dict())
+    response.headers["Location"] = f"/api/entity-resolution/jobs/{job.id}"
+    return response, 202
+
+
+@app.route('/api/entity-resolution/jobs/<job_id>', methods=['GET'])
+def get_entity_resolution_job(job_id):
+    job = jobs.get(job_id)
+    if not job or job.kind != entity_resolution.JOB_KIND:
+        return jsonify({"error": "entity resolution job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=port, debug=False)
 
@@ -0,0 +1,393 @@
+"""
+Hot/cold tiering of transactions.
+
+Transactions older than the hot window are moved out of the graph in batches:
+each batch is written to a zstd-compressed Parquet file first, then, in one
+Neo4j transaction, folded into per-user, per-day DailySummary nodes and
+deleted. ``archive.json`` lists the committed files with their time range and
+the archive watermark (everything before it has left the graph), so the
+transactions API can answer date ranges beyond the hot window from the files.
+
+A file written for a batch whose Neo4j transaction never committed is not
+listed; the next run drops it, or lists it if the batch turns out to be gone
+from the graph. pyarrow is optional; without it archival is unavailable.
+
+Usage:
+    python archive.py --dir ./archive --hot-days 90
+"""
+import argparse
+import functools
+import json
+import operator
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+import columnar
+from jobs import STATUS_QUEUED, STATUS_RUNNING
+from models import Transaction
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+MANIFEST = "archive.json"
+FILES_DIR = "transactions"
+JOB_KIND = "archive"
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def summarize(rows: list) -> List[dict]:
+    """Per-user, per-day (UTC), per-currency sent/received totals of archived rows."""
+    totals = {}
+    for _, from_id, to_id, amount, currency, ts, _, _ in rows:
+        day = columnar.to_utc(ts).date().isoformat()
+        amount = float(amount or 0.0)
+        for user_id, direction in ((from_id, "sent"), (to_id, "received")):
+            key = (user_id, day, currency or "")
+            entry = totals.get(key)
+            if entry is None:
+                entry = totals[key] = {
+                    "userId": user_id, "day": day, "currency": currency or "",
+                    "sentCount": 0, "sentAmount": 0.0, "receivedCount": 0, "receivedAmount": 0.0
+                }
+            entry[f"{direction}Count"] += 1
+            entry[f"{direction}Amount"] += amount
+    return list(totals.values())
+
+
+class TransactionArchive:
+    def __init__(self, directory: str, compression: str = "zstd"):
+        self.directory = directory
+        self.compression = compression
+        self._files_dir = os.path.join(directory, FILES_DIR)
+        os.makedirs(self._files_dir, exist_ok=True)
+        # One archival run at a time; the manifest lock guards reads against a run
+        self._run_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._manifest = self._load()
+
+    # ----- manifest -----
+
+    def _load(self) -> dict:
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return {"watermark": None, "files": []}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save(self):
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self._manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _commit(self, entry: dict):
+        # Rows are archived oldest first, so once a batch is listed nothing
+        # before its newest row is left in the graph: move the watermark up
+        # with it, or listings would miss the rows that already moved
+        with self._lock:
+            self._manifest["files"].append(entry)
+            self._advance(entry["to"])
+            self._save()
+
+    def _advance(self, value: str):
+        current = self._manifest["watermark"]
+        if not current or datetime.fromisoformat(current) < datetime.fromisoformat(value):
+            self._manifest["watermark"] = value
+
+    def watermark(self) -> Optional[datetime]:
+        with self._lock:
+            value = self._manifest["watermark"]
+        return datetime.fromisoformat(value) if value else None
+
+    def info(self) -> dict:
+        with self._lock:
+            files = list(self._manifest["files"])
+            watermark = self._manifest["watermark"]
+        return {
+            "watermark": watermark,
+            "files": len(files),
+            "transactions": sum(f["rows"] for f in files),
+            "bytes": sum(f["bytes"] for f in files),
+            "oldest": min((f["from"] for f in files), default=None),
+            "newest": max((f["to"] for f in files), default=None),
+        }
+
+    def covers(self, start_date: Optional[str], end_date: Optional[str]) -> bool:
+        """True when a filter on [start_date, end_date] reaches before the watermark."""
+        watermark = self.watermark()
+        if watermark is None:
+            return False
+        return any(
+            value and columnar.to_utc(value) < watermark
+            for value in (start_date, end_date)
+        )
+
+    # ----- archival -----
+
+    def run(self, db, cutoff: datetime, batch_size: int = 10000, job=None) -> dict:
+        """Archive every transaction older than ``cutoff`` (aware or UTC)."""
+        if not available():
+            raise RuntimeError("pyarrow is not installed")
+        if not self._run_lock.acquire(blocking=False):
+            raise RuntimeError("an archival run is already in progress")
+        try:
+            self._recover(db)
+            cutoff = columnar.to_utc(cutoff)
+            archived = files = 0
+            start = time.perf_counter()
+            while True:
+                rows = db.get_archivable_transactions(cutoff.isoformat() + "Z", batch_size)
+                if not rows:
+                    break
+                entry = self._write(rows)
+                db.archive_transactions([row[0] for row in rows], summarize(rows))
+                self._commit(entry)
+                # Responses tagged before the rows were listed in the archive
+                # may lack them; make their ETags stale
+                db.version.bump()
+                archived += len(rows)
+                files += 1
+                if job:
+                    job.update(transactions=archived, files=files)
+            with self._lock:
+                self._advance(cutoff.isoformat())
+                self._save()
+            elapsed = time.perf_counter() - start
+            print(f"Archived {archived} transactions into {files} files in {elapsed:.1f}s")
+            return {"transactions": archived, "files": files, "watermark": self._manifest["watermark"]}
+        finally:
+            self._run_lock.release()
+
+    def _write(self, rows: list) -> dict:
+        schema = columnar.schemas()["transactions"]
+        table = pa.Table.from_batches([columnar.record_batch("transactions", schema, rows)])
+        first = columnar.to_utc(rows[0][5])
+        name = f"tx-{first:%Y%m%dT%H%M%S}-{rows[0][0]}-{len(rows)}.parquet"
+        path = os.path.join(self._files_dir, name)
+        pq.write_table(table, path + ".tmp", compression=self.compression)
+        os.replace(path + ".tmp", path)
+        return self._entry(name, table)
+
+    def _entry(self, name: str, table) -> dict:
+        bounds = pc.min_max(table["timestamp"])
+        return {
+            "file": name,
+            "rows": table.num_rows,
+            "bytes": os.path.getsize(os.path.join(self._files_dir, name)),
+            "from": bounds["min"].as_py().isoformat(),
+            "to": bounds["max"].as_py().isoformat(),
+        }
+
+    def _recover(self, db):
+        # Files not in the manifest belong to a batch interrupted after its file
+        # was written: list it if the batch left the graph, otherwise drop it
+        with self._lock:
+            listed = {f["file"] for f in self._manifest["files"]}
+        for name in sorted(os.listdir(self._files_dir)):
+            path = os.path.join(self._files_dir, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+                continue
+            if name in listed or not name.endswith(".parquet"):
+                continue
+            table = pq.read_table(path)
+            if db.count_existing_transactions(table["id"].to_pylist()) == 0:
+                self._commit(self._entry(name, table))
+                db.version.bump()
+            else:
+                os.remove(path)
+
+    # ----- queries -----
+
+    def _scan(
+        self,
+        min_amount: Optional[float],
+        max_amount: Optional[float],
+        currency: Optional[str],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        description_query: Optional[str],
+        device_query: Optional[str]
+    ):
+        """
+        Archived rows matching the hot listing's filters as a pyarrow Table,
+        or None when no file overlaps the date range. The description filter
+        is a case-insensitive substring match per term rather than a Lucene
+        query.
+        """
+        start = columnar.to_utc(start_date) if start_date else None
+        end = columnar.to_utc(end_date) if end_date else None
+        with self._lock:
+            # Files outside the date range are never opened
+            paths = [
+                os.path.join(self._files_dir, f["file"])
+                for f in self._manifest["files"]
+                if (start is None or datetime.fromisoformat(f["to"]) >= start)
+                and (end is None or datetime.fromisoformat(f["from"]) <= end)
+            ]
+        if not paths:
+            return None
+
+        conditions = []
+        if min_amount is not None:
+            conditions.append(ds.field("amount") >= min_amount)
+        if max_amount is not None:
+            conditions.append(ds.field("amount") <= max_amount)
+        if currency:
+            conditions.append(ds.field("currency") == currency)
+        if start is not None:
+            conditions.append(ds.field("timestamp") >= pa.scalar(start, type=pa.timestamp("us")))
+        if end is not None:
+            conditions.append(ds.field("timestamp") <= pa.scalar(end, type=pa.timestamp("us")))
+        for term in (description_query or "").split():
+            conditions.append(pc.match_substring(ds.field("description"), pattern=term, ignore_case=True))
+        if device_query:
+            conditions.append(pc.starts_with(pc.utf8_lower(ds.field("deviceId")), pattern=device_query.strip().lower()))
+        condition = functools.reduce(operator.and_, conditions) if conditions else None
+        return ds.dataset(paths, format="parquet").to_table(filter=condition)
+
+    def query(self, skip: int, limit: int, *filters) -> Tuple[List[Transaction], int]:
+        """
+        Archived transactions newest first: ``(page, total)``. ``filters`` are
+        the hot listing's (min_amount, max_amount, currency, start_date,
+        end_date, description_query, device_query).
+        """
+        table = self._scan(*filters)
+        total = table.num_rows if table is not None else 0
+        if limit <= 0 or skip >= total:
+            return [], total
+        order = pc.sort_indices(table, sort_keys=[("timestamp", "descending"), ("id", "descending")])
+        page = table.take(order[skip:skip + limit]).to_pylist()
+        return [
+            Transaction(
+                id=row["id"],
+                fromUserId=row["fromUserId"],
+                toUserId=row["toUserId"],
+                amount=row["amount"],
+                currency=row["currency"],
+                timestamp=row["timestamp"].isoformat() + "Z",
+                description=row["description"],
+                deviceId=row["deviceId"]
+            )
+            for row in page
+        ], total
+
+    def facets(self, interval: str, top_devices: int, amount_edges: List[float], *filters) -> dict:
+        """Archived counterpart of Neo4jDriver.get_transaction_facets."""
+        empty = {"total": 0, "currencies": [], "amounts": [], "dates": [], "devices": []}
+        table = self._scan(*filters)
+        if table is None or table.num_rows == 0:
+            return empty
+
+        def counts(column, key):
+            grouped = pa.table({key: column}).group_by(key).aggregate([([], "count_all")])
+            return [
+                {key: value, "count": n}
+                for value, n in zip(grouped[key].to_pylist(), grouped["count_all"].to_pylist())
+                if value is not None
+            ]
+
+        total = table.num_rows
+        # Rows at or above each edge; bucket i holds those between edges i-1 and i
+        at_least = [pc.sum(pc.greater_equal(table["amount"], edge)).as_py() or 0 for edge in amount_edges]
+        bounds = [total] + at_least + [0]
+        amounts = [
+            {"bucket": i, "count": bounds[i] - bounds[i + 1]}
+            for i in range(len(amount_edges) + 1)
+            if bounds[i] - bounds[i + 1]
+        ]
+        periods = pc.cast(pc.floor_temporal(table["timestamp"], unit=interval), pa.date32())
+        dates = sorted(counts(periods, "period"), key=lambda d: d["period"])
+        for entry in dates:
+            entry["period"] = entry["period"].isoformat()
+        def by_count(entry):
+            return -entry["count"], entry["value"]
+
+        return {
+            "total": total,
+            "currencies": sorted(counts(table["currency"], "value"), key=by_count),
+            "amounts": amounts,
+            "dates": dates,
+            "devices": sorted(counts(table["deviceId"], "value"), key=by_count)[:top_devices],
+        }
+
+
+class Retention:
+    """Submits an archival job every ``interval`` seconds."""
+
+    def __init__(self, archive: TransactionArchive, db, jobs, hot_days: int,
+                 batch_size: int = 10000, interval: float = 0.0):
+        self.archive = archive
+        self.db = db
+        self.jobs = jobs
+        self.hot_days = hot_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, hot_days: Optional[int] = None):
+        hot_days = self.hot_days if hot_days is None else hot_days
+        cutoff = datetime.now(timezone.utc) - timedelta(days=hot_days)
+        return self.jobs.submit(
+            JOB_KIND,
+            lambda job: self.archive.run(self.db, cutoff, self.batch_size, job),
+            {"hotDays": hot_days, "cutoff": cutoff.isoformat()}
+        )
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if any(job.status in (STATUS_QUEUED, STATUS_RUNNING) for job in self.jobs.list(JOB_KIND)):
+                continue
+            self.submit()
+
+
+def main():
+    from database import Neo4jDriver
+
+    parser = argparse.ArgumentParser(description="Move old transactions from the graph into Parquet files")
+    parser.add_argument("--uri", default=os.getenv("NEO4J_URI", "bolt://localhost:7687"))
+    parser.add_argument("--user", default=os.getenv("NEO4J_USER", "neo4j"))
+    parser.add_argument("--password", default=os.getenv("NEO4J_PASS", "password"))
+    parser.add_argument("--dir", required=True, help="archive directory")
+    parser.add_argument("--hot-days", type=int, default=90, help="keep this many days in the graph")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--compression", default="zstd")
+    args = parser.parse_args()
+
+    db = Neo4jDriver(args.uri, args.user, args.password)
+    try:
+        archive = TransactionArchive(args.dir, args.compression)
+        cutoff = datetime.now(timezone.utc) - timedelta(days=args.hot_days)
+        result = archive.run(db, cutoff, args.batch_size)
+    finally:
+        db.close()
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
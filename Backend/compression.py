@@ -0,0 +1,110 @@
+"""
+On-the-fly response compression (gzip, or brotli when installed).
+
+Buffered responses are compressed whole once they reach a minimum size.
+Streamed responses are compressed chunk by chunk and each chunk is flushed, so
+the client still receives data while the generator runs. Responses served
+from files (export downloads), already encoded or not text-like are left
+alone. brotli is optional; without it only gzip is offered.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+COMPRESSIBLE = {
+    "application/json",
+    "application/x-ndjson",
+    "text/csv",
+    "text/plain",
+    "text/html",
+}
+
+# Keeps most of brotli's ratio at gzip-like speed, which matters on the fly
+BROTLI_QUALITY = 5
+
+
+def choose_encoding(accept_encodings) -> str:
+    """'br', 'gzip' or '' for a werkzeug Accept-Encoding header."""
+    br = accept_encodings.quality("br") if brotli is not None else 0
+    gzip = accept_encodings.quality("gzip")
+    if br and br >= gzip:
+        return "br"
+    return "gzip" if gzip else ""
+
+
+class _Compressor:
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.flush()
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def _compress_stream(chunks, compressor: _Compressor):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if not chunk:
+                continue
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # The wrapped generator is no longer the response's iterable, so
+        # closing the response would not reach it
+        close = getattr(chunks, "close", None)
+        if close:
+            close()
+
+
+def install(app, min_size: int = 1024, level: int = 6):
+    """Compress eligible responses of ``app`` in an after_request hook."""
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        if response.mimetype not in COMPRESSIBLE:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (request.method == "HEAD" or response.status_code != 200 or response.direct_passthrough
+                or "Content-Encoding" in response.headers
+                or "no-transform" in response.headers.get("Cache-Control", "")):
+            return response
+        encoding = choose_encoding(request.accept_encodings)
+        if not encoding:
+            return response
+
+        compressor = _Compressor(encoding, level)
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, compressor)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(compressor.compress(data) + compressor.finish())
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    return app
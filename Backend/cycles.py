@@ -0,0 +1,211 @@
+"""
+Money-loop detection: chains of transactions A -> B -> ... -> A.
+
+A loop is time-respecting (each transaction is later than the previous one),
+every hop moves at least ``min_amount``, the whole loop fits in ``window_ms``
+and it has at most ``max_length`` hops. The search is a depth-first expansion
+over an in-memory adjacency of money-flow edges with three prunings:
+timestamps (edges are sorted, so the time bound is a bisect and an early
+break), a bounded reverse BFS that drops users who cannot get back to the
+start in the hops left, and a global expansion budget so every search
+finishes in bounded time (results are then marked truncated).
+
+user_cycles() is the on-demand path: it fetches only the start user's
+neighbourhood, hop by hop. scan_cycles() loads the whole filtered edge set
+once and is meant to run as a background job.
+"""
+import bisect
+import re
+from collections import deque
+from typing import Dict, List, Optional
+
+DURATION_UNITS = {"s": 1000, "m": 60 * 1000, "h": 3600 * 1000, "d": 86400 * 1000}
+
+
+def parse_duration(value: str) -> Optional[int]:
+    """'90s', '30m', '24h', '7d' or plain seconds -> milliseconds."""
+    match = re.fullmatch(r"\s*(\d+)\s*([smhd]?)\s*", value or "")
+    if not match:
+        return None
+    return int(match.group(1)) * DURATION_UNITS[match.group(2) or "s"]
+
+
+class Budget:
+    def __init__(self, max_expansions: int):
+        self.remaining = max_expansions
+        self.exhausted = False
+
+    def spend(self) -> bool:
+        self.remaining -= 1
+        if self.remaining < 0:
+            self.exhausted = True
+        return not self.exhausted
+
+
+class FlowGraph:
+    """Money-flow edges per sender, kept sorted by timestamp."""
+
+    def __init__(self):
+        # user -> list of (ts, txId, toUser, amount), sorted by ts
+        self.out: Dict[int, list] = {}
+        self.incoming: Dict[int, set] = {}
+        self._times: Dict[int, list] = {}
+
+    def add(self, from_id: int, tx_id: int, to_id: int, amount: float, ts: int):
+        self.out.setdefault(from_id, []).append((ts, tx_id, to_id, amount))
+        self.incoming.setdefault(to_id, set()).add(from_id)
+
+    def touch(self, user_id: int):
+        self.out.setdefault(user_id, [])
+
+    def freeze(self):
+        for edges in self.out.values():
+            edges.sort()
+        self._times = {user: [e[0] for e in edges] for user, edges in self.out.items()}
+
+    def edges_after(self, user_id: int, ts: Optional[int]) -> list:
+        edges = self.out.get(user_id, [])
+        if ts is None:
+            return edges
+        return edges[bisect.bisect_right(self._times.get(user_id, []), ts):]
+
+    def distances_to(self, target: int, max_hops: int) -> Dict[int, int]:
+        """Hops from each user to ``target`` (ignoring time), up to max_hops."""
+        dist = {target: 0}
+        queue = deque([target])
+        while queue:
+            node = queue.popleft()
+            if dist[node] >= max_hops:
+                continue
+            for prev in self.incoming.get(node, ()):
+                if prev not in dist:
+                    dist[prev] = dist[node] + 1
+                    queue.append(prev)
+        return dist
+
+
+def search(graph: FlowGraph, start: int, max_length: int, window_ms: int, budget: Budget,
+           max_cycles: int, min_user: Optional[int] = None) -> List[dict]:
+    """
+    Loops through ``start``. With ``min_user`` only users with a larger id may
+    appear besides the start, so a whole-graph scan reports each loop once.
+    """
+    dist = graph.distances_to(start, max_length)
+    cycles = []
+    users = [start]
+    hops = []
+    on_path = {start}
+
+    def expand(node: int, first_ts: Optional[int], last_ts: Optional[int]):
+        for ts, tx_id, to_id, amount in graph.edges_after(node, last_ts):
+            if len(cycles) >= max_cycles or not budget.spend():
+                return
+            if first_ts is not None and ts - first_ts > window_ms:
+                # Sorted by time: every later edge is outside the window too
+                break
+            depth = len(hops) + 1
+            if to_id == start:
+                if depth >= 2:
+                    cycles.append(_cycle(users + [start], hops + [(tx_id, amount, ts)]))
+                continue
+            if to_id in on_path or depth >= max_length:
+                continue
+            if min_user is not None and to_id <= min_user:
+                continue
+            if dist.get(to_id, max_length + 1) > max_length - depth:
+                continue
+            users.append(to_id)
+            hops.append((tx_id, amount, ts))
+            on_path.add(to_id)
+            expand(to_id, ts if first_ts is None else first_ts, ts)
+            on_path.discard(to_id)
+            hops.pop()
+            users.pop()
+
+    if dist.get(start) is not None and len(dist) > 1:
+        expand(start, None, None)
+    return cycles
+
+
+def _cycle(users: list, hops: list) -> dict:
+    amounts = [amount for _, amount, _ in hops]
+    return {
+        "users": users,
+        "transactions": [tx_id for tx_id, _, _ in hops],
+        "amounts": amounts,
+        "totalAmount": round(sum(amounts), 2),
+        "length": len(hops),
+        "startMillis": hops[0][2],
+        "endMillis": hops[-1][2],
+    }
+
+
+def user_cycles(db, user_id: int, max_length: int, min_amount: float, window_ms: int,
+                max_cycles: int = 100, max_expansions: int = 200000, max_edges: int = 200000) -> dict:
+    """Loops through one user, fetching its neighbourhood one hop per query."""
+    graph = FlowGraph()
+    graph.touch(user_id)
+    frontier = {user_id}
+    fetched = set()
+    edge_count = 0
+    lower = upper = None
+    truncated = False
+    for hop in range(max_length):
+        batch = sorted(frontier - fetched)
+        if not batch:
+            break
+        edges = db.get_money_flow_edges(batch, min_amount, lower, upper)
+        fetched.update(batch)
+        frontier = set()
+        for from_id, tx_id, to_id, amount, ts in edges:
+            graph.add(from_id, tx_id, to_id, amount, ts)
+            frontier.add(to_id)
+        edge_count += len(edges)
+        if hop == 0 and edges:
+            # Later hops must fall after the earliest and within the window of the latest first hop
+            lower = min(e[4] for e in edges)
+            upper = max(e[4] for e in edges) + window_ms
+        if edge_count >= max_edges:
+            truncated = True
+            break
+    graph.freeze()
+
+    budget = Budget(max_expansions)
+    cycles = search(graph, user_id, max_length, window_ms, budget, max_cycles)
+    return {
+        "cycles": cycles,
+        "truncated": truncated or budget.exhausted or len(cycles) >= max_cycles,
+        "edgesExamined": edge_count,
+    }
+
+
+def scan_cycles(db, job, max_length: int, min_amount: float, window_ms: int,
+                max_cycles: int = 10000, max_expansions: int = 50000000) -> dict:
+    """Every loop in the graph, each reported once from its smallest user id."""
+    graph = FlowGraph()
+    edge_count = 0
+    for from_id, tx_id, to_id, amount, ts in db.stream_money_flow_edges(min_amount):
+        graph.add(from_id, tx_id, to_id, amount, ts)
+        edge_count += 1
+        if edge_count % 100000 == 0:
+            job.update(phase="loading", edgesLoaded=edge_count)
+    graph.freeze()
+
+    starts = sorted(graph.out)
+    job.update(phase="searching", edgesLoaded=edge_count, users=len(starts), usersSearched=0)
+    budget = Budget(max_expansions)
+    cycles = []
+    for i, start in enumerate(starts):
+        cycles.extend(search(graph, start, max_length, window_ms, budget,
+                             max_cycles - len(cycles), min_user=start))
+        if i % 1000 == 0:
+            job.update(usersSearched=i, cyclesFound=len(cycles))
+        if budget.exhausted or len(cycles) >= max_cycles:
+            break
+    job.update(phase="done", usersSearched=i + 1 if starts else 0, cyclesFound=len(cycles))
+    cycles.sort(key=lambda c: c["totalAmount"], reverse=True)
+    return {
+        "cycles": cycles,
+        "truncated": budget.exhausted or len(cycles) >= max_cycles,
+        "edgesExamined": edge_count,
+    }
@@ -1,67 +1,314 @@
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, Query, unit_of_work
 from typing import List, Tuple, Optional
+import re
+import threading
 import time
+import uuid
 from datetime import datetime
+from entity_resolution import entity_keys
 from models import (
     User, Transaction, UserConnections, TxConnections,
     RelConnection, PathSegment, PathNode, TransactionCluster,
-    GraphNode, GraphRelationship, GraphExportResponse, Statistics
+    GraphNode, GraphRelationship, GraphExportResponse, Statistics, SearchHit,
+    RiskyTransaction, ClusterSummary, EntityMatch
 )
 
 
+# Constraints and indexes created at startup by Neo4jDriver.ensure_schema
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT user_ingest_key IF NOT EXISTS "
+    "FOR (u:User) REQUIRE u.ingestKey IS UNIQUE",
+    "CREATE CONSTRAINT transaction_ingest_key IF NOT EXISTS "
+    "FOR (t:Transaction) REQUIRE t.ingestKey IS UNIQUE",
+    # Client-supplied idempotency key (Idempotency-Key header / externalId)
+    "CREATE CONSTRAINT transaction_external_id IF NOT EXISTS "
+    "FOR (t:Transaction) REQUIRE t.externalId IS UNIQUE",
+    # Exact and prefix lookups on the raw identifier properties
+    "CREATE INDEX user_email IF NOT EXISTS FOR (u:User) ON (u.email)",
+    "CREATE INDEX user_phone IF NOT EXISTS FOR (u:User) ON (u.phone)",
+    "CREATE INDEX transaction_device IF NOT EXISTS FOR (t:Transaction) ON (t.deviceId)",
+    "CREATE INDEX transaction_device_lower IF NOT EXISTS FOR (t:Transaction) ON (t.deviceIdLower)",
+    # Stored centrality scores behind the rankings endpoint
+    "CREATE INDEX user_page_rank IF NOT EXISTS FOR (u:User) ON (u.pageRank)",
+    "CREATE INDEX user_betweenness IF NOT EXISTS FOR (u:User) ON (u.betweenness)",
+    # Top-risk listing walks this index in descending order
+    "CREATE INDEX transaction_risk_score IF NOT EXISTS FOR (t:Transaction) ON (t.riskScore)",
+    # Shared identifiers are first-class nodes, one per distinct value
+    "CREATE CONSTRAINT device_id IF NOT EXISTS FOR (d:Device) REQUIRE d.deviceId IS UNIQUE",
+    "CREATE CONSTRAINT email_address IF NOT EXISTS FOR (e:Email) REQUIRE e.address IS UNIQUE",
+    "CREATE CONSTRAINT phone_number IF NOT EXISTS FOR (p:Phone) REQUIRE p.number IS UNIQUE",
+    # Date-range filters, newest-first listing and archival of old transactions
+    "CREATE INDEX transaction_timestamp IF NOT EXISTS FOR (t:Transaction) ON (t.timestamp)",
+    # Per-user, per-day, per-currency rollups of archived transactions
+    "CREATE CONSTRAINT daily_summary_key IF NOT EXISTS FOR (d:DailySummary) REQUIRE d.key IS UNIQUE",
+    # Entity resolution: blocking keys and the queue of users to resolve
+    "CREATE CONSTRAINT block_key IF NOT EXISTS FOR (b:Block) REQUIRE b.key IS UNIQUE",
+    "CREATE INDEX user_entity_pending IF NOT EXISTS FOR (u:User) ON (u.entityPending)",
+    # Range seeks for the delta export (see stream_changes)
+    *[f"CREATE INDEX {label.lower()}_updated_at IF NOT EXISTS FOR (n:{label}) ON (n.updatedAt)"
+      for label in ("User", "Transaction", "Device", "Email", "Phone")],
+    *[f"CREATE INDEX {rel.lower()}_updated_at IF NOT EXISTS FOR ()-[r:{rel}]-() ON (r.updatedAt)"
+      for rel in ("SENT", "RECEIVED_BY", "USED_DEVICE", "HAS_EMAIL", "HAS_PHONE")],
+    # Lucene indexes behind user/transaction search
+    "CREATE FULLTEXT INDEX user_search IF NOT EXISTS "
+    "FOR (u:User) ON EACH [u.name, u.email, u.phone]",
+    "CREATE FULLTEXT INDEX transaction_search IF NOT EXISTS "
+    "FOR (t:Transaction) ON EACH [t.description, t.deviceId]",
+]
+
+# Search counts stop at this many hits and are reported as approximate
+SEARCH_COUNT_CAP = 1000
+
+# Transaction facets: lower edges of the amount histogram buckets (the first
+# bucket holds everything below the first edge) and the date bucket units
+AMOUNT_BUCKET_EDGES = [0, 10, 50, 100, 500, 1000, 5000, 10000, 50000]
+FACET_INTERVALS = ("day", "week", "month", "year")
+
+
+def lucene_query(text: str, field: Optional[str] = None) -> str:
+    """
+    Turn free text into a Lucene query: every term must match, as a prefix or
+    (for terms of four or more characters) within one edit.
+
+    Terms are split the way the standard analyzer tokenizes, so the pieces of
+    an email like ``alice@exa`` are matched separately.
+    """
+    terms = [t.rstrip(".") for t in re.findall(r"\w[\w.]*", text.lower())]
+    clauses = []
+    for term in terms:
+        if not term:
+            continue
+        clause = f"{term}* OR {term}~1" if len(term) >= 4 else f"{term}*"
+        clauses.append(f"{field}:({clause})" if field else f"({clause})")
+    return " AND ".join(clauses)
+
+
+# Session lanes: point lookups and writes, request-path queries that read a
+# large part of the graph, and background jobs. Heavy and background work
+# share their own connection pool so it cannot exhaust the light one.
+LANE_LIGHT = "light"
+LANE_HEAVY = "heavy"
+LANE_BACKGROUND = "background"
+
+
+class GraphVersion:
+    """
+    Tag for read responses. A counter bumped after every write committed
+    through the driver, starting from a random epoch so versions handed out
+    before a restart never match again, plus the graph's node and relationship
+    counts, read from the count store at most every ``poll_seconds``: creates
+    and deletes made outside this process (the Populate scripts, the archive
+    CLI) change it too. Property-only updates made outside are not seen.
+
+    Background score writes (risk and centrality scores) bump a counter of
+    their own, included only by ``current(scores=True)``, so they do not
+    invalidate every other response while ingest is running.
+    """
+
+    def __init__(self, probe=None, poll_seconds: float = 1.0):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._value = 0
+        self._scores = 0
+        self._probe = probe
+        self.poll_seconds = poll_seconds
+        self._state = "0"
+        self._polled_at = None
+        self._lock = threading.Lock()
+
+    def bump(self, scores: bool = False):
+        with self._lock:
+            if scores:
+                self._scores += 1
+            else:
+                self._value += 1
+
+    def current(self, scores: bool = False) -> str:
+        state = self._graph_state()
+        with self._lock:
+            version = f"{self.epoch}.{self._value}.{state}"
+            return f"{version}.{self._scores}" if scores else version
+
+    def _graph_state(self) -> str:
+        if self._probe is None or self.poll_seconds <= 0:
+            return self._state
+        now = time.monotonic()
+        with self._lock:
+            if self._polled_at is not None and now - self._polled_at < self.poll_seconds:
+                return self._state
+            # Claimed before probing so concurrent requests keep the last state
+            self._polled_at = now
+        try:
+            state = self._probe()
+        except Exception:
+            return self._state
+        with self._lock:
+            self._state = state
+        return state
+
+
+class _TimedSession:
+    """
+    A session whose transactions and auto-commit queries carry a timeout, and
+    which bumps the graph version (or its scores counter) after each committed
+    write transaction.
+    """
+
+    def __init__(self, session, timeout: Optional[float], version: Optional[GraphVersion] = None,
+                 scores: bool = False):
+        self._session = session
+        self.timeout = timeout
+        self._version = version
+        self._scores = scores
+
+    def __enter__(self):
+        self._session.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._session.__exit__(*exc_info)
+
+    def execute_read(self, transaction_function, *args, **kwargs):
+        return self._session.execute_read(self._timed(transaction_function), *args, **kwargs)
+
+    def execute_write(self, transaction_function, *args, **kwargs):
+        result = self._session.execute_write(self._timed(transaction_function), *args, **kwargs)
+        if self._version:
+            self._version.bump(scores=self._scores)
+        return result
+
+    def run(self, query, parameters=None, **kwargs):
+        if self.timeout is not None and not isinstance(query, Query):
+            query = Query(query, timeout=self.timeout)
+        return self._session.run(query, parameters, **kwargs)
+
+    def _timed(self, transaction_function):
+        if self.timeout is None or getattr(transaction_function, "timeout", None) is not None:
+            return transaction_function
+        return unit_of_work(timeout=self.timeout)(transaction_function)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
 class Neo4jDriver:
-    def __init__(self, uri: str, username: str, password: str):
-        self.driver = GraphDatabase.driver(uri, auth=(username, password))
+    def __init__(self, uri: str, username: str, password: str,
+                 light_timeout: Optional[float] = None, heavy_timeout: Optional[float] = None,
+                 light_pool_size: int = 100, heavy_pool_size: int = 0,
+                 acquisition_timeout: float = 60.0, version_poll_seconds: float = 1.0):
+        """
+        ``light_timeout`` / ``heavy_timeout`` (seconds) bound every transaction
+        in their lane; background work uses the server's default. With
+        ``heavy_pool_size`` > 0 heavy and background work get a pool of their
+        own, otherwise every lane shares one. ``version_poll_seconds`` bounds
+        how often the graph version reads the node and relationship counts.
+        """
+        self.light_timeout = light_timeout
+        self.heavy_timeout = heavy_timeout
+        self.version = GraphVersion(self._graph_state, version_poll_seconds)
+        self.driver = GraphDatabase.driver(
+            uri, auth=(username, password), max_connection_pool_size=light_pool_size,
+            connection_acquisition_timeout=acquisition_timeout
+        )
         self.driver.verify_connectivity()
-    
+        self.heavy_driver = self.driver
+        if heavy_pool_size > 0:
+            self.heavy_driver = GraphDatabase.driver(
+                uri, auth=(username, password), max_connection_pool_size=heavy_pool_size,
+                connection_acquisition_timeout=acquisition_timeout
+            )
+            self.heavy_driver.verify_connectivity()
+
     def close(self):
         self.driver.close()
-    
-    def create_user(self, name: str, email: str, phone: str) -> int:
-        with self.driver.session() as session:
-            # Create a user
-            result = session.execute_write(
-                self._create_user_tx, name, email, phone
-            )
-            new_id = result          
-            # Link shared email
-            session.execute_write(self._link_shared_email, new_id)           
-            # Link shared phone
-            session.execute_write(self._link_shared_phone, new_id)            
-            return new_id
-    
+        if self.heavy_driver is not self.driver:
+            self.heavy_driver.close()
+
+    def _session(self, lane: str = LANE_LIGHT, scores: bool = False, **config) -> _TimedSession:
+        # ``scores``: writes only change risk / centrality scores
+        if lane == LANE_LIGHT:
+            return _TimedSession(self.driver.session(**config), self.light_timeout, self.version, scores)
+        timeout = self.heavy_timeout if lane == LANE_HEAVY else None
+        return _TimedSession(self.heavy_driver.session(**config), timeout, self.version, scores)
+
+    def _graph_state(self) -> str:
+        with self._session() as session:
+            return session.execute_read(self._get_graph_state_tx)
+
     @staticmethod
-    def _create_user_tx(tx, name: str, email: str, phone: str):
+    def _get_graph_state_tx(tx) -> str:
+        # Both counts come from the count store
         query = """
-        CREATE (u:User { name: $name, email: $email, phone: $phone })
-        RETURN id(u)
+        CALL { MATCH (n) RETURN count(n) AS nodes }
+        CALL { MATCH ()-[r]->() RETURN count(r) AS relationships }
+        RETURN nodes, relationships
         """
-        result = tx.run(query, name=name, email=email, phone=phone)
-        record = result.single()
-        if record:
-            return record[0]
-        raise Exception("CreateUser: no record returned")
+        record = tx.run(query).single()
+        return f"{record['nodes']}-{record['relationships']}"
+
+    def ensure_schema(self):
+        """Create the constraints and indexes the backend relies on (idempotent)."""
+        with self._session(LANE_BACKGROUND) as session:
+            for statement in SCHEMA_STATEMENTS:
+                session.run(statement).consume()
+
+    def create_user(self, name: str, email: str, phone: str, ingest_key: Optional[str] = None) -> int:
+        with self._session() as session:
+            return session.execute_write(
+                self._create_user_tx, name, email, phone, ingest_key, entity_keys(email, phone)
+            )
     
     @staticmethod
-    def _link_shared_email(tx, user_id: int):
-        query = """
-        MATCH (u:User), (o:User)
-        WHERE id(u) = $id AND o.email = u.email AND id(o) <> $id
-        MERGE (u)-[:SHARED_EMAIL]-(o)
-        """
-        tx.run(query, id=user_id)
+    def _create_user_tx(tx, name: str, email: str, phone: str, ingest_key: Optional[str] = None,
+                        keys: Optional[dict] = None):
+        if ingest_key:
+            # Replays of a logged write land on the node created the first time
+            query = """
+            MERGE (u:User { ingestKey: $key })
+            ON CREATE SET u.name = $name, u.email = $email, u.phone = $phone,
+                          u.createdAt = timestamp(), u.updatedAt = timestamp()
+            RETURN id(u)
+            """
+        else:
+            query = """
+            CREATE (u:User {
+              name: $name, email: $email, phone: $phone,
+              createdAt: timestamp(), updatedAt: timestamp()
+            })
+            RETURN id(u)
+            """
+        result = tx.run(query, name=name, email=email, phone=phone, key=ingest_key)
+        record = result.single()
+        if not record:
+            raise Exception("CreateUser: no record returned")
+        new_id = record[0]
+        # Identifier links, canonical keys and blocks commit with the user,
+        # so a failure never leaves a user the resolver cannot reach
+        Neo4jDriver._link_user_identifiers(tx, new_id)
+        if keys is not None:
+            Neo4jDriver._set_entity_keys_tx(tx, [dict(keys, id=new_id)])
+        return new_id
     
     @staticmethod
-    def _link_shared_phone(tx, user_id: int):
+    def _link_user_identifiers(tx, user_id: int):
+        # One Email and one Phone node per distinct value: users sharing an
+        # email or phone meet at the same node, so linking is O(1) per user
         query = """
-        MATCH (u:User), (o:User)
-        WHERE id(u) = $id AND o.phone = u.phone AND id(o) <> $id
-        MERGE (u)-[:SHARED_PHONE]-(o)
+        MATCH (u:User) WHERE id(u) = $id
+        FOREACH (_ IN CASE WHEN u.email IS NULL OR u.email = '' THEN [] ELSE [1] END |
+          MERGE (e:Email { address: u.email })
+          ON CREATE SET e.createdAt = timestamp(), e.updatedAt = timestamp()
+          MERGE (u)-[h:HAS_EMAIL]->(e)
+          ON CREATE SET h.createdAt = timestamp(), h.updatedAt = timestamp())
+        FOREACH (_ IN CASE WHEN u.phone IS NULL OR u.phone = '' THEN [] ELSE [1] END |
+          MERGE (p:Phone { number: u.phone })
+          ON CREATE SET p.createdAt = timestamp(), p.updatedAt = timestamp()
+          MERGE (u)-[h:HAS_PHONE]->(p)
+          ON CREATE SET h.createdAt = timestamp(), h.updatedAt = timestamp())
         """
         tx.run(query, id=user_id)
-    
+
     def get_all_users(self) -> List[User]:
-        with self.driver.session() as session:
+        with self._session(LANE_HEAVY) as session:
             result = session.execute_read(self._get_all_users_tx)
             return result
 
@@ -82,8 +329,23 @@ class Neo4jDriver:
             ))
         return users
 
+    def stream_users(self, fetch_size: int = 2000):
+        """Yield every User as the result is consumed, ``fetch_size`` records per pull."""
+        query = """
+        MATCH (u:User)
+        RETURN id(u) AS id, u.name AS name, u.email AS email, u.phone AS phone
+        """
+        with self._session(LANE_HEAVY, fetch_size=fetch_size) as session:
+            for record in session.run(query):
+                yield User(
+                    id=record["id"],
+                    name=record["name"],
+                    email=record["email"],
+                    phone=record["phone"]
+                )
+
     def get_users_paginated(self, page: int, page_size: int, search_query: str = "") -> dict:
-        with self.driver.session() as session:
+        with self._session() as session:
             return session.execute_read(self._get_users_paginated_tx, page, page_size, search_query)
 
     @staticmethod
@@ -91,28 +353,22 @@ class Neo4jDriver:
         # Calculate skip
         skip = (page - 1) * page_size
 
-        # Build WHERE clause for search
-        where_clause = ""
         params = {"skip": skip, "limit": page_size}
 
         if search_query:
-            search_lower = search_query.lower()
-            where_clause = """
-            WHERE toLower(u.name) CONTAINS $search
-               OR toLower(u.email) CONTAINS $search
-               OR toLower(u.phone) CONTAINS $search
-            """
-            params["search"] = search_lower
+            # Served from the full-text index, best matches first
+            hits = Neo4jDriver._search_users_tx(tx, search_query, page, page_size)
+            hits["data"] = [hit.node for hit in hits["data"]]
+            return hits
 
         # Get total count
-        count_query = f"MATCH (u:User) {where_clause} RETURN count(u) AS total"
+        count_query = "MATCH (u:User) RETURN count(u) AS total"
         count_result = tx.run(count_query, params)
         total = count_result.single()["total"]
 
         # Get paginated data
-        data_query = f"""
+        data_query = """
         MATCH (u:User)
-        {where_clause}
         RETURN id(u) AS id, u.name AS name, u.email AS email, u.phone AS phone
         ORDER BY u.name
         SKIP $skip
@@ -129,72 +385,485 @@ class Neo4jDriver:
                 phone=record["phone"]
             ))
 
+        return Neo4jDriver._search_page(users, total, False, page, page_size)
+
+    def search_users(self, query: str, page: int = 1, page_size: int = 20) -> dict:
+        with self._session() as session:
+            return session.execute_read(self._search_users_tx, query, page, page_size)
+
+    @staticmethod
+    def _search_users_tx(tx, query: str, page: int, page_size: int) -> dict:
+        lucene = lucene_query(query)
+        if not lucene:
+            return Neo4jDriver._empty_search_page(page, page_size)
+        # One row past the page tells whether another page exists once the count is capped
+        params = {"q": lucene, "skip": (page - 1) * page_size, "limit": page_size + 1, "cap": SEARCH_COUNT_CAP}
+
+        total, approximate = Neo4jDriver._fulltext_count(tx, "user_search", params)
+
+        # skip/limit are pushed into Lucene so only one page is materialized
+        data_query = """
+        CALL db.index.fulltext.queryNodes('user_search', $q, {skip: $skip, limit: $limit})
+        YIELD node AS u, score
+        RETURN id(u) AS id, u.name AS name, u.email AS email, u.phone AS phone, score
+        """
+        result = tx.run(data_query, params)
+        hits = []
+        for record in result:
+            hits.append(SearchHit(
+                node=User(
+                    id=record["id"],
+                    name=record["name"],
+                    email=record["email"],
+                    phone=record["phone"]
+                ),
+                score=record["score"]
+            ))
+        return Neo4jDriver._search_page(hits, total, approximate, page, page_size)
+
+    def search_transactions(self, query: str, page: int = 1, page_size: int = 20) -> dict:
+        with self._session() as session:
+            return session.execute_read(self._search_transactions_tx, query, page, page_size)
+
+    @staticmethod
+    def _search_transactions_tx(tx, query: str, page: int, page_size: int) -> dict:
+        lucene = lucene_query(query)
+        if not lucene:
+            return Neo4jDriver._empty_search_page(page, page_size)
+        # One row past the page tells whether another page exists once the count is capped
+        params = {"q": lucene, "skip": (page - 1) * page_size, "limit": page_size + 1, "cap": SEARCH_COUNT_CAP}
+
+        total, approximate = Neo4jDriver._fulltext_count(tx, "transaction_search", params)
+
+        data_query = """
+        CALL db.index.fulltext.queryNodes('transaction_search', $q, {skip: $skip, limit: $limit})
+        YIELD node AS t, score
+        MATCH (u1:User)-[:SENT]->(t)-[:RECEIVED_BY]->(u2:User)
+        RETURN id(t)           AS id,
+               id(u1)         AS fromId,
+               id(u2)         AS toId,
+               t.amount       AS amt,
+               t.currency     AS currency,
+               toString(t.timestamp) AS ts,
+               t.description  AS desc,
+               t.deviceId     AS deviceId,
+               score
+        ORDER BY score DESC
+        """
+        result = tx.run(data_query, params)
+        hits = []
+        for record in result:
+            hits.append(SearchHit(
+                node=Transaction(
+                    id=record["id"],
+                    fromUserId=record["fromId"],
+                    toUserId=record["toId"],
+                    amount=record["amt"],
+                    currency=record["currency"],
+                    timestamp=record["ts"],
+                    description=record["desc"],
+                    deviceId=record["deviceId"]
+                ),
+                score=record["score"]
+            ))
+        return Neo4jDriver._search_page(hits, total, approximate, page, page_size)
+
+    @staticmethod
+    def _fulltext_count(tx, index: str, params: dict) -> Tuple[int, bool]:
+        # Counting stops at the cap; deep result sets only need "1000+"
+        count_query = f"""
+        CALL db.index.fulltext.queryNodes('{index}', $q, {{limit: $cap}})
+        YIELD node
+        RETURN count(node) AS total
+        """
+        total = tx.run(count_query, params).single()["total"]
+        return total, total >= SEARCH_COUNT_CAP
+
+    @staticmethod
+    def _search_page(hits: list, total: int, approximate: bool, page: int, page_size: int) -> dict:
+        """
+        Build a page response. ``hits`` may hold one row past the page; when
+        ``total`` is capped that row is what says whether a next page exists,
+        and ``totalPages`` grows with it instead of stopping at the cap.
+        """
+        if approximate:
+            has_more = len(hits) > page_size
+        else:
+            has_more = page * page_size < total
+        total_pages = (total + page_size - 1) // page_size
+        if approximate and hits:
+            total_pages = max(total_pages, page + 1 if has_more else page)
         return {
-            "data": users,
+            "data": hits[:page_size],
             "total": total,
+            "totalIsApproximate": approximate,
             "page": page,
             "pageSize": page_size,
-            "totalPages": (total + page_size - 1) // page_size
+            "totalPages": total_pages,
+            "hasMore": has_more,
+            "nextPage": page + 1 if has_more else None
         }
-    
+
+    @staticmethod
+    def _empty_search_page(page: int, page_size: int) -> dict:
+        return Neo4jDriver._search_page([], 0, False, page, page_size)
+
     def create_transaction(
         self, from_id: int, to_id: int, amount: float,
-        currency: str, timestamp: str, description: str, device_id: str
-    ) -> int:
-        with self.driver.session() as session:
+        currency: str, timestamp: str, description: str, device_id: str,
+        ingest_key: Optional[str] = None, external_id: Optional[str] = None
+    ) -> Tuple[int, bool]:
+        """
+        Create a transaction; returns ``(id, created)``. With ``external_id``
+        (or ``ingest_key``) the write is a MERGE on that key, so a retried
+        request returns the id of the transaction created the first time and
+        ``created`` False.
+        """
+        with self._session() as session:
             # Create transaction
-            new_id = session.execute_write(
+            new_id, created = session.execute_write(
                 self._create_transaction_tx,
-                from_id, to_id, amount, currency, timestamp, description, device_id
+                from_id, to_id, amount, currency, timestamp, description, device_id,
+                ingest_key, external_id
             )
             
-            # Link shared device
-            session.execute_write(self._link_shared_device, new_id)
+            # Link to the Device node
+            session.execute_write(self._link_devices, [new_id])
             
-            return new_id
+            return new_id, created
     
     @staticmethod
     def _create_transaction_tx(
         tx, from_id: int, to_id: int, amount: float,
-        currency: str, timestamp: str, description: str, device_id: str
+        currency: str, timestamp: str, description: str, device_id: str,
+        ingest_key: Optional[str] = None, external_id: Optional[str] = None
     ):
-        query = """
-        MATCH (u1:User),(u2:User)
-        WHERE id(u1) = $fromId AND id(u2) = $toId
-        CREATE (t:Transaction {
-          amount:      $amt,
-          currency:    $currency,
-          timestamp:   datetime($ts),
-          description: $desc,
-          deviceId:    $deviceId
-        })
-        CREATE (u1)-[:SENT]->(t)
-        CREATE (t)-[:RECEIVED_BY]->(u2)
-        RETURN id(t)
-        """
+        if external_id:
+            query = """
+            MATCH (u1:User),(u2:User)
+            WHERE id(u1) = $fromId AND id(u2) = $toId
+            MERGE (t:Transaction { externalId: $externalId })
+            ON CREATE SET t.amount      = $amt,
+                          t.currency    = $currency,
+                          t.timestamp   = datetime($ts),
+                          t.description = $desc,
+                          t.deviceId    = $deviceId,
+                          t.deviceIdLower = toLower($deviceId),
+                          t.ingestKey   = $key,
+                          t.createdAt   = timestamp(),
+                          t.updatedAt   = timestamp()
+            WITH u1, u2, t, t.createdAt = timestamp() AS created
+            // A replay under the same key must not attach a second sender or receiver
+            FOREACH (_ IN CASE WHEN created THEN [1] ELSE [] END |
+              CREATE (u1)-[:SENT { createdAt: timestamp(), updatedAt: timestamp() }]->(t)
+              CREATE (t)-[:RECEIVED_BY { createdAt: timestamp(), updatedAt: timestamp() }]->(u2))
+            RETURN id(t), created
+            """
+        elif ingest_key:
+            query = """
+            MATCH (u1:User),(u2:User)
+            WHERE id(u1) = $fromId AND id(u2) = $toId
+            MERGE (t:Transaction { ingestKey: $key })
+            ON CREATE SET t.amount      = $amt,
+                          t.currency    = $currency,
+                          t.timestamp   = datetime($ts),
+                          t.description = $desc,
+                          t.deviceId    = $deviceId,
+                          t.deviceIdLower = toLower($deviceId),
+                          t.createdAt   = timestamp(),
+                          t.updatedAt   = timestamp()
+            WITH u1, u2, t, t.createdAt = timestamp() AS created
+            // A replay under the same key must not attach a second sender or receiver
+            FOREACH (_ IN CASE WHEN created THEN [1] ELSE [] END |
+              CREATE (u1)-[:SENT { createdAt: timestamp(), updatedAt: timestamp() }]->(t)
+              CREATE (t)-[:RECEIVED_BY { createdAt: timestamp(), updatedAt: timestamp() }]->(u2))
+            RETURN id(t), created
+            """
+        else:
+            query = """
+            MATCH (u1:User),(u2:User)
+            WHERE id(u1) = $fromId AND id(u2) = $toId
+            CREATE (t:Transaction {
+              amount:      $amt,
+              currency:    $currency,
+              timestamp:   datetime($ts),
+              description: $desc,
+              deviceId:    $deviceId,
+              deviceIdLower: toLower($deviceId),
+              createdAt:   timestamp(),
+              updatedAt:   timestamp()
+            })
+            CREATE (u1)-[:SENT { createdAt: timestamp(), updatedAt: timestamp() }]->(t)
+            CREATE (t)-[:RECEIVED_BY { createdAt: timestamp(), updatedAt: timestamp() }]->(u2)
+            RETURN id(t), true
+            """
         result = tx.run(
             query,
             fromId=from_id, toId=to_id, amt=amount,
-            currency=currency, ts=timestamp, desc=description, deviceId=device_id
+            currency=currency, ts=timestamp, desc=description, deviceId=device_id,
+            key=ingest_key, externalId=external_id
         )
         record = result.single()
         if record:
-            return record[0]
+            # timestamp() is fixed for the whole transaction, so only a node
+            # created by this write has createdAt equal to it
+            return record[0], record[1]
         raise Exception("CreateTransaction: no record returned")
     
+    def create_transactions_batch(self, rows: List[dict]) -> List[Optional[Tuple[int, bool]]]:
+        """Create many transactions in one UNWIND write and link their devices.
+
+        Rows are merged on their client ``externalId`` when they have one and
+        on their ``ingestKey`` otherwise (one is generated when missing), so
+        replaying a batch returns the ids created the first time. Returns
+        ``(id, created)`` in the same order as ``rows``, with ``created`` False
+        for replays and for repeats of a key earlier in the batch; an entry is
+        None when the sender or receiver does not exist.
+        """
+        if not rows:
+            return []
+        rows = [row if row.get("ingestKey") else dict(row, ingestKey=uuid.uuid4().hex) for row in rows]
+        # Each key is written once; later rows with the same key share its result
+        first = {}
+        for i, row in enumerate(rows):
+            first.setdefault(self._merge_key(row), i)
+        unique = list(first.values())
+        with self._session() as session:
+            written = session.execute_write(self._create_transactions_batch_tx, [rows[i] for i in unique])
+            by_row = {i: written.get(n) for n, i in enumerate(unique)}
+            results = []
+            for i, row in enumerate(rows):
+                j = first[self._merge_key(row)]
+                result = by_row[j]
+                results.append(result if result is None or i == j else (result[0], False))
+            new_ids = [result[0] for result in by_row.values() if result is not None]
+            if new_ids:
+                session.execute_write(self._link_devices, new_ids)
+            return results
+
+    @staticmethod
+    def _merge_key(row: dict) -> tuple:
+        return ("externalId", row["externalId"]) if row.get("externalId") else ("ingestKey", row["ingestKey"])
+
+    @staticmethod
+    def _create_transactions_batch_tx(tx, rows: List[dict]) -> dict:
+        by_external = [dict(row, idx=i) for i, row in enumerate(rows) if row.get("externalId")]
+        by_ingest = [dict(row, idx=i) for i, row in enumerate(rows) if not row.get("externalId")]
+        external_query = """
+        UNWIND $rows AS row
+        MATCH (u1:User) WHERE id(u1) = row.fromId
+        MATCH (u2:User) WHERE id(u2) = row.toId
+        MERGE (t:Transaction { externalId: row.externalId })
+        ON CREATE SET t.amount      = row.amount,
+                      t.currency    = row.currency,
+                      t.timestamp   = datetime(row.timestamp),
+                      t.description = row.description,
+                      t.deviceId    = row.deviceId,
+                      t.deviceIdLower = toLower(row.deviceId),
+                      t.ingestKey   = row.ingestKey,
+                      t.createdAt   = timestamp(),
+                      t.updatedAt   = timestamp()
+        WITH row, u1, u2, t, t.createdAt = timestamp() AS created
+        FOREACH (_ IN CASE WHEN created THEN [1] ELSE [] END |
+          CREATE (u1)-[:SENT { createdAt: timestamp(), updatedAt: timestamp() }]->(t)
+          CREATE (t)-[:RECEIVED_BY { createdAt: timestamp(), updatedAt: timestamp() }]->(u2))
+        RETURN row.idx AS idx, id(t) AS id, created
+        """
+        ingest_query = """
+        UNWIND $rows AS row
+        MATCH (u1:User) WHERE id(u1) = row.fromId
+        MATCH (u2:User) WHERE id(u2) = row.toId
+        MERGE (t:Transaction { ingestKey: row.ingestKey })
+        ON CREATE SET t.amount      = row.amount,
+                      t.currency    = row.currency,
+                      t.timestamp   = datetime(row.timestamp),
+                      t.description = row.description,
+                      t.deviceId    = row.deviceId,
+                      t.deviceIdLower = toLower(row.deviceId),
+                      t.createdAt   = timestamp(),
+                      t.updatedAt   = timestamp()
+        WITH row, u1, u2, t, t.createdAt = timestamp() AS created
+        FOREACH (_ IN CASE WHEN created THEN [1] ELSE [] END |
+          CREATE (u1)-[:SENT { createdAt: timestamp(), updatedAt: timestamp() }]->(t)
+          CREATE (t)-[:RECEIVED_BY { createdAt: timestamp(), updatedAt: timestamp() }]->(u2))
+        RETURN row.idx AS idx, id(t) AS id, created
+        """
+        written = {}
+        for query, batch in ((external_query, by_external), (ingest_query, by_ingest)):
+            if batch:
+                result = tx.run(query, rows=batch)
+                written.update({record["idx"]: (record["id"], record["created"]) for record in result})
+        return written
+
+    @staticmethod
+    def _link_devices(tx, tx_ids: List[int]):
+        # Each transaction gets one USED_DEVICE edge to its Device node instead
+        # of a SHARED_DEVICE edge to every earlier transaction on that device
+        query = """
+        UNWIND $ids AS tid
+        MATCH (t:Transaction) WHERE id(t) = tid
+        WITH t WHERE t.deviceId IS NOT NULL AND t.deviceId <> ''
+        MERGE (d:Device { deviceId: t.deviceId })
+        ON CREATE SET d.createdAt = timestamp(), d.updatedAt = timestamp()
+        MERGE (t)-[r:USED_DEVICE]->(d)
+        ON CREATE SET r.createdAt = timestamp(), r.updatedAt = timestamp()
+        """
+        tx.run(query, ids=tx_ids)
+
+    def get_device_transactions(self, device_id: str, page: int, page_size: int) -> Optional[dict]:
+        """Paginated transactions made from one device; None if the device is unknown."""
+        with self._session() as session:
+            return session.execute_read(self._get_device_transactions_tx, device_id, page, page_size)
+
+    @staticmethod
+    def _get_device_transactions_tx(tx, device_id: str, page: int, page_size: int) -> Optional[dict]:
+        # The total is the Device node's degree, not a scan
+        count_query = """
+        MATCH (d:Device { deviceId: $deviceId })
+        RETURN COUNT { (d)<-[:USED_DEVICE]-(:Transaction) } AS total
+        """
+        record = tx.run(count_query, deviceId=device_id).single()
+        if not record:
+            return None
+        total = record["total"]
+
+        data_query = """
+        MATCH (d:Device { deviceId: $deviceId })<-[:USED_DEVICE]-(t:Transaction)
+        MATCH (u1:User)-[:SENT]->(t)-[:RECEIVED_BY]->(u2:User)
+        RETURN id(t)           AS id,
+               id(u1)         AS fromId,
+               id(u2)         AS toId,
+               t.amount       AS amt,
+               t.currency     AS currency,
+               toString(t.timestamp) AS ts,
+               t.description  AS desc,
+               t.deviceId     AS deviceId
+        ORDER BY t.timestamp DESC
+        SKIP $skip
+        LIMIT $limit
+        """
+        result = tx.run(data_query, deviceId=device_id, skip=(page - 1) * page_size, limit=page_size)
+
+        transactions = []
+        for record in result:
+            transactions.append(Transaction(
+                id=record["id"],
+                fromUserId=record["fromId"],
+                toUserId=record["toId"],
+                amount=record["amt"],
+                currency=record["currency"],
+                timestamp=record["ts"],
+                description=record["desc"],
+                deviceId=record["deviceId"]
+            ))
+
+        return {
+            "data": transactions,
+            "total": total,
+            "page": page,
+            "pageSize": page_size,
+            "totalPages": (total + page_size - 1) // page_size
+        }
+
+    def migrate_identifier_nodes(self, batch_size: int = 10000):
+        """
+        Backfill Device / Email / Phone nodes and the lowercased deviceId for
+        data written before they existed and drop the old pairwise SHARED_*
+        edges. Idempotent; each
+        statement commits in batches so it is safe on large graphs.
+        """
+        statements = [
+            """
+            MATCH (u:User) WHERE u.email IS NOT NULL AND u.email <> '' AND NOT (u)-[:HAS_EMAIL]->(:Email)
+            CALL { WITH u MERGE (e:Email { address: u.email }) MERGE (u)-[:HAS_EMAIL]->(e) }
+            IN TRANSACTIONS OF $batch ROWS
+            """,
+            """
+            MATCH (u:User) WHERE u.phone IS NOT NULL AND u.phone <> '' AND NOT (u)-[:HAS_PHONE]->(:Phone)
+            CALL { WITH u MERGE (p:Phone { number: u.phone }) MERGE (u)-[:HAS_PHONE]->(p) }
+            IN TRANSACTIONS OF $batch ROWS
+            """,
+            """
+            MATCH (t:Transaction) WHERE t.deviceId IS NOT NULL AND t.deviceId <> '' AND NOT (t)-[:USED_DEVICE]->(:Device)
+            CALL { WITH t MERGE (d:Device { deviceId: t.deviceId }) MERGE (t)-[:USED_DEVICE]->(d) }
+            IN TRANSACTIONS OF $batch ROWS
+            """,
+            """
+            MATCH (t:Transaction) WHERE t.deviceId IS NOT NULL AND t.deviceIdLower IS NULL
+            CALL { WITH t SET t.deviceIdLower = toLower(t.deviceId) }
+            IN TRANSACTIONS OF $batch ROWS
+            """,
+            """
+            MATCH ()-[r:SHARED_EMAIL|SHARED_PHONE|SHARED_DEVICE]->()
+            CALL { WITH r DELETE r }
+            IN TRANSACTIONS OF $batch ROWS
+            """,
+        ]
+        with self._session(LANE_BACKGROUND) as session:
+            for statement in statements:
+                session.run(statement, batch=batch_size).consume()
+        self.version.bump()
+
+    def set_risk_scores(self, scores: List[dict]):
+        """Persist ``{"id", "score", "reasons"}`` entries from the scoring stage."""
+        with self._session(scores=True) as session:
+            session.execute_write(self._set_risk_scores_tx, scores)
+
+    @staticmethod
+    def _set_risk_scores_tx(tx, scores: List[dict]):
+        query = """
+        UNWIND $scores AS row
+        MATCH (t:Transaction) WHERE id(t) = row.id
+        SET t.riskScore   = row.score,
+            t.riskReasons = row.reasons,
+            t.updatedAt   = timestamp()
+        """
+        tx.run(query, scores=scores)
+
+    def get_risky_transactions(self, limit: int = 50, min_score: float = 0.0) -> List[RiskyTransaction]:
+        with self._session() as session:
+            return session.execute_read(self._get_risky_transactions_tx, limit, min_score)
+
     @staticmethod
-    def _link_shared_device(tx, tx_id: int):
+    def _get_risky_transactions_tx(tx, limit: int, min_score: float) -> List[RiskyTransaction]:
+        # The range predicate lets the riskScore index supply the order
         query = """
-        MATCH (t:Transaction),(o:Transaction)
-        WHERE id(t) = $id
-          AND o.deviceId = t.deviceId
-          AND id(o) <> $id
-        MERGE (t)-[:SHARED_DEVICE]-(o)
+        MATCH (t:Transaction) WHERE t.riskScore >= $minScore
+        WITH t ORDER BY t.riskScore DESC LIMIT $limit
+        MATCH (u1:User)-[:SENT]->(t)-[:RECEIVED_BY]->(u2:User)
+        RETURN id(t)           AS id,
+               id(u1)         AS fromId,
+               id(u2)         AS toId,
+               t.amount       AS amt,
+               t.currency     AS currency,
+               toString(t.timestamp) AS ts,
+               t.description  AS desc,
+               t.deviceId     AS deviceId,
+               t.riskScore    AS riskScore,
+               t.riskReasons  AS riskReasons
+        ORDER BY riskScore DESC
         """
-        tx.run(query, id=tx_id)
+        result = tx.run(query, limit=limit, minScore=min_score)
+        risky = []
+        for record in result:
+            risky.append(RiskyTransaction(
+                transaction=Transaction(
+                    id=record["id"],
+                    fromUserId=record["fromId"],
+                    toUserId=record["toId"],
+                    amount=record["amt"],
+                    currency=record["currency"],
+                    timestamp=record["ts"],
+                    description=record["desc"],
+                    deviceId=record["deviceId"]
+                ),
+                riskScore=record["riskScore"],
+                riskReasons=list(record["riskReasons"] or [])
+            ))
+        return risky
 
     def get_all_transactions(self) -> List[Transaction]:
-        with self.driver.session() as session:
+        with self._session(LANE_HEAVY) as session:
             return session.execute_read(self._get_all_transactions_tx)
 
     @staticmethod
@@ -225,8 +894,34 @@ class Neo4jDriver:
             ))
         return transactions
 
+    def stream_transactions(self, fetch_size: int = 2000):
+        """Yield every Transaction as the result is consumed, ``fetch_size`` records per pull."""
+        query = """
+        MATCH (u1:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(u2:User)
+        RETURN id(t)           AS id,
+               id(u1)         AS fromId,
+               id(u2)         AS toId,
+               t.amount       AS amt,
+               t.currency     AS currency,
+               toString(t.timestamp) AS ts,
+               t.description  AS desc,
+               t.deviceId     AS deviceId
+        """
+        with self._session(LANE_HEAVY, fetch_size=fetch_size) as session:
+            for record in session.run(query):
+                yield Transaction(
+                    id=record["id"],
+                    fromUserId=record["fromId"],
+                    toUserId=record["toId"],
+                    amount=record["amt"],
+                    currency=record["currency"],
+                    timestamp=record["ts"],
+                    description=record["desc"],
+                    deviceId=record["deviceId"]
+                )
+
     def get_all_currencies(self) -> List[str]:
-        with self.driver.session() as session:
+        with self._session() as session:
             return session.execute_read(self._get_all_currencies_tx)
 
     @staticmethod
@@ -249,7 +944,7 @@ class Neo4jDriver:
         description_query: Optional[str] = None,
         device_query: Optional[str] = None
     ) -> dict:
-        with self.driver.session() as session:
+        with self._session() as session:
             return session.execute_read(
                 self._get_transactions_paginated_tx,
                 page, page_size, min_amount, max_amount, currency,
@@ -257,8 +952,7 @@ class Neo4jDriver:
             )
 
     @staticmethod
-    def _get_transactions_paginated_tx(
-        tx, page: int, page_size: int,
+    def _transaction_filters(
         min_amount: Optional[float],
         max_amount: Optional[float],
         currency: Optional[str],
@@ -266,13 +960,10 @@ class Neo4jDriver:
         end_date: Optional[str],
         description_query: Optional[str],
         device_query: Optional[str]
-    ):
-        # Calculate skip
-        skip = (page - 1) * page_size
-
-        # Build WHERE clauses
+    ) -> Tuple[str, str, dict]:
+        """MATCH clause, WHERE clause and parameters for the transaction list filters."""
         where_clauses = []
-        params = {"skip": skip, "limit": page_size}
+        params = {}
 
         if min_amount is not None:
             where_clauses.append("t.amount >= $minAmount")
@@ -294,21 +985,48 @@ class Neo4jDriver:
             where_clauses.append("t.timestamp <= datetime($endDate)")
             params["endDate"] = end_date
 
-        if description_query:
-            where_clauses.append("toLower(t.description) CONTAINS $descQuery")
-            params["descQuery"] = description_query.lower()
+        match_clause = "MATCH (u1:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(u2:User)"
+        if description_query and lucene_query(description_query, "description"):
+            # Start from the full-text hits instead of scanning every description
+            match_clause = """
+            CALL db.index.fulltext.queryNodes('transaction_search', $descQuery) YIELD node AS t
+            MATCH (u1:User)-[:SENT]->(t)-[:RECEIVED_BY]->(u2:User)
+            """
+            params["descQuery"] = lucene_query(description_query, "description")
 
         if device_query:
-            where_clauses.append("t.deviceId IS NOT NULL AND toLower(t.deviceId) CONTAINS $deviceQuery")
-            params["deviceQuery"] = device_query.lower()
+            # Case-insensitive prefix match on the lowercased copy, backed by
+            # its range index (a CONTAINS over toLower() scanned every node)
+            where_clauses.append("t.deviceIdLower STARTS WITH $deviceQuery")
+            params["deviceQuery"] = device_query.strip().lower()
 
         where_clause = ""
         if where_clauses:
             where_clause = "WHERE " + " AND ".join(where_clauses)
+        return match_clause, where_clause, params
+
+    @staticmethod
+    def _get_transactions_paginated_tx(
+        tx, page: int, page_size: int,
+        min_amount: Optional[float],
+        max_amount: Optional[float],
+        currency: Optional[str],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        description_query: Optional[str],
+        device_query: Optional[str]
+    ):
+        # Calculate skip
+        skip = (page - 1) * page_size
+
+        match_clause, where_clause, params = Neo4jDriver._transaction_filters(
+            min_amount, max_amount, currency, start_date, end_date, description_query, device_query
+        )
+        params.update(skip=skip, limit=page_size)
 
         # Get total count
         count_query = f"""
-        MATCH (u1:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(u2:User)
+        {match_clause}
         {where_clause}
         RETURN count(t) AS total
         """
@@ -317,7 +1035,7 @@ class Neo4jDriver:
 
         # Get paginated data
         data_query = f"""
-        MATCH (u1:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(u2:User)
+        {match_clause}
         {where_clause}
         RETURN id(t)           AS id,
                id(u1)         AS fromId,
@@ -354,216 +1072,270 @@ class Neo4jDriver:
             "totalPages": (total + page_size - 1) // page_size
         }
 
-    def get_user_relationships(self, user_id: int) -> Tuple[User, UserConnections]:
-        with self.driver.session() as session:
-            # Get user
-            user = session.execute_read(self._get_user_by_id, user_id)
-            if not user:
-                raise Exception("user not found")
-
-            # Get connections
-            shared_users = session.execute_read(self._get_shared_users, user_id)
-            sent_txs = session.execute_read(self._get_sent_transactions, user_id)
-            received_txs = session.execute_read(self._get_received_transactions, user_id)
-
-            connections = UserConnections(
-                users=shared_users,
-                transactions=sent_txs + received_txs
-            )
-
-            return user, connections
-
-    @staticmethod
-    def _get_user_by_id(tx, user_id: int) -> Optional[User]:
-        query = """
-        MATCH (u:User) WHERE id(u) = $uid
-        RETURN id(u), u.name, u.email, u.phone
+    def get_transaction_facets(
+        self,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        currency: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        description_query: Optional[str] = None,
+        device_query: Optional[str] = None,
+        interval: str = "month",
+        top_devices: int = 10,
+        amount_edges: Optional[List[float]] = None
+    ) -> dict:
         """
-        result = tx.run(query, uid=user_id)
-        record = result.single()
-        if record:
-            return User(
-                id=record[0],
-                name=record[1],
-                email=record[2],
-                phone=record[3]
+        Counts for the transaction filter panel under the same filters as
+        get_transactions_paginated: ``total``, ``currencies`` and ``devices``
+        (``{"value", "count"}``, largest first, top ``top_devices`` devices),
+        ``amounts`` (``{"bucket", "count"}``, bucket ``i`` starting at
+        ``amount_edges[i - 1]``) and ``dates`` (``{"period", "count"}``, periods
+        truncated to ``interval``). Empty buckets are omitted.
+        """
+        if interval not in FACET_INTERVALS:
+            raise ValueError(f"interval must be one of: {', '.join(FACET_INTERVALS)}")
+        with self._session() as session:
+            return session.execute_read(
+                self._get_transaction_facets_tx,
+                min_amount, max_amount, currency, start_date, end_date,
+                description_query, device_query, interval, top_devices,
+                amount_edges or AMOUNT_BUCKET_EDGES
             )
-        return None
 
     @staticmethod
-    def _get_shared_users(tx, user_id: int) -> List[RelConnection]:
-        query = """
-        MATCH (u:User)-[r:SHARED_EMAIL|SHARED_PHONE]-(o:User)
-        WHERE id(u) = $uid
-        RETURN type(r), id(o), o.name, o.email, o.phone
+    def _get_transaction_facets_tx(
+        tx,
+        min_amount: Optional[float],
+        max_amount: Optional[float],
+        currency: Optional[str],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        description_query: Optional[str],
+        device_query: Optional[str],
+        interval: str,
+        top_devices: int,
+        amount_edges: List[float]
+    ) -> dict:
+        match_clause, where_clause, params = Neo4jDriver._transaction_filters(
+            min_amount, max_amount, currency, start_date, end_date, description_query, device_query
+        )
+        params.update(interval=interval, topDevices=top_devices, amountEdges=amount_edges)
+        # One pass over the matching transactions groups them into cells of
+        # (currency, amount bucket, period, device); each facet then sums the
+        # cells, which are far fewer than the transactions
+        query = f"""
+        {match_clause}
+        {where_clause}
+        WITH t.currency AS currency,
+             size([e IN $amountEdges WHERE e <= t.amount]) AS bucket,
+             toString(date.truncate($interval, t.timestamp)) AS period,
+             t.deviceId AS deviceId,
+             count(*) AS n
+        WITH collect({{currency: currency, bucket: bucket, period: period, deviceId: deviceId, n: n}}) AS cells
+        CALL {{
+            WITH cells UNWIND cells AS c
+            WITH c.currency AS value, sum(c.n) AS n
+            WHERE value IS NOT NULL
+            ORDER BY n DESC, value
+            RETURN collect({{value: value, count: n}}) AS currencies
+        }}
+        CALL {{
+            WITH cells UNWIND cells AS c
+            WITH c.bucket AS bucket, sum(c.n) AS n
+            ORDER BY bucket
+            RETURN collect({{bucket: bucket, count: n}}) AS amounts
+        }}
+        CALL {{
+            WITH cells UNWIND cells AS c
+            WITH c.period AS period, sum(c.n) AS n
+            WHERE period IS NOT NULL
+            ORDER BY period
+            RETURN collect({{period: period, count: n}}) AS dates
+        }}
+        CALL {{
+            WITH cells UNWIND cells AS c
+            WITH c.deviceId AS value, sum(c.n) AS n
+            WHERE value IS NOT NULL
+            ORDER BY n DESC, value
+            LIMIT $topDevices
+            RETURN collect({{value: value, count: n}}) AS devices
+        }}
+        RETURN reduce(total = 0, c IN cells | total + c.n) AS total,
+               currencies, amounts, dates, devices
         """
-        result = tx.run(query, uid=user_id)
-        connections = []
-        for record in result:
-            connections.append(RelConnection(
-                node=User(
-                    id=record[1],
-                    name=record[2],
-                    email=record[3],
-                    phone=record[4]
-                ),
-                relationship=record[0]
-            ))
-        return connections
+        record = tx.run(query, params).single()
+        return {
+            "total": record["total"],
+            "currencies": record["currencies"],
+            "amounts": record["amounts"],
+            "dates": record["dates"],
+            "devices": record["devices"],
+        }
 
-    @staticmethod
-    def _get_sent_transactions(tx, user_id: int) -> List[RelConnection]:
-        query = """
-        MATCH (u:User)-[r:SENT]->(t:Transaction)-[:RECEIVED_BY]->(v:User)
-        WHERE id(u) = $uid
-        RETURN type(r), id(t), id(u), id(v),
-               t.amount, t.currency, toString(t.timestamp), t.description, t.deviceId
-        """
-        result = tx.run(query, uid=user_id)
-        connections = []
-        for record in result:
-            connections.append(RelConnection(
-                node=Transaction(
-                    id=record[1],
-                    fromUserId=record[2],
-                    toUserId=record[3],
-                    amount=record[4],
-                    currency=record[5],
-                    timestamp=record[6],
-                    description=record[7],
-                    deviceId=record[8]
-                ),
-                relationship=record[0]
-            ))
-        return connections
+    def get_user_relationships(self, user_id: int) -> Tuple[User, UserConnections]:
+        found = self.get_users_relationships([user_id])
+        if user_id not in found:
+            raise Exception("user not found")
+        return found[user_id]
+
+    def get_users_relationships(self, user_ids: List[int]) -> dict:
+        """``{userId: (User, UserConnections)}`` for the ids that exist, in one query."""
+        with self._session() as session:
+            return session.execute_read(self._get_users_relationships_tx, user_ids)
 
     @staticmethod
-    def _get_received_transactions(tx, user_id: int) -> List[RelConnection]:
+    def _get_users_relationships_tx(tx, user_ids: List[int]) -> dict:
+        # SHARED_EMAIL / SHARED_PHONE are derived from the identifier nodes,
+        # SAME_ENTITY links come from entity resolution
         query = """
-        MATCH (x:User)-[:SENT]->(t:Transaction)-[r:RECEIVED_BY]->(u:User)
-        WHERE id(u) = $uid
-        RETURN type(r), id(t), id(x), id(u),
-               t.amount, t.currency, toString(t.timestamp), t.description, t.deviceId
+        UNWIND $ids AS uid
+        MATCH (u:User) WHERE id(u) = uid
+        CALL {
+            WITH u
+            MATCH (u)-[:HAS_EMAIL]->(:Email)<-[:HAS_EMAIL]-(o:User)
+            WHERE o <> u
+            RETURN collect(DISTINCT [id(o), o.name, o.email, o.phone]) AS sharedEmail
+        }
+        CALL {
+            WITH u
+            MATCH (u)-[:HAS_PHONE]->(:Phone)<-[:HAS_PHONE]-(o:User)
+            WHERE o <> u
+            RETURN collect(DISTINCT [id(o), o.name, o.email, o.phone]) AS sharedPhone
+        }
+        CALL {
+            WITH u
+            MATCH (u)-[:SAME_ENTITY]-(o:User)
+            RETURN collect(DISTINCT [id(o), o.name, o.email, o.phone]) AS sameEntity
+        }
+        CALL {
+            WITH u
+            MATCH (u)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(v:User)
+            RETURN collect([id(t), id(u), id(v), t.amount, t.currency,
+                            toString(t.timestamp), t.description, t.deviceId]) AS sent
+        }
+        CALL {
+            WITH u
+            MATCH (x:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(u)
+            RETURN collect([id(t), id(x), id(u), t.amount, t.currency,
+                            toString(t.timestamp), t.description, t.deviceId]) AS received
+        }
+        RETURN id(u) AS id, u.name AS name, u.email AS email, u.phone AS phone,
+               sharedEmail, sharedPhone, sameEntity, sent, received
         """
-        result = tx.run(query, uid=user_id)
-        connections = []
-        for record in result:
-            connections.append(RelConnection(
-                node=Transaction(
-                    id=record[1],
-                    fromUserId=record[2],
-                    toUserId=record[3],
-                    amount=record[4],
-                    currency=record[5],
-                    timestamp=record[6],
-                    description=record[7],
-                    deviceId=record[8]
-                ),
-                relationship=record[0]
-            ))
-        return connections
+        found = {}
+        for record in tx.run(query, ids=user_ids):
+            users = [
+                RelConnection(node=User(id=o[0], name=o[1], email=o[2], phone=o[3]), relationship=rel)
+                for rel, key in (
+                    ("SHARED_EMAIL", "sharedEmail"), ("SHARED_PHONE", "sharedPhone"), ("SAME_ENTITY", "sameEntity")
+                )
+                for o in record[key]
+            ]
+            transactions = [
+                RelConnection(
+                    node=Transaction(
+                        id=t[0],
+                        fromUserId=t[1],
+                        toUserId=t[2],
+                        amount=t[3],
+                        currency=t[4],
+                        timestamp=t[5],
+                        description=t[6],
+                        deviceId=t[7]
+                    ),
+                    relationship=rel
+                )
+                for rel, key in (("SENT", "sent"), ("RECEIVED_BY", "received"))
+                for t in record[key]
+            ]
+            user = User(id=record["id"], name=record["name"], email=record["email"], phone=record["phone"])
+            found[record["id"]] = (user, UserConnections(users=users, transactions=transactions))
+        return found
 
     def get_transaction_relationships(self, tx_id: int) -> Tuple[Transaction, TxConnections]:
-        with self.driver.session() as session:
-            # Get transaction
-            tx_node = session.execute_read(self._get_transaction_by_id, tx_id)
-            if not tx_node:
-                raise Exception("transaction not found")
-
-            # Get sender and receiver
-            users = session.execute_read(self._get_transaction_users, tx_id)
-
-            connections = TxConnections(users=users)
+        found = self.get_transactions_relationships([tx_id])
+        if tx_id not in found:
+            raise Exception("transaction not found")
+        return found[tx_id]
 
-            return tx_node, connections
+    def get_transactions_relationships(self, tx_ids: List[int]) -> dict:
+        """``{transactionId: (Transaction, TxConnections)}`` for the ids that exist, in one query."""
+        with self._session() as session:
+            return session.execute_read(self._get_transactions_relationships_tx, tx_ids)
 
     @staticmethod
-    def _get_transaction_by_id(tx, tx_id: int) -> Optional[Transaction]:
+    def _get_transactions_relationships_tx(tx, tx_ids: List[int]) -> dict:
         query = """
-        MATCH (t:Transaction)
-        WHERE id(t) = $txid
-        RETURN id(t), t.amount, t.currency,
-               toString(t.timestamp), t.description, t.deviceId
+        UNWIND $ids AS tid
+        MATCH (t:Transaction) WHERE id(t) = tid
+        OPTIONAL MATCH (s:User)-[:SENT]->(t)
+        OPTIONAL MATCH (t)-[:RECEIVED_BY]->(r:User)
+        RETURN id(t)          AS id,
+               t.amount       AS amt,
+               t.currency     AS currency,
+               toString(t.timestamp) AS ts,
+               t.description  AS desc,
+               t.deviceId     AS deviceId,
+               id(s) AS senderId, s.name AS senderName, s.email AS senderEmail, s.phone AS senderPhone,
+               id(r) AS receiverId, r.name AS receiverName, r.email AS receiverEmail, r.phone AS receiverPhone
         """
-        result = tx.run(query, txid=tx_id)
-        record = result.single()
-        if record:
-            return Transaction(
-                id=record[0],
-                fromUserId=0,  # Will be filled by relationships
-                toUserId=0,    # Will be filled by relationships
-                amount=record[1],
-                currency=record[2],
-                timestamp=record[3],
-                description=record[4],
-                deviceId=record[5]
+        found = {}
+        for record in tx.run(query, ids=tx_ids):
+            users = []
+            for prefix, rel in (("sender", "SENT"), ("receiver", "RECEIVED_BY")):
+                if record[prefix + "Id"] is not None:
+                    users.append(RelConnection(
+                        node=User(
+                            id=record[prefix + "Id"],
+                            name=record[prefix + "Name"],
+                            email=record[prefix + "Email"],
+                            phone=record[prefix + "Phone"]
+                        ),
+                        relationship=rel
+                    ))
+            transaction = Transaction(
+                id=record["id"],
+                fromUserId=record["senderId"] or 0,
+                toUserId=record["receiverId"] or 0,
+                amount=record["amt"],
+                currency=record["currency"],
+                timestamp=record["ts"],
+                description=record["desc"],
+                deviceId=record["deviceId"]
             )
-        return None
-
-    @staticmethod
-    def _get_transaction_users(tx, tx_id: int) -> List[RelConnection]:
-        # Get sender
-        query_sender = """
-        MATCH (u:User)-[r:SENT]->(t:Transaction)
-        WHERE id(t) = $txid
-        RETURN type(r), id(u), u.name, u.email, u.phone
-        """
-        result = tx.run(query_sender, txid=tx_id)
-        users = []
-        record = result.single()
-        if record:
-            users.append(RelConnection(
-                node=User(
-                    id=record[1],
-                    name=record[2],
-                    email=record[3],
-                    phone=record[4]
-                ),
-                relationship=record[0]
-            ))
-
-        # Get receiver
-        query_receiver = """
-        MATCH (t:Transaction)-[r:RECEIVED_BY]->(u:User)
-        WHERE id(t) = $txid
-        RETURN type(r), id(u), u.name, u.email, u.phone
-        """
-        result = tx.run(query_receiver, txid=tx_id)
-        record = result.single()
-        if record:
-            users.append(RelConnection(
-                node=User(
-                    id=record[1],
-                    name=record[2],
-                    email=record[3],
-                    phone=record[4]
-                ),
-                relationship=record[0]
-            ))
-
-        return users
+            found[record["id"]] = (transaction, TxConnections(users=users))
+        return found
 
     def shortest_path_segments(self, from_id: int, to_id: int) -> List[PathSegment]:
-        with self.driver.session() as session:
+        with self._session(LANE_HEAVY) as session:
             return session.execute_read(self._shortest_path_tx, from_id, to_id)
 
     @staticmethod
     def _shortest_path_tx(tx, from_id: int, to_id: int) -> List[PathSegment]:
         query = """
-        MATCH (a:User),(b:User), p = shortestPath((a)-[*]-(b))
+        // Money flows plus the shared Device / Email / Phone nodes (what the
+        // old SHARED_* edges connected); Block and SAME_ENTITY links are
+        // resolver bookkeeping and would short-circuit every path
+        MATCH (a:User),(b:User),
+              p = shortestPath((a)-[:SENT|RECEIVED_BY|USED_DEVICE|HAS_EMAIL|HAS_PHONE*]-(b))
         WHERE id(a) = $from AND id(b) = $to
         UNWIND relationships(p) AS r
         WITH r, startNode(r) AS fn, endNode(r) AS tn
         RETURN
           labels(fn)[0]                                        AS fromLabel,
           id(fn)                                               AS fromId,
-          CASE WHEN fn:User THEN fn.name ELSE '' END           AS fromName,
-          CASE WHEN fn:Transaction THEN fn.deviceId ELSE '' END AS fromDeviceId,
+          CASE WHEN fn:User THEN fn.name
+               WHEN fn:Email THEN fn.address
+               WHEN fn:Phone THEN fn.number ELSE '' END        AS fromName,
+          CASE WHEN fn:Transaction OR fn:Device THEN fn.deviceId ELSE '' END AS fromDeviceId,
 
           labels(tn)[0]                                        AS toLabel,
           id(tn)                                               AS toId,
-          CASE WHEN tn:User THEN tn.name ELSE '' END           AS toName,
-          CASE WHEN tn:Transaction THEN tn.deviceId ELSE '' END AS toDeviceId,
+          CASE WHEN tn:User THEN tn.name
+               WHEN tn:Email THEN tn.address
+               WHEN tn:Phone THEN tn.number ELSE '' END        AS toName,
+          CASE WHEN tn:Transaction OR tn:Device THEN tn.deviceId ELSE '' END AS toDeviceId,
 
           type(r)                                              AS relationship
         """
@@ -592,27 +1364,399 @@ class Neo4jDriver:
             raise Exception("no path found")
         return segments
 
-    def cluster_transactions(self) -> List[TransactionCluster]: 
-        with self.driver.session() as session: 
-            return session.execute_read(self._cluster_transactions_tx) 
-        
+    def get_money_flow_edges(
+        self, user_ids: List[int], min_amount: float = 0.0,
+        from_millis: Optional[int] = None, to_millis: Optional[int] = None
+    ) -> List[Tuple[int, int, int, float, int]]:
+        """
+        Outgoing money flows of the given senders as
+        ``(fromUserId, transactionId, toUserId, amount, epochMillis)``,
+        optionally limited to a time range.
+        """
+        with self._session(LANE_HEAVY) as session:
+            return session.execute_read(
+                self._get_money_flow_edges_tx, user_ids, min_amount, from_millis, to_millis
+            )
+
     @staticmethod
-    def _cluster_transactions_tx(tx): # Create an in-memory graph 
-        tx.run(""" CALL gds.graph.drop('txGraph', false) YIELD graphName """) 
-        tx.run(""" CALL gds.graph.project( 'txGraph', 'Transaction', { ALL: { type: '*', orientation: 'UNDIRECTED' } } ) """) 
-        # Run GDS WCC 
-        result = tx.run("""
-    CALL gds.wcc.stream('txGraph')
-    YIELD nodeId, componentId
-    WITH gds.util.asNode(nodeId) AS tx, componentId
-    RETURN id(tx) AS transactionId, componentId AS clusterId
-    ORDER BY transactionId
-""")
-        clusters = [] 
-        for record in result: 
-            clusters.append(TransactionCluster( transactionId=record["transactionId"], clusterId=record["clusterId"] )) 
+    def _get_money_flow_edges_tx(tx, user_ids: List[int], min_amount: float,
+                                 from_millis: Optional[int], to_millis: Optional[int]) -> list:
+        query = """
+        UNWIND $userIds AS uid
+        MATCH (u:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(v:User)
+        WHERE id(u) = uid
+          AND t.amount >= $minAmount
+          AND t.timestamp IS NOT NULL
+          AND ($fromMillis IS NULL OR t.timestamp.epochMillis >= $fromMillis)
+          AND ($toMillis IS NULL OR t.timestamp.epochMillis <= $toMillis)
+        RETURN uid AS fromId, id(t) AS txId, id(v) AS toId, t.amount AS amount,
+               t.timestamp.epochMillis AS ts
+        """
+        result = tx.run(query, userIds=user_ids, minAmount=min_amount,
+                        fromMillis=from_millis, toMillis=to_millis)
+        return [
+            (record["fromId"], record["txId"], record["toId"], record["amount"], record["ts"])
+            for record in result
+        ]
+
+    def stream_money_flow_edges(self, min_amount: float = 0.0, fetch_size: int = 10000):
+        """Every money flow of at least ``min_amount``, as get_money_flow_edges tuples."""
+        query = """
+        MATCH (u:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(v:User)
+        WHERE t.amount >= $minAmount AND t.timestamp IS NOT NULL
+        RETURN id(u) AS fromId, id(t) AS txId, id(v) AS toId, t.amount AS amount,
+               t.timestamp.epochMillis AS ts
+        """
+        with self._session(LANE_BACKGROUND, fetch_size=fetch_size) as session:
+            for record in session.run(query, minAmount=min_amount):
+                yield record["fromId"], record["txId"], record["toId"], record["amount"], record["ts"]
+
+    def gds_available(self) -> bool:
+        try:
+            with self._session() as session:
+                session.run("RETURN gds.version() AS version").consume()
+            return True
+        except Exception:
+            return False
+
+    def compute_centrality_gds(self, algorithms: List[str], run_id: str, betweenness_samples: int = 256) -> int:
+        """
+        Project the user-to-user money-flow graph (one relationship per sender /
+        receiver pair, weighted by total amount) and write the requested scores
+        onto the User nodes with the GDS write procedures. Scored users are
+        stamped with ``run_id`` as ``centralityRunId``.
+        """
+        with self._session(LANE_BACKGROUND) as session:
+            return session.execute_write(self._compute_centrality_gds_tx, algorithms, run_id, betweenness_samples)
+
+    @staticmethod
+    def _compute_centrality_gds_tx(tx, algorithms: List[str], run_id: str, betweenness_samples: int) -> int:
+        tx.run("CALL gds.graph.drop('moneyFlow', false) YIELD graphName").consume()
+        project_query = """
+        MATCH (u1:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(u2:User)
+        WITH u1, u2, sum(t.amount) AS amount
+        WITH gds.graph.project('moneyFlow', u1, u2, { relationshipProperties: { amount: amount } }) AS g
+        RETURN g.nodeCount AS nodeCount
+        """
+        node_count = tx.run(project_query).single()["nodeCount"]
+        try:
+            if "pageRank" in algorithms:
+                tx.run("""
+                CALL gds.pageRank.write('moneyFlow', {
+                  relationshipWeightProperty: 'amount', writeProperty: 'pageRank'
+                })
+                YIELD nodePropertiesWritten
+                RETURN nodePropertiesWritten
+                """).consume()
+            if "betweenness" in algorithms and node_count:
+                tx.run("""
+                CALL gds.betweenness.write('moneyFlow', {
+                  writeProperty: 'betweenness', samplingSize: $samples
+                })
+                YIELD nodePropertiesWritten
+                RETURN nodePropertiesWritten
+                """, samples=min(betweenness_samples, node_count)).consume()
+            # Same users as the projection
+            tx.run("""
+            MATCH (u1:User)-[:SENT]->(:Transaction)-[:RECEIVED_BY]->(u2:User)
+            UNWIND [u1, u2] AS u
+            WITH DISTINCT u
+            SET u.centralityRunId = $runId
+            """, runId=run_id).consume()
+        finally:
+            tx.run("CALL gds.graph.drop('moneyFlow', false) YIELD graphName").consume()
+        return node_count
+
+    def stream_money_flow_pairs(self, fetch_size: int = 10000):
+        """Yield ``(senderId, receiverId, totalAmount)`` per pair that exchanged money."""
+        query = """
+        MATCH (u1:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(u2:User)
+        RETURN id(u1) AS fromId, id(u2) AS toId, sum(t.amount) AS amount
+        """
+        with self._session(LANE_BACKGROUND, fetch_size=fetch_size) as session:
+            for record in session.run(query):
+                yield record["fromId"], record["toId"], float(record["amount"] or 0.0)
+
+    def write_user_scores(self, rows: List[dict]):
+        """Store ``{"id", "props"}`` score maps on User nodes."""
+        with self._session(LANE_BACKGROUND, scores=True) as session:
+            session.execute_write(self._write_user_scores_tx, rows)
+
+    @staticmethod
+    def _write_user_scores_tx(tx, rows: List[dict]):
+        query = """
+        UNWIND $rows AS row
+        MATCH (u:User) WHERE id(u) = row.id
+        SET u += row.props
+        """
+        tx.run(query, rows=rows)
+
+    def clear_stale_user_scores(self, algorithms: List[str], run_id: str, batch_size: int = 10000):
+        """
+        Remove the given scores from users that run ``run_id`` did not score
+        (they left the money-flow graph), so rankings only show the latest run.
+        Each statement commits in batches.
+        """
+        # One literal statement per score so each is reached through its index
+        statements = {
+            "pageRank": """
+            MATCH (u:User) WHERE u.pageRank IS NOT NULL AND coalesce(u.centralityRunId, '') <> $runId
+            CALL { WITH u REMOVE u.pageRank }
+            IN TRANSACTIONS OF $batch ROWS
+            """,
+            "betweenness": """
+            MATCH (u:User) WHERE u.betweenness IS NOT NULL AND coalesce(u.centralityRunId, '') <> $runId
+            CALL { WITH u REMOVE u.betweenness }
+            IN TRANSACTIONS OF $batch ROWS
+            """,
+        }
+        with self._session(LANE_BACKGROUND) as session:
+            for algorithm in algorithms:
+                session.run(statements[algorithm], runId=run_id, batch=batch_size).consume()
+        self.version.bump(scores=True)
+
+    def get_user_rankings(self, metric: str, page: int, page_size: int) -> dict:
+        with self._session() as session:
+            return session.execute_read(self._get_user_rankings_tx, metric, page, page_size)
+
+    @staticmethod
+    def _get_user_rankings_tx(tx, metric: str, page: int, page_size: int) -> dict:
+        # One literal query per metric so each is served from its own index
+        queries = {
+            "pageRank": (
+                "MATCH (u:User) WHERE u.pageRank IS NOT NULL RETURN count(u) AS total",
+                """
+                MATCH (u:User) WHERE u.pageRank IS NOT NULL
+                RETURN id(u) AS id, u.name AS name, u.email AS email, u.phone AS phone,
+                       u.pageRank AS score
+                ORDER BY u.pageRank DESC
+                SKIP $skip LIMIT $limit
+                """,
+            ),
+            "betweenness": (
+                "MATCH (u:User) WHERE u.betweenness IS NOT NULL RETURN count(u) AS total",
+                """
+                MATCH (u:User) WHERE u.betweenness IS NOT NULL
+                RETURN id(u) AS id, u.name AS name, u.email AS email, u.phone AS phone,
+                       u.betweenness AS score
+                ORDER BY u.betweenness DESC
+                SKIP $skip LIMIT $limit
+                """,
+            ),
+        }
+        count_query, data_query = queries[metric]
+        total = tx.run(count_query).single()["total"]
+        result = tx.run(data_query, skip=(page - 1) * page_size, limit=page_size)
+        hits = [
+            SearchHit(
+                node=User(id=r["id"], name=r["name"], email=r["email"], phone=r["phone"]),
+                score=r["score"]
+            )
+            for r in result
+        ]
+        return Neo4jDriver._search_page(hits, total, False, page, page_size)
+
+    def cluster_transactions(self) -> List[TransactionCluster]:
+        # Per-call projection name, so concurrent requests do not drop each other's graph
+        graph_name = f"txGraph-{uuid.uuid4().hex[:12]}"
+        with self._session(LANE_HEAVY) as session:
+            return session.execute_read(self._cluster_transactions_tx, graph_name)
+
+    @staticmethod
+    def _cluster_transactions_tx(tx, graph_name: str):
+        # Transactions are connected through the Device nodes they used
+        tx.run("""
+        CALL gds.graph.project($graphName, ['Transaction', 'Device'], { USED_DEVICE: { orientation: 'UNDIRECTED' } })
+        YIELD graphName
+        RETURN graphName
+        """, graphName=graph_name).consume()
+        try:
+            # Run GDS WCC
+            result = tx.run("""
+            CALL gds.wcc.stream($graphName)
+            YIELD nodeId, componentId
+            WITH gds.util.asNode(nodeId) AS tx, componentId
+            WHERE tx:Transaction
+            RETURN id(tx) AS transactionId, componentId AS clusterId
+            ORDER BY transactionId
+            """, graphName=graph_name)
+            clusters = []
+            for record in result:
+                clusters.append(TransactionCluster(transactionId=record["transactionId"], clusterId=record["clusterId"]))
+        finally:
+            tx.run("CALL gds.graph.drop($graphName, false) YIELD graphName", graphName=graph_name).consume()
         return clusters
 
+    def get_cluster_summaries(self, page: int, page_size: int, min_size: int = 2) -> dict:
+        """
+        Device-linked transaction clusters, largest first, aggregated in the
+        same pass that consumes the WCC stream. Only the requested page of
+        summaries leaves the database.
+        """
+        # Per-call projection name, so concurrent requests do not drop each other's graph
+        graph_name = f"txClusters-{uuid.uuid4().hex[:12]}"
+        with self._session(LANE_HEAVY) as session:
+            return session.execute_read(self._get_cluster_summaries_tx, graph_name, page, page_size, min_size)
+
+    @staticmethod
+    def _get_cluster_summaries_tx(tx, graph_name: str, page: int, page_size: int, min_size: int) -> dict:
+        tx.run("""
+        CALL gds.graph.project($graphName, ['Transaction', 'Device'], { USED_DEVICE: { orientation: 'UNDIRECTED' } })
+        YIELD graphName
+        RETURN graphName
+        """, graphName=graph_name).consume()
+        # WCC component ids change from run to run; a cluster is identified by
+        # its smallest transaction id instead, which is also the drill-down key.
+        # Only the sender row carries the amount, so the sum counts each
+        # transaction once while both parties feed the distinct user count.
+        query = """
+        CALL gds.wcc.stream($graphName)
+        YIELD nodeId, componentId
+        WITH gds.util.asNode(nodeId) AS t, componentId
+        WHERE t:Transaction
+        MATCH (u1:User)-[:SENT]->(t)-[:RECEIVED_BY]->(u2:User)
+        UNWIND [{user: u1, amount: t.amount}, {user: u2, amount: 0.0}] AS party
+        WITH componentId,
+             min(id(t))                 AS clusterId,
+             count(DISTINCT t)          AS transactionCount,
+             count(DISTINCT party.user) AS userCount,
+             count(DISTINCT CASE WHEN t.deviceId <> '' THEN t.deviceId END) AS deviceCount,
+             sum(party.amount)          AS totalAmount
+        WHERE transactionCount >= $minSize
+        WITH clusterId, transactionCount, userCount, deviceCount, totalAmount
+        ORDER BY transactionCount DESC, totalAmount DESC, clusterId
+        WITH collect({
+            clusterId: clusterId, transactionCount: transactionCount, userCount: userCount,
+            deviceCount: deviceCount, totalAmount: totalAmount
+        }) AS clusters
+        RETURN size(clusters) AS total, clusters[$skip..$skip + $limit] AS page
+        """
+        try:
+            record = tx.run(
+                query, graphName=graph_name, minSize=min_size,
+                skip=(page - 1) * page_size, limit=page_size
+            ).single()
+        finally:
+            tx.run("CALL gds.graph.drop($graphName, false) YIELD graphName", graphName=graph_name).consume()
+        total = record["total"] if record else 0
+        summaries = [
+            ClusterSummary(
+                clusterId=c["clusterId"],
+                transactionCount=c["transactionCount"],
+                userCount=c["userCount"],
+                deviceCount=c["deviceCount"],
+                totalAmount=round(float(c["totalAmount"] or 0.0), 2)
+            )
+            for c in (record["page"] if record else [])
+        ]
+        return {
+            "data": summaries,
+            "total": total,
+            "page": page,
+            "pageSize": page_size,
+            "totalPages": (total + page_size - 1) // page_size
+        }
+
+    def get_cluster_members(self, transaction_id: int, page: int, page_size: int,
+                            max_members: int = 100000) -> Optional[dict]:
+        """
+        The cluster containing ``transaction_id``: every transaction reachable
+        through shared devices, with one page of them returned in full.
+        """
+        with self._session(LANE_HEAVY) as session:
+            return session.execute_read(self._get_cluster_members_tx, transaction_id, page, page_size, max_members)
+
+    @staticmethod
+    def _get_cluster_members_tx(tx, transaction_id: int, page: int, page_size: int,
+                                max_members: int) -> Optional[dict]:
+        exists = tx.run(
+            "MATCH (t:Transaction) WHERE id(t) = $id RETURN id(t) AS id", id=transaction_id
+        ).single()
+        if not exists:
+            return None
+
+        # Breadth-first over transaction -> device -> transaction, expanding
+        # each device once, so the cost is linear in the cluster's edges
+        members = {transaction_id}
+        devices = set()
+        frontier = [transaction_id]
+        truncated = False
+        while frontier:
+            new_devices = [
+                r["id"] for r in tx.run("""
+                UNWIND $ids AS tid
+                MATCH (t:Transaction)-[:USED_DEVICE]->(d:Device) WHERE id(t) = tid
+                RETURN DISTINCT id(d) AS id
+                """, ids=frontier)
+                if r["id"] not in devices
+            ]
+            devices.update(new_devices)
+            if not new_devices:
+                break
+            frontier = [
+                r["id"] for r in tx.run("""
+                UNWIND $ids AS did
+                MATCH (d:Device)<-[:USED_DEVICE]-(t:Transaction) WHERE id(d) = did
+                RETURN DISTINCT id(t) AS id
+                """, ids=new_devices)
+                if r["id"] not in members
+            ]
+            members.update(frontier)
+            if len(members) >= max_members:
+                truncated = True
+                break
+
+        ordered = sorted(members)
+        page_ids = ordered[(page - 1) * page_size:page * page_size]
+        summary = tx.run("""
+        UNWIND $ids AS tid
+        MATCH (u1:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(u2:User) WHERE id(t) = tid
+        UNWIND [{user: u1, amount: t.amount}, {user: u2, amount: 0.0}] AS party
+        RETURN count(DISTINCT party.user) AS userCount, sum(party.amount) AS totalAmount
+        """, ids=ordered).single()
+        result = tx.run("""
+        UNWIND $ids AS tid
+        MATCH (u1:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(u2:User) WHERE id(t) = tid
+        RETURN id(t)          AS id,
+               id(u1)         AS fromId,
+               id(u2)         AS toId,
+               t.amount       AS amt,
+               t.currency     AS currency,
+               toString(t.timestamp) AS ts,
+               t.description  AS desc,
+               t.deviceId     AS deviceId
+        ORDER BY id
+        """, ids=page_ids)
+        transactions = [
+            Transaction(
+                id=record["id"],
+                fromUserId=record["fromId"],
+                toUserId=record["toId"],
+                amount=record["amt"],
+                currency=record["currency"],
+                timestamp=record["ts"],
+                description=record["desc"],
+                deviceId=record["deviceId"]
+            )
+            for record in result
+        ]
+        total = len(ordered)
+        return {
+            "cluster": ClusterSummary(
+                clusterId=ordered[0],
+                transactionCount=total,
+                userCount=summary["userCount"] if summary else 0,
+                deviceCount=len(devices),
+                totalAmount=round(float((summary["totalAmount"] if summary else 0.0) or 0.0), 2)
+            ),
+            "truncated": truncated,
+            "data": transactions,
+            "total": total,
+            "page": page,
+            "pageSize": page_size,
+            "totalPages": (total + page_size - 1) // page_size
+        }
+
     @staticmethod
     def _get_all_transaction_ids(tx) -> List[int]:
         query = "MATCH (t:Transaction) RETURN id(t)"
@@ -630,19 +1774,20 @@ class Neo4jDriver:
         return [(record[0], record[1]) for record in result]
 
     def get_statistics(self) -> Statistics:
-        with self.driver.session() as session:
+        with self._session() as session:
             stats = session.execute_read(self._get_statistics_tx)
             return stats
 
     @staticmethod
     def _get_statistics_tx(tx) -> Statistics:
+        # Each subquery is answered from the count store; IN_BLOCK edges are
+        # entity-resolution bookkeeping, not part of the graph
         query = """
-        MATCH (u:User)
-        WITH count(u) AS userCount
-        MATCH (t:Transaction)
-        WITH userCount, count(t) AS transactionCount
-        MATCH ()-[r]->()
-        RETURN userCount, transactionCount, count(r) AS relationshipCount
+        CALL { MATCH (u:User) RETURN count(u) AS userCount }
+        CALL { MATCH (t:Transaction) RETURN count(t) AS transactionCount }
+        CALL { MATCH ()-[r]->() RETURN count(r) AS allRelationships }
+        CALL { MATCH ()-[r:IN_BLOCK]->() RETURN count(r) AS blockRelationships }
+        RETURN userCount, transactionCount, allRelationships - blockRelationships AS relationshipCount
         """
         result = tx.run(query)
         record = result.single()
@@ -655,7 +1800,7 @@ class Neo4jDriver:
         return Statistics(userCount=0, transactionCount=0, relationshipCount=0)
 
     def export_graph(self) -> GraphExportResponse:
-        with self.driver.session() as session:
+        with self._session(LANE_HEAVY) as session:
             # Get all nodes
             nodes = session.execute_read(self._get_all_nodes)
 
@@ -672,8 +1817,10 @@ class Neo4jDriver:
 
     @staticmethod
     def _get_all_nodes(tx) -> List[GraphNode]:
+        # Block nodes and IN_BLOCK edges are the entity resolver's index,
+        # not graph data, and are left out of every export
         query = """
-        MATCH (n)
+        MATCH (n) WHERE NOT n:Block
         RETURN id(n) AS id,
                labels(n)[0] AS type,
                properties(n)    AS props
@@ -691,7 +1838,7 @@ class Neo4jDriver:
     @staticmethod
     def _get_all_relationships(tx) -> List[GraphRelationship]:
         query = """
-        MATCH (a)-[r]->(b)
+        MATCH (a)-[r]->(b) WHERE type(r) <> 'IN_BLOCK'
         RETURN id(a)             AS sourceId,
                labels(a)[0]       AS sourceType,
                type(r)            AS relationship,
@@ -712,22 +1859,25 @@ class Neo4jDriver:
 
     @staticmethod
     def _get_transaction_transaction_rels(tx) -> List[GraphRelationship]:
+        # SHARED_DEVICE pairs are derived from Device nodes for export consumers;
+        # an OR across both properties would plan as a cartesian product
         query = """
-        MATCH (t1:Transaction),(t2:Transaction)
+        MATCH (t1:Transaction) WHERE t1.ip IS NOT NULL
+        MATCH (t2:Transaction) WHERE t2.ip = t1.ip AND id(t1) < id(t2)
+        RETURN id(t1)        AS sourceId,
+               labels(t1)[0] AS sourceType,
+               'SHARED_IP'   AS relationship,
+               id(t2)        AS targetId,
+               labels(t2)[0] AS targetType
+        UNION ALL
+        MATCH (t1:Transaction)-[:USED_DEVICE]->(:Device)<-[:USED_DEVICE]-(t2:Transaction)
         WHERE id(t1) < id(t2)
-          AND (
-            (t1.ip IS NOT NULL AND t1.ip = t2.ip)
-             OR
-            (t1.deviceId IS NOT NULL AND t1.deviceId = t2.deviceId)
-          )
-        RETURN id(t1)                                   AS sourceId,
-               labels(t1)[0]                             AS sourceType,
-               CASE
-                 WHEN t1.ip = t2.ip THEN 'SHARED_IP'
-                 ELSE 'SHARED_DEVICE'
-               END                                         AS relationship,
-               id(t2)                                   AS targetId,
-               labels(t2)[0]                             AS targetType
+          AND NOT coalesce(t1.ip = t2.ip, false)
+        RETURN id(t1)          AS sourceId,
+               labels(t1)[0]   AS sourceType,
+               'SHARED_DEVICE' AS relationship,
+               id(t2)          AS targetId,
+               labels(t2)[0]   AS targetType
         """
         result = tx.run(query)
         rels = []
@@ -741,6 +1891,370 @@ class Neo4jDriver:
             ))
         return rels
 
+    def get_export_bounds(self, lane: str = LANE_BACKGROUND) -> dict:
+        """Highest node and relationship ids, used to split exports into id ranges."""
+        with self._session(lane) as session:
+            return session.execute_read(self._get_export_bounds_tx)
+
+    @staticmethod
+    def _get_export_bounds_tx(tx) -> dict:
+        query = """
+        CALL { MATCH (n) RETURN max(id(n)) AS maxNodeId }
+        CALL { MATCH ()-[r]->() RETURN max(id(r)) AS maxRelationshipId }
+        RETURN maxNodeId, maxRelationshipId
+        """
+        record = tx.run(query).single()
+        return {
+            "maxNodeId": record["maxNodeId"] if record["maxNodeId"] is not None else -1,
+            "maxRelationshipId": record["maxRelationshipId"] if record["maxRelationshipId"] is not None else -1
+        }
+
+    def export_partition(self, section: str, start: int, end: int, lane: str = LANE_BACKGROUND) -> list:
+        """
+        Rows for the ids in [start, end) of one export section ("nodes" or
+        "relationships"), as plain tuples in id order. Each call uses its own
+        session, so partitions can be read concurrently. Request-time exports
+        pass ``LANE_HEAVY`` to run under the heavy query timeout.
+        """
+        tx_function = self._export_nodes_tx if section == "nodes" else self._export_relationships_tx
+        with self._session(lane) as session:
+            return session.execute_read(tx_function, start, end)
+
+    @staticmethod
+    def _export_nodes_tx(tx, start: int, end: int) -> list:
+        # One id seek per id in the range rather than a scan filtered by id
+        query = """
+        UNWIND range($start, $end - 1) AS nodeId
+        MATCH (n) WHERE id(n) = nodeId AND NOT n:Block
+        RETURN id(n) AS id, labels(n)[0] AS type, properties(n) AS props
+        """
+        result = tx.run(query, start=start, end=end)
+        return [(record["id"], record["type"], record["props"]) for record in result]
+
+    @staticmethod
+    def _export_relationships_tx(tx, start: int, end: int) -> list:
+        query = """
+        UNWIND range($start, $end - 1) AS relId
+        MATCH (a)-[r]->(b) WHERE id(r) = relId AND type(r) <> 'IN_BLOCK'
+        RETURN id(a) AS src, labels(a)[0] AS srcType,
+               type(r) AS rel, id(b) AS tgt, labels(b)[0] AS tgtType
+        """
+        result = tx.run(query, start=start, end=end)
+        return [
+            (record["src"], record["srcType"], record["rel"], record["tgt"], record["tgtType"])
+            for record in result
+        ]
+
+    def stream_export_table(self, table: str, fetch_size: int = 10000):
+        """
+        Yield the rows of one typed export table ("users", "transactions" or
+        "edges") as tuples, pulling ``fetch_size`` records at a time from the
+        server so the full result is never held in memory.
+        """
+        queries = {
+            "users": """
+            MATCH (u:User)
+            RETURN id(u) AS id, u.name AS name, u.email AS email, u.phone AS phone
+            """,
+            "transactions": """
+            MATCH (u1:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(u2:User)
+            RETURN id(t) AS id, id(u1) AS fromUserId, id(u2) AS toUserId,
+                   t.amount AS amount, t.currency AS currency, t.timestamp AS timestamp,
+                   t.description AS description, t.deviceId AS deviceId
+            """,
+            "edges": """
+            MATCH (a)-[r]->(b) WHERE type(r) <> 'IN_BLOCK'
+            RETURN id(a) AS sourceId, labels(a)[0] AS sourceType,
+                   type(r) AS relationship, id(b) AS targetId, labels(b)[0] AS targetType
+            """,
+        }
+        if table not in queries:
+            raise ValueError(f"unknown export table: {table}")
+        with self._session(LANE_BACKGROUND, fetch_size=fetch_size) as session:
+            for record in session.run(queries[table]):
+                yield tuple(record.values())
+
+
+    def get_change_watermark(self, lag_ms: int = 5000) -> int:
+        """
+        Server time in epoch milliseconds minus ``lag_ms``. Writes still in
+        flight when a delta is taken commit with a timestamp below "now", so
+        the lag keeps them inside the next delta instead of losing them.
+        """
+        with self._session() as session:
+            return session.execute_read(self._get_change_watermark_tx, lag_ms)
+
+    @staticmethod
+    def _get_change_watermark_tx(tx, lag_ms: int) -> int:
+        return tx.run("RETURN timestamp() - $lag AS watermark", lag=lag_ms).single()["watermark"]
+
+    def stream_changes(self, since: int, until: int, fetch_size: int = 10000):
+        """
+        Yield ``("node", record)`` and ``("relationship", record)`` for every
+        element whose updatedAt is in [since, until), reached through the
+        updatedAt indexes so the cost follows the change volume.
+        """
+        nodes_query = """
+        MATCH (n:User) WHERE n.updatedAt >= $since AND n.updatedAt < $until
+        RETURN id(n) AS id, 'User' AS type, properties(n) AS props
+        UNION ALL
+        MATCH (n:Transaction) WHERE n.updatedAt >= $since AND n.updatedAt < $until
+        RETURN id(n) AS id, 'Transaction' AS type, properties(n) AS props
+        UNION ALL
+        MATCH (n:Device) WHERE n.updatedAt >= $since AND n.updatedAt < $until
+        RETURN id(n) AS id, 'Device' AS type, properties(n) AS props
+        UNION ALL
+        MATCH (n:Email) WHERE n.updatedAt >= $since AND n.updatedAt < $until
+        RETURN id(n) AS id, 'Email' AS type, properties(n) AS props
+        UNION ALL
+        MATCH (n:Phone) WHERE n.updatedAt >= $since AND n.updatedAt < $until
+        RETURN id(n) AS id, 'Phone' AS type, properties(n) AS props
+        """
+        relationships_query = """
+        MATCH (a)-[r:SENT]->(b) WHERE r.updatedAt >= $since AND r.updatedAt < $until
+        RETURN id(r) AS id, id(a) AS sourceId, labels(a)[0] AS sourceType, type(r) AS relationship,
+               id(b) AS targetId, labels(b)[0] AS targetType, r.updatedAt AS updatedAt
+        UNION ALL
+        MATCH (a)-[r:RECEIVED_BY]->(b) WHERE r.updatedAt >= $since AND r.updatedAt < $until
+        RETURN id(r) AS id, id(a) AS sourceId, labels(a)[0] AS sourceType, type(r) AS relationship,
+               id(b) AS targetId, labels(b)[0] AS targetType, r.updatedAt AS updatedAt
+        UNION ALL
+        MATCH (a)-[r:USED_DEVICE]->(b) WHERE r.updatedAt >= $since AND r.updatedAt < $until
+        RETURN id(r) AS id, id(a) AS sourceId, labels(a)[0] AS sourceType, type(r) AS relationship,
+               id(b) AS targetId, labels(b)[0] AS targetType, r.updatedAt AS updatedAt
+        UNION ALL
+        MATCH (a)-[r:HAS_EMAIL]->(b) WHERE r.updatedAt >= $since AND r.updatedAt < $until
+        RETURN id(r) AS id, id(a) AS sourceId, labels(a)[0] AS sourceType, type(r) AS relationship,
+               id(b) AS targetId, labels(b)[0] AS targetType, r.updatedAt AS updatedAt
+        UNION ALL
+        MATCH (a)-[r:HAS_PHONE]->(b) WHERE r.updatedAt >= $since AND r.updatedAt < $until
+        RETURN id(r) AS id, id(a) AS sourceId, labels(a)[0] AS sourceType, type(r) AS relationship,
+               id(b) AS targetId, labels(b)[0] AS targetType, r.updatedAt AS updatedAt
+        """
+        with self._session(LANE_BACKGROUND, fetch_size=fetch_size) as session:
+            for record in session.run(nodes_query, since=since, until=until):
+                yield "node", record
+            for record in session.run(relationships_query, since=since, until=until):
+                yield "relationship", record
+
+
+    def get_archivable_transactions(self, cutoff: str, limit: int) -> list:
+        """
+        The oldest ``limit`` transactions before ``cutoff``, oldest first, as
+        ``(id, fromUserId, toUserId, amount, currency, timestamp, description,
+        deviceId)`` tuples (the columnar transactions layout).
+        """
+        with self._session(LANE_BACKGROUND) as session:
+            return session.execute_read(self._get_archivable_transactions_tx, cutoff, limit)
+
+    @staticmethod
+    def _get_archivable_transactions_tx(tx, cutoff: str, limit: int) -> list:
+        query = """
+        MATCH (u1:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(u2:User)
+        WHERE t.timestamp < datetime($cutoff)
+        RETURN id(t) AS id, id(u1) AS fromId, id(u2) AS toId, t.amount AS amount,
+               t.currency AS currency, t.timestamp AS ts, t.description AS description,
+               t.deviceId AS deviceId
+        ORDER BY ts, id
+        LIMIT $limit
+        """
+        return [tuple(record.values()) for record in tx.run(query, cutoff=cutoff, limit=limit)]
+
+    def archive_transactions(self, tx_ids: List[int], summaries: List[dict]) -> int:
+        """
+        Fold ``summaries`` into the users' DailySummary nodes and delete the
+        archived transactions, in one transaction. Summaries are
+        ``{"userId", "day", "currency", "sentCount", "sentAmount",
+        "receivedCount", "receivedAmount"}``. Returns the number deleted.
+        """
+        with self._session(LANE_BACKGROUND) as session:
+            return session.execute_write(self._archive_transactions_tx, tx_ids, summaries)
+
+    @staticmethod
+    def _archive_transactions_tx(tx, tx_ids: List[int], summaries: List[dict]) -> int:
+        summary_query = """
+        UNWIND $summaries AS s
+        MATCH (u:User) WHERE id(u) = s.userId
+        MERGE (d:DailySummary { key: toString(s.userId) + ':' + s.day + ':' + s.currency })
+        ON CREATE SET d.userId = s.userId, d.day = date(s.day), d.currency = s.currency,
+                      d.sentCount = 0, d.sentAmount = 0.0, d.receivedCount = 0, d.receivedAmount = 0.0,
+                      d.createdAt = timestamp()
+        SET d.sentCount      = d.sentCount + s.sentCount,
+            d.sentAmount     = d.sentAmount + s.sentAmount,
+            d.receivedCount  = d.receivedCount + s.receivedCount,
+            d.receivedAmount = d.receivedAmount + s.receivedAmount,
+            d.updatedAt      = timestamp()
+        MERGE (u)-[r:HAS_DAILY_SUMMARY]->(d)
+        ON CREATE SET r.createdAt = timestamp(), r.updatedAt = timestamp()
+        """
+        tx.run(summary_query, summaries=summaries).consume()
+        delete_query = """
+        UNWIND $ids AS id
+        MATCH (t:Transaction) WHERE id(t) = id
+        DETACH DELETE t
+        RETURN count(*) AS deleted
+        """
+        return tx.run(delete_query, ids=tx_ids).single()["deleted"]
+
+    def count_existing_transactions(self, tx_ids: List[int]) -> int:
+        with self._session(LANE_BACKGROUND) as session:
+            return session.execute_read(self._count_existing_transactions_tx, tx_ids)
+
+    @staticmethod
+    def _count_existing_transactions_tx(tx, tx_ids: List[int]) -> int:
+        query = """
+        UNWIND $ids AS id
+        MATCH (t:Transaction) WHERE id(t) = id
+        RETURN count(t) AS existing
+        """
+        return tx.run(query, ids=tx_ids).single()["existing"]
+
+
+    def set_entity_keys(self, rows: List[dict]):
+        """Store ``{"id", "emailKey", "phoneKey", "blocks"}`` rows and mark the users pending."""
+        with self._session(LANE_BACKGROUND) as session:
+            session.execute_write(self._set_entity_keys_tx, rows)
+
+    @staticmethod
+    def _set_entity_keys_tx(tx, rows: List[dict]):
+        # Blocks the user no longer belongs to (changed email or phone) are
+        # left first, so they stop yielding candidates and shrink back
+        query = """
+        UNWIND $rows AS row
+        MATCH (u:User) WHERE id(u) = row.id
+        SET u.emailKey = row.emailKey, u.phoneKey = row.phoneKey, u.entityPending = true
+        WITH u, row
+        CALL {
+          WITH u, row
+          MATCH (u)-[r:IN_BLOCK]->(old:Block)
+          WHERE NOT old.key IN row.blocks
+          SET old.size = old.size - 1
+          DELETE r
+        }
+        WITH u, row
+        UNWIND row.blocks AS key
+        MERGE (b:Block { key: key })
+        ON CREATE SET b.size = 0, b.createdAt = timestamp()
+        MERGE (u)-[r:IN_BLOCK]->(b)
+        ON CREATE SET r.createdAt = timestamp(), b.size = b.size + 1
+        """
+        tx.run(query, rows=rows).consume()
+
+    def stream_user_identifiers(self, fetch_size: int = 10000):
+        """Yield ``(id, email, phone)`` for every user."""
+        with self._session(LANE_BACKGROUND, fetch_size=fetch_size) as session:
+            for record in session.run("MATCH (u:User) RETURN id(u) AS id, u.email AS email, u.phone AS phone"):
+                yield record["id"], record["email"], record["phone"]
+
+    def get_pending_entity_users(self, limit: int) -> List[int]:
+        with self._session(LANE_BACKGROUND) as session:
+            return session.execute_read(self._get_pending_entity_users_tx, limit)
+
+    @staticmethod
+    def _get_pending_entity_users_tx(tx, limit: int) -> List[int]:
+        query = """
+        MATCH (u:User) WHERE u.entityPending = true
+        RETURN id(u) AS id
+        LIMIT $limit
+        """
+        return [record["id"] for record in tx.run(query, limit=limit)]
+
+    def get_unindexed_entity_users(self, limit: int) -> List[Tuple[int, str, str]]:
+        """``(id, email, phone)`` of pending users without keys yet (e.g. bulk-loaded ones)."""
+        with self._session(LANE_BACKGROUND) as session:
+            return session.execute_read(self._get_unindexed_entity_users_tx, limit)
+
+    @staticmethod
+    def _get_unindexed_entity_users_tx(tx, limit: int) -> List[Tuple[int, str, str]]:
+        query = """
+        MATCH (u:User) WHERE u.entityPending = true AND u.emailKey IS NULL
+        RETURN id(u) AS id, u.email AS email, u.phone AS phone
+        LIMIT $limit
+        """
+        return [(record["id"], record["email"], record["phone"]) for record in tx.run(query, limit=limit)]
+
+    def get_entity_candidates(self, user_ids: List[int], max_block_size: int) -> list:
+        """
+        ``(userId, user, candidateId, candidate)`` for every user sharing a
+        block of at most ``max_block_size`` members with one of ``user_ids``;
+        ``user`` / ``candidate`` are ``{"name", "emailKey", "phoneKey"}``.
+        """
+        with self._session(LANE_BACKGROUND) as session:
+            return session.execute_read(self._get_entity_candidates_tx, user_ids, max_block_size)
+
+    @staticmethod
+    def _get_entity_candidates_tx(tx, user_ids: List[int], max_block_size: int) -> list:
+        query = """
+        UNWIND $ids AS uid
+        MATCH (u:User)-[:IN_BLOCK]->(b:Block)
+        WHERE id(u) = uid AND b.size <= $maxBlock
+        MATCH (b)<-[:IN_BLOCK]-(o:User)
+        WHERE o <> u
+        WITH DISTINCT u, o
+        RETURN id(u) AS id, u.name AS name, u.emailKey AS emailKey, u.phoneKey AS phoneKey,
+               id(o) AS otherId, o.name AS otherName, o.emailKey AS otherEmailKey, o.phoneKey AS otherPhoneKey
+        """
+        return [
+            (
+                record["id"],
+                {"name": record["name"], "emailKey": record["emailKey"] or "", "phoneKey": record["phoneKey"] or ""},
+                record["otherId"],
+                {"name": record["otherName"], "emailKey": record["otherEmailKey"] or "",
+                 "phoneKey": record["otherPhoneKey"] or ""},
+            )
+            for record in tx.run(query, ids=user_ids, maxBlock=max_block_size)
+        ]
+
+    def write_entity_links(self, links: List[dict], resolved_ids: List[int]):
+        """MERGE ``{"a", "b", "score", "reasons"}`` SAME_ENTITY links and clear the users' pending flag."""
+        with self._session(LANE_BACKGROUND) as session:
+            session.execute_write(self._write_entity_links_tx, links, resolved_ids)
+
+    @staticmethod
+    def _write_entity_links_tx(tx, links: List[dict], resolved_ids: List[int]):
+        links_query = """
+        UNWIND $links AS link
+        MATCH (a:User) WHERE id(a) = link.a
+        MATCH (b:User) WHERE id(b) = link.b
+        MERGE (a)-[r:SAME_ENTITY]->(b)
+        ON CREATE SET r.createdAt = timestamp()
+        SET r.score = link.score, r.reasons = link.reasons, r.updatedAt = timestamp()
+        """
+        tx.run(links_query, links=links).consume()
+        resolved_query = """
+        UNWIND $ids AS uid
+        MATCH (u:User) WHERE id(u) = uid
+        REMOVE u.entityPending
+        """
+        tx.run(resolved_query, ids=resolved_ids).consume()
+
+    def get_entity_matches(self, user_id: int) -> Optional[List[EntityMatch]]:
+        """Users resolved as the same entity, best score first; None when the user does not exist."""
+        with self._session() as session:
+            return session.execute_read(self._get_entity_matches_tx, user_id)
+
+    @staticmethod
+    def _get_entity_matches_tx(tx, user_id: int) -> Optional[List[EntityMatch]]:
+        query = """
+        MATCH (u:User) WHERE id(u) = $id
+        OPTIONAL MATCH (u)-[r:SAME_ENTITY]-(o:User)
+        RETURN id(o) AS id, o.name AS name, o.email AS email, o.phone AS phone,
+               r.score AS score, r.reasons AS reasons
+        ORDER BY score DESC
+        """
+        records = list(tx.run(query, id=user_id))
+        if not records:
+            return None
+        return [
+            EntityMatch(
+                user=User(id=record["id"], name=record["name"], email=record["email"], phone=record["phone"]),
+                score=record["score"],
+                reasons=record["reasons"] or []
+            )
+            for record in records
+            if record["id"] is not None
+        ]
+
 
 def seed_data(driver: Neo4jDriver):
     """Seed sample data into the database"""
@@ -0,0 +1,212 @@
+"""
+Entity resolution over normalized user identifiers.
+
+Emails and phones are reduced to canonical keys when a user is written:
+lowercase emails without ``+tags`` (and without dots for Gmail), phones as
+bare digits without international or trunk prefixes. Each user also joins a
+few Block nodes keyed by coarse blocking keys (email domain plus the first
+letters of the local part, the last digits of the phone). Candidate pairs are
+only the users that share a block, so resolving a batch costs a bounded
+number of comparisons per user instead of one per pair of users. Oversized
+blocks are skipped rather than expanded.
+
+Pairs scoring at or above the threshold are linked with SAME_ENTITY. New
+users are marked pending and resolved in batches by a background thread.
+Bulk loaders only mark users pending; the thread computes their keys first.
+Users written before resolution existed are indexed by a backfill job.
+"""
+import re
+import threading
+import time
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+
+JOB_KIND = "entity-resolution"
+
+GMAIL_DOMAINS = {"gmail.com", "googlemail.com"}
+EMAIL_PREFIX_LENGTH = 4
+PHONE_SUFFIX_LENGTH = 7
+# A shorter number that is the tail of a longer one differs only by its
+# country code when at least this many digits are shared
+PHONE_MATCH_DIGITS = 9
+
+_NON_DIGITS = re.compile(r"\D")
+_NON_LETTERS = re.compile(r"[^a-z ]+")
+
+
+def normalize_email(raw: Optional[str]) -> str:
+    """Canonical email key, or '' when ``raw`` is not an address."""
+    email = (raw or "").strip().lower()
+    local, sep, domain = email.rpartition("@")
+    if not sep or not local or not domain:
+        return ""
+    local = local.split("+", 1)[0]
+    if domain in GMAIL_DOMAINS:
+        domain = "gmail.com"
+        local = local.replace(".", "")
+    return f"{local}@{domain}" if local else ""
+
+
+def normalize_phone(raw: Optional[str]) -> str:
+    """Digits of ``raw`` without an international (00) or trunk (0) prefix; '' if too short."""
+    digits = _NON_DIGITS.sub("", raw or "")
+    if digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = digits[1:]
+    return digits if len(digits) >= PHONE_SUFFIX_LENGTH else ""
+
+
+def normalize_name(raw: Optional[str]) -> str:
+    return " ".join(_NON_LETTERS.sub(" ", (raw or "").lower()).split())
+
+
+def blocking_keys(email_key: str, phone_key: str) -> List[str]:
+    # Coarse blocks find near matches; the exact-key blocks keep canonical
+    # matches reachable when a coarse block (a common prefix on a large
+    # domain) is too big to expand
+    keys = []
+    if email_key:
+        local, _, domain = email_key.partition("@")
+        keys += [f"email:{domain}:{local[:EMAIL_PREFIX_LENGTH]}", f"email-key:{email_key}"]
+    if phone_key:
+        keys += [f"phone:{phone_key[-PHONE_SUFFIX_LENGTH:]}", f"phone-key:{phone_key}"]
+    return keys
+
+
+def entity_keys(email: Optional[str], phone: Optional[str]) -> dict:
+    """``{"emailKey", "phoneKey", "blocks"}`` for one user's raw identifiers."""
+    email_key = normalize_email(email)
+    phone_key = normalize_phone(phone)
+    return {"emailKey": email_key, "phoneKey": phone_key, "blocks": blocking_keys(email_key, phone_key)}
+
+
+def _similarity(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio() if a and b else 0.0
+
+
+def score_pair(a: dict, b: dict) -> Tuple[float, List[str]]:
+    """
+    Match score in [0, 1] and its reasons for two ``{"name", "emailKey",
+    "phoneKey"}`` records. Equal canonical identifiers score 1; near-identical
+    email local parts on the same domain and equal phone tails score lower and
+    need a similar name to cross a typical threshold.
+    """
+    reasons = []
+    email = 0.0
+    if a["emailKey"] and a["emailKey"] == b["emailKey"]:
+        email = 1.0
+        reasons.append("email")
+    elif a["emailKey"] and b["emailKey"]:
+        local_a, _, domain_a = a["emailKey"].partition("@")
+        local_b, _, domain_b = b["emailKey"].partition("@")
+        similarity = _similarity(local_a, local_b)
+        if domain_a == domain_b and similarity >= 0.8:
+            email = 0.9 * similarity
+            reasons.append("email_similar")
+
+    phone = 0.0
+    short, long = sorted((a["phoneKey"], b["phoneKey"]), key=len)
+    if short and long.endswith(short) and (short == long or len(short) >= PHONE_MATCH_DIGITS):
+        phone = 1.0
+        reasons.append("phone")
+    elif short and short[-PHONE_SUFFIX_LENGTH:] == long[-PHONE_SUFFIX_LENGTH:]:
+        phone = 0.6
+        reasons.append("phone_suffix")
+
+    score = max(email, phone)
+    if 0.0 < score < 1.0:
+        name = _similarity(normalize_name(a["name"]), normalize_name(b["name"]))
+        score = 0.75 * score + 0.25 * name
+        if name >= 0.9:
+            reasons.append("name")
+    return round(score, 4), reasons
+
+
+class EntityResolver:
+    """Resolves pending users in batches, on a timer and on demand."""
+
+    def __init__(self, db, threshold: float = 0.85, batch_size: int = 500, max_block_size: int = 200,
+                 interval: float = 5.0):
+        self.db = db
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.max_block_size = max_block_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="entity-resolver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.resolve_pending()
+            except Exception as e:
+                print(f"Entity resolution failed: {e}")
+
+    def resolve_batch(self, user_ids: List[int]) -> int:
+        """Score every in-block candidate of ``user_ids`` and link the matches; returns links written."""
+        links = {}
+        for user_id, user, candidate_id, candidate in self.db.get_entity_candidates(user_ids, self.max_block_size):
+            pair = (min(user_id, candidate_id), max(user_id, candidate_id))
+            if pair in links:
+                continue
+            score, reasons = score_pair(user, candidate)
+            if score >= self.threshold:
+                links[pair] = {"a": pair[0], "b": pair[1], "score": score, "reasons": reasons}
+        self.db.write_entity_links(list(links.values()), user_ids)
+        return len(links)
+
+    def resolve_pending(self, job=None) -> dict:
+        """Resolve users until none are pending."""
+        with self._lock:
+            resolved = linked = 0
+            start = time.perf_counter()
+            self._index_unkeyed()
+            while True:
+                user_ids = self.db.get_pending_entity_users(self.batch_size)
+                if not user_ids:
+                    break
+                linked += self.resolve_batch(user_ids)
+                resolved += len(user_ids)
+                if job:
+                    job.update(resolved=resolved, links=linked)
+            if resolved:
+                print(f"Resolved {resolved} users, {linked} links in {time.perf_counter() - start:.1f}s")
+            return {"resolved": resolved, "links": linked}
+
+    def _index_unkeyed(self):
+        # Every pass sets emailKey (possibly ''), so the users leave the query
+        while True:
+            users = self.db.get_unindexed_entity_users(self.batch_size)
+            if not users:
+                return
+            self.db.set_entity_keys([dict(entity_keys(email, phone), id=user_id) for user_id, email, phone in users])
+
+    def backfill(self, job=None) -> dict:
+        """(Re)compute every user's keys and blocks in one pass, then resolve them all."""
+        indexed = 0
+        rows = []
+        for user_id, email, phone in self.db.stream_user_identifiers():
+            rows.append(dict(entity_keys(email, phone), id=user_id))
+            if len(rows) >= self.batch_size:
+                self.db.set_entity_keys(rows)
+                indexed += len(rows)
+                rows = []
+                if job:
+                    job.update(indexed=indexed)
+        if rows:
+            self.db.set_entity_keys(rows)
+            indexed += len(rows)
+        return dict(self.resolve_pending(job), indexed=indexed)
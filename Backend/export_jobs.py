@@ -0,0 +1,278 @@
+"""
+Partitioned, parallel graph export written to local disk.
+
+The node and relationship id spaces are split into fixed-size ranges. Ranges
+are read concurrently, each over its own session from the driver's pool, and
+encoded plus gzip-compressed in a process pool; every range becomes one gzip
+member. Members are concatenated in id order into a single
+``export.<format>.gz`` (itself a valid gzip stream) and ``manifest.json``
+records each member's byte offset, length and row count, so clients can resume
+a download with Range requests or fetch and decompress single parts.
+
+Columnar formats (parquet / arrow, see columnar.py) instead write one typed
+file per table, with the tables streamed concurrently.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+import columnar
+from jobs import Job, JobRegistry, STATUS_COMPLETED
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# Only offered when pyarrow is installed
+if columnar.available():
+    FORMATS.update({"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.file"})
+
+# Same layout as GET /api/export/csv
+CSV_NODE_HEADER = "# Nodes\nid,type,properties\n"
+CSV_RELATIONSHIP_HEADER = "\n# Relationships\nsource_id,source_type,relationship,target_id,target_type\n"
+
+JOB_KIND = "export"
+MANIFEST = "manifest.json"
+
+
+def encode_part(fmt: str, section: str, rows: list, path: str, level: int = 6) -> int:
+    """Encode rows and write them to ``path`` as one gzip member; runs in a worker process."""
+    out = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(out)
+        if section == "nodes":
+            for node_id, label, props in rows:
+                writer.writerow([node_id, label, json.dumps(props, default=str, ensure_ascii=False)])
+        else:
+            writer.writerows(rows)
+    else:
+        for row in rows:
+            if section == "nodes":
+                doc = {"kind": "node", "id": row[0], "type": row[1], "properties": row[2]}
+            else:
+                doc = {
+                    "kind": "relationship", "sourceId": row[0], "sourceType": row[1],
+                    "relationship": row[2], "targetId": row[3], "targetType": row[4]
+                }
+            out.write(json.dumps(doc, default=str, ensure_ascii=False))
+            out.write("\n")
+    data = gzip.compress(out.getvalue().encode("utf-8"), compresslevel=level)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def _plain(props: dict) -> dict:
+    # Neo4j temporal values become ISO strings before crossing the process boundary
+    return {k: v.isoformat() if hasattr(v, "isoformat") else v for k, v in props.items()}
+
+
+class ExportJobs:
+    """Runs partitioned exports as background jobs and tracks their files."""
+
+    def __init__(
+        self, db, registry: JobRegistry, directory: str, partition_size: int = 50000,
+        read_workers: int = 4, encode_workers: Optional[int] = None, compress_level: int = 6
+    ):
+        self.db = db
+        self.registry = registry
+        self.directory = directory
+        self.partition_size = partition_size
+        self.read_workers = read_workers
+        self.compress_level = compress_level
+        os.makedirs(directory, exist_ok=True)
+
+        if encode_workers is None:
+            encode_workers = os.cpu_count() or 1
+        self._encoders = None
+        if encode_workers > 0:
+            # Forked workers only run encode_part. The pool forks all of its
+            # workers on first use, so warm it up now, before the ingest and
+            # WAL threads exist.
+            context = multiprocessing.get_context("fork") \
+                if "fork" in multiprocessing.get_all_start_methods() else None
+            self._encoders = ProcessPoolExecutor(max_workers=encode_workers, mp_context=context)
+            self._encoders.submit(int).result()
+
+    def submit(self, fmt: str) -> Job:
+        return self.registry.submit(JOB_KIND, self._run, {"format": fmt})
+
+    def file_path(self, job: Job, table: Optional[str] = None) -> Optional[str]:
+        """
+        Path of a completed export's file, or None if it is not ready. Columnar
+        exports have one file per table and need ``table``.
+        """
+        if job.kind != JOB_KIND or job.status != STATUS_COMPLETED or not job.result:
+            return None
+        if "files" in job.result:
+            entry = job.result["files"].get(table or "")
+            if not entry:
+                return None
+            file_name = entry["file"]
+        else:
+            file_name = job.result["file"]
+        path = os.path.join(self.directory, job.id, file_name)
+        return path if os.path.exists(path) else None
+
+    def load_existing(self) -> int:
+        """Register exports finished before a restart so they stay downloadable."""
+        loaded = 0
+        for name in sorted(os.listdir(self.directory)):
+            job_dir = os.path.join(self.directory, name)
+            manifest_path = os.path.join(job_dir, MANIFEST)
+            if not os.path.isdir(job_dir):
+                continue
+            if not os.path.exists(manifest_path):
+                # Interrupted mid-export; its parts cannot be resumed
+                shutil.rmtree(job_dir, ignore_errors=True)
+                continue
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            job = Job(JOB_KIND, {"format": manifest["format"]}, job_id=name)
+            job.status = STATUS_COMPLETED
+            job.result = manifest
+            job.created_at = job.started_at = manifest["startedAt"]
+            job.finished_at = manifest["finishedAt"]
+            self.registry.add(job)
+            loaded += 1
+        return loaded
+
+    def shutdown(self):
+        if self._encoders:
+            self._encoders.shutdown(wait=False, cancel_futures=True)
+
+    def _partitions(self, bounds: dict) -> list:
+        size = self.partition_size
+        partitions = [("nodes", start, start + size) for start in range(0, bounds["maxNodeId"] + 1, size)]
+        partitions += [
+            ("relationships", start, start + size)
+            for start in range(0, bounds["maxRelationshipId"] + 1, size)
+        ]
+        return partitions
+
+    def _run(self, job: Job) -> dict:
+        fmt = job.params["format"]
+        started = time.time()
+        job_dir = os.path.join(self.directory, job.id)
+        if fmt in columnar.FORMATS:
+            manifest = self._run_columnar(job, fmt, job_dir)
+        else:
+            manifest = self._run_partitioned(job, fmt, job_dir)
+        manifest.update(id=job.id, startedAt=started, finishedAt=time.time())
+        tmp = os.path.join(job_dir, MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(job_dir, MANIFEST))
+        return manifest
+
+    def _run_columnar(self, job: Job, fmt: str, job_dir: str) -> dict:
+        os.makedirs(job_dir, exist_ok=True)
+        job.update(tables=len(columnar.TABLES), tablesDone=0)
+        counter_lock = threading.Lock()
+
+        def export(table: str):
+            file_name = f"{table}.{columnar.FORMATS[fmt]}"
+            path = os.path.join(job_dir, file_name)
+            rows = columnar.write_table(self.db, table, path, fmt)
+            with counter_lock:
+                job.update(tablesDone=job.progress["tablesDone"] + 1)
+            return table, {"file": file_name, "rows": rows, "bytes": os.path.getsize(path)}
+
+        with ThreadPoolExecutor(max_workers=self.read_workers, thread_name_prefix="export-read") as readers:
+            files = dict(readers.map(export, columnar.TABLES))
+        return {
+            "format": fmt,
+            "files": files,
+            "bytes": sum(f["bytes"] for f in files.values()),
+            "rows": sum(f["rows"] for f in files.values()),
+        }
+
+    def _run_partitioned(self, job: Job, fmt: str, job_dir: str) -> dict:
+        parts_dir = os.path.join(job_dir, "parts")
+        os.makedirs(parts_dir, exist_ok=True)
+
+        partitions = self._partitions(self.db.get_export_bounds())
+        job.update(partitions=len(partitions), partitionsDone=0, rows=0)
+        counter_lock = threading.Lock()
+
+        def export(index: int):
+            section, start, end = partitions[index]
+            part = self._export_partition(fmt, parts_dir, index, section, start, end)
+            with counter_lock:
+                job.update(
+                    partitionsDone=job.progress["partitionsDone"] + 1,
+                    rows=job.progress["rows"] + (part["rows"] if part else 0)
+                )
+            return part
+
+        # Each reader holds at most one partition in memory while it is encoded
+        with ThreadPoolExecutor(max_workers=self.read_workers, thread_name_prefix="export-read") as readers:
+            parts = [p for p in readers.map(export, range(len(partitions))) if p]
+
+        manifest = self._assemble(fmt, job_dir, parts)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        return manifest
+
+    def _export_partition(self, fmt: str, parts_dir: str, index: int,
+                          section: str, start: int, end: int) -> Optional[dict]:
+        rows = self.db.export_partition(section, start, end)
+        if not rows:
+            return None
+        if section == "nodes":
+            rows = [(node_id, label, _plain(props)) for node_id, label, props in rows]
+        path = os.path.join(parts_dir, f"part-{index:06d}.gz")
+        args = (fmt, section, rows, path, self.compress_level)
+        if self._encoders:
+            size = self._encoders.submit(encode_part, *args).result()
+        else:
+            size = encode_part(*args)
+        return {"section": section, "startId": start, "endId": end, "rows": len(rows), "bytes": size, "path": path}
+
+    def _assemble(self, fmt: str, job_dir: str, parts: list) -> dict:
+        """Concatenate the parts into one gzip file and describe every member."""
+        file_name = f"export.{fmt}.gz"
+        digest = hashlib.sha256()
+        members = []
+        offset = 0
+
+        def write(out, data: bytes, member: dict):
+            nonlocal offset
+            out.write(data)
+            digest.update(data)
+            members.append(dict(member, offset=offset, length=len(data)))
+            offset += len(data)
+
+        with open(os.path.join(job_dir, file_name), "wb") as out:
+            headers = {
+                "nodes": CSV_NODE_HEADER, "relationships": CSV_RELATIONSHIP_HEADER
+            } if fmt == "csv" else {}
+            for section in ("nodes", "relationships"):
+                if section in headers:
+                    data = gzip.compress(headers[section].encode("utf-8"), compresslevel=self.compress_level)
+                    write(out, data, {"section": section, "header": True, "rows": 0})
+                for part in parts:
+                    if part["section"] != section:
+                        continue
+                    with open(part["path"], "rb") as f:
+                        data = f.read()
+                    os.remove(part["path"])
+                    write(out, data, {
+                        "section": section, "startId": part["startId"],
+                        "endId": part["endId"], "rows": part["rows"]
+                    })
+
+        return {
+            "format": fmt,
+            "file": file_name,
+            "bytes": offset,
+            "sha256": digest.hexdigest(),
+            "rows": sum(m["rows"] for m in members),
+            "partitionSize": self.partition_size,
+            "parts": members,
+        }
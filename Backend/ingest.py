@@ -0,0 +1,347 @@
+"""
+Ingest path for user and transaction writes.
+
+IngestQueue is the write-behind mode for POST /api/transactions: accepted
+transactions are put on a bounded in-process queue and a background writer
+group-commits them with Neo4jDriver.create_transactions_batch.
+
+DurableIngest is the synchronous mode backed by the write-ahead log: writes are
+logged before they are applied, and anything that could not be applied because
+Neo4j was unavailable is replayed at startup and after reconnect. Every write
+carries an ingest key, so replays MERGE onto the node created by an earlier
+attempt instead of creating a duplicate.
+
+Both modes report progress through receipts that can be polled by id.
+
+Clients may send their own idempotency key (externalId); transactions are then
+merged on it, and RecentKeys answers retries of recently committed keys without
+a round trip to Neo4j.
+"""
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+
+
+RETRYABLE_ERRORS = (ServiceUnavailable, SessionExpired, TransientError)
+
+STATUS_QUEUED = "queued"
+STATUS_PENDING = "pending"
+STATUS_COMMITTED = "committed"
+STATUS_FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised when the ingestion queue cannot accept more rows."""
+
+
+class ReceiptStore:
+    """Bounded map of receipt id -> latest status, oldest entries evicted first."""
+
+    def __init__(self, max_receipts: int = 100000):
+        self.max_receipts = max_receipts
+        self._receipts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set(self, receipt_id: str, status: str, node_id: Optional[int] = None,
+            error: Optional[str] = None):
+        with self._lock:
+            self._receipts[receipt_id] = {
+                "receiptId": receipt_id,
+                "status": status,
+                "id": node_id,
+                "error": error,
+                "updatedAt": time.time(),
+            }
+            self._receipts.move_to_end(receipt_id)
+            while len(self._receipts) > self.max_receipts:
+                self._receipts.popitem(last=False)
+
+    def get(self, receipt_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._receipts.get(receipt_id)
+            return dict(entry) if entry else None
+
+
+class RecentKeys:
+    """
+    Bounded LRU of client idempotency key -> committed transaction id.
+
+    Only a cache in front of the externalId uniqueness constraint: a miss
+    falls through to the MERGE, which still deduplicates.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[int]:
+        with self._lock:
+            node_id = self._keys.get(key)
+            if node_id is not None:
+                self._keys.move_to_end(key)
+            return node_id
+
+    def put(self, key: str, node_id: int):
+        if not key or node_id is None:
+            return
+        with self._lock:
+            self._keys[key] = node_id
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._keys)
+
+
+class IngestQueue:
+    """Bounded queue plus a background writer that commits rows in batches."""
+
+    def __init__(
+        self, db, receipts: ReceiptStore, max_size: int = 10000, batch_size: int = 500,
+        flush_interval: float = 0.05, wal=None, max_retries: int = 5,
+        recent_keys: Optional[RecentKeys] = None, scoring=None
+    ):
+        self.db = db
+        self.receipts = receipts
+        self.recent_keys = recent_keys
+        self.scoring = scoring
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.wal = wal
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def submit(self, row: dict) -> str:
+        if self._queue.full():
+            raise QueueFull("ingest queue is full")
+        receipt_id = uuid.uuid4().hex
+        row = dict(row, ingestKey=receipt_id)
+        lsn = None
+        if self.wal:
+            lsn = self.wal.append({"op": "transaction", "key": receipt_id, "row": row})
+        self.receipts.set(receipt_id, STATUS_QUEUED)
+        try:
+            self._queue.put_nowait((receipt_id, row, lsn))
+        except queue.Full:
+            self.receipts.set(receipt_id, STATUS_FAILED, error="ingest queue is full")
+            if self.wal:
+                self.wal.ack([lsn])
+            raise QueueFull("ingest queue is full")
+        return receipt_id
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, batch: list):
+        rows = [row for _, row, _ in batch]
+        attempt = 0
+        while True:
+            try:
+                written = self.db.create_transactions_batch(rows)
+                break
+            except RETRYABLE_ERRORS:
+                attempt += 1
+                if attempt > self.max_retries or self._stop.is_set():
+                    for receipt_id, _, _ in batch:
+                        if self.wal:
+                            # Still in the log; DurableIngest replays it after reconnect
+                            self.receipts.set(receipt_id, STATUS_PENDING, error="database unavailable")
+                        else:
+                            self.receipts.set(receipt_id, STATUS_FAILED, error="database unavailable")
+                    return
+                time.sleep(min(2 ** attempt * 0.1, 5.0))
+            except Exception as e:
+                if len(batch) > 1:
+                    # Not transient, so most likely one bad row: commit the
+                    # halves separately so only that row fails
+                    middle = len(batch) // 2
+                    self._commit(batch[:middle])
+                    self._commit(batch[middle:])
+                    return
+                for receipt_id, _, _ in batch:
+                    self.receipts.set(receipt_id, STATUS_FAILED, error=str(e))
+                if self.wal:
+                    self.wal.ack([lsn for _, _, lsn in batch])
+                return
+
+        for (receipt_id, row, _), result in zip(batch, written):
+            if result is None:
+                self.receipts.set(receipt_id, STATUS_FAILED, error="user not found")
+            else:
+                tx_id, created = result
+                self.receipts.set(receipt_id, STATUS_COMMITTED, node_id=tx_id)
+                if self.recent_keys:
+                    self.recent_keys.put(row.get("externalId"), tx_id)
+                if self.scoring and created:
+                    self.scoring.observe(tx_id, row)
+        if self.wal:
+            self.wal.ack([lsn for _, _, lsn in batch])
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if batch:
+                self._commit(batch)
+
+
+class DurableIngest:
+    """
+    Log-then-apply writes for create_user / create_transaction.
+
+    create_user returns ``(node_id, key)`` and create_transaction ``(node_id,
+    created, key)``; node_id is None when the write was logged but Neo4j was
+    unavailable, in which case it is replayed later.
+    """
+
+    def __init__(self, db, wal, receipts: ReceiptStore, replay_interval: float = 5.0,
+                 replay_grace: float = 30.0, batch_size: int = 500,
+                 recent_keys: Optional[RecentKeys] = None, scoring=None):
+        self.db = db
+        self.wal = wal
+        self.receipts = receipts
+        # Replayed writes go through the same cache and scoring as live ones
+        self.recent_keys = recent_keys
+        self.scoring = scoring
+        self.replay_interval = replay_interval
+        # Records younger than this may still be in flight on a request thread
+        # or in the write-behind queue
+        self.replay_grace = replay_grace
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._replay_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="wal-replayer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def create_user(self, name: str, email: str, phone: str) -> Tuple[Optional[int], str]:
+        key = uuid.uuid4().hex
+        args = {"name": name, "email": email, "phone": phone}
+        lsn = self.wal.append({"op": "user", "key": key, "args": args})
+        node_id, _, key = self._apply(
+            lsn, key, lambda: (self.db.create_user(name, email, phone, ingest_key=key), True)
+        )
+        return node_id, key
+
+    def create_transaction(
+        self, from_id: int, to_id: int, amount: float,
+        currency: str, timestamp: str, description: str, device_id: str,
+        external_id: Optional[str] = None
+    ) -> Tuple[Optional[int], bool, str]:
+        key = uuid.uuid4().hex
+        row = {
+            "fromId": from_id, "toId": to_id, "amount": amount, "currency": currency,
+            "timestamp": timestamp, "description": description, "deviceId": device_id,
+            "ingestKey": key, "externalId": external_id
+        }
+        lsn = self.wal.append({"op": "transaction", "key": key, "row": row})
+        return self._apply(lsn, key, lambda: self.db.create_transaction(
+            from_id, to_id, amount, currency, timestamp, description, device_id,
+            ingest_key=key, external_id=external_id
+        ))
+
+    def _apply(self, lsn: int, key: str, write) -> Tuple[Optional[int], bool, str]:
+        # ``write`` returns (node_id, created)
+        try:
+            node_id, created = write()
+        except RETRYABLE_ERRORS:
+            self.receipts.set(key, STATUS_PENDING, error="database unavailable")
+            return None, False, key
+        except Exception:
+            # Not something a replay would fix
+            self.wal.ack([lsn])
+            raise
+        self.wal.ack([lsn])
+        self.receipts.set(key, STATUS_COMMITTED, node_id=node_id)
+        return node_id, created, key
+
+    def replay_pending(self, older_than: Optional[float] = None) -> int:
+        """Apply every unacknowledged record; returns how many were committed."""
+        if older_than is None:
+            older_than = self.replay_grace
+        with self._replay_lock:
+            entries = self.wal.pending(older_than)
+            if not entries:
+                return 0
+            users = [(lsn, e) for lsn, e in entries if e.get("op") == "user"]
+            txs = [(lsn, e) for lsn, e in entries if e.get("op") == "transaction"]
+            applied = 0
+
+            for lsn, entry in users:
+                args = entry["args"]
+                user_id = self.db.create_user(
+                    args["name"], args["email"], args["phone"], ingest_key=entry["key"]
+                )
+                self.wal.ack([lsn])
+                self.receipts.set(entry["key"], STATUS_COMMITTED, node_id=user_id)
+                applied += 1
+
+            for i in range(0, len(txs), self.batch_size):
+                chunk = txs[i:i + self.batch_size]
+                written = self.db.create_transactions_batch([e["row"] for _, e in chunk])
+                for (_, entry), result in zip(chunk, written):
+                    if result is None:
+                        self.receipts.set(entry["key"], STATUS_FAILED, error="user not found")
+                        continue
+                    tx_id, created = result
+                    self.receipts.set(entry["key"], STATUS_COMMITTED, node_id=tx_id)
+                    if self.recent_keys:
+                        self.recent_keys.put(entry["row"].get("externalId"), tx_id)
+                    # Whichever of the replay and the write-behind queue creates
+                    # the node scores it; the other sees created False
+                    if self.scoring and created:
+                        self.scoring.observe(tx_id, entry["row"])
+                    applied += 1
+                self.wal.ack([lsn for lsn, _ in chunk])
+            return applied
+
+    def _run(self):
+        while not self._stop.wait(self.replay_interval):
+            try:
+                self.replay_pending()
+            except RETRYABLE_ERRORS:
+                # Still down; try again on the next tick
+                continue
+            except Exception as e:
+                print(f"WAL replay failed: {e}")
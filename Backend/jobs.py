@@ -0,0 +1,99 @@
+"""
+Background jobs for work too slow for a request (exports, whole-graph scans).
+
+A job is submitted with a function that receives the Job and reports progress
+on it; clients poll the job's status by id.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+
+class Job:
+    def __init__(self, kind: str, params: Optional[dict] = None, job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = STATUS_QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def update(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "params": self.params,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "createdAt": self.created_at,
+                "startedAt": self.started_at,
+                "finishedAt": self.finished_at,
+            }
+
+
+class JobRegistry:
+    """Runs jobs on a small thread pool and keeps the most recent ones for polling."""
+
+    def __init__(self, max_workers: int = 2, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, kind: str, run: Callable[[Job], object], params: Optional[dict] = None) -> Job:
+        job = Job(kind, params)
+        self.add(job)
+        self._executor.submit(self._run, job, run)
+        return job
+
+    def add(self, job: Job):
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, kind: Optional[str] = None) -> list:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in jobs if kind is None or job.kind == kind]
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
+
+    @staticmethod
+    def _run(job: Job, run: Callable[[Job], object]):
+        job.status = STATUS_RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = run(job)
+            job.status = STATUS_COMPLETED
+        except Exception as e:
+            print(f"Job {job.kind} {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = STATUS_FAILED
+        finally:
+            job.finished_at = time.time()
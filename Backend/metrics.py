@@ -0,0 +1,341 @@
+"""
+Request and query instrumentation exposed in Prometheus text format.
+
+instrument_driver() wraps every public Neo4jDriver method and every private
+transaction function (static methods taking ``tx`` first). Transaction
+functions get a proxied ``tx`` so each query's rows, server timings
+(result_available_after / result_consumed_after) and, with profiling on,
+db hits are recorded. Queries slower than the threshold go to the
+``txgraph.slow_query`` logger with their Cypher and parameters.
+"""
+import functools
+import inspect
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+slow_query_log = logging.getLogger("txgraph.slow_query")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for values, total in items:
+            yield f"{self.name}{_format_labels(self.labels, values)} {total}"
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self.read()}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., sum, count]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for values, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_format_labels(self.labels, values, le)} {count}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.labels, values, le)} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, values)} {series[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labels, values)} {series[-1]}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.register(Histogram(
+    "http_request_seconds", "HTTP request latency until the response is returned",
+    ("endpoint", "method", "status")))
+driver_method_seconds = registry.register(Histogram(
+    "neo4j_driver_method_seconds", "Latency of Neo4jDriver public methods", ("method",)))
+driver_method_errors = registry.register(Counter(
+    "neo4j_driver_method_errors_total", "Exceptions raised by Neo4jDriver public methods",
+    ("method", "error")))
+tx_function_seconds = registry.register(Histogram(
+    "neo4j_tx_function_seconds", "Client-side latency of transaction functions", ("function",)))
+query_rows = registry.register(Histogram(
+    "neo4j_query_rows", "Rows consumed per query", ("function",), buckets=ROW_BUCKETS))
+result_available_seconds = registry.register(Histogram(
+    "neo4j_result_available_after_seconds", "Server time until the first record was available",
+    ("function",)))
+result_consumed_seconds = registry.register(Histogram(
+    "neo4j_result_consumed_after_seconds", "Server time to consume all records", ("function",)))
+query_db_hits = registry.register(Counter(
+    "neo4j_query_db_hits_total", "Database hits reported by PROFILE", ("function",)))
+
+
+class Settings:
+    profile = False
+    slow_query_seconds = 0.5
+    max_param_chars = 1000
+
+
+settings = Settings()
+
+# Callables invoked as listener(function, cypher, params) for every query run
+# through an instrumented transaction function
+query_listeners = []
+
+
+def _sum_db_hits(plan) -> int:
+    if not plan:
+        return 0
+    hits = plan.get("dbHits", 0) or 0
+    for child in plan.get("children", []) or []:
+        hits += _sum_db_hits(child)
+    return hits
+
+
+class _ResultProxy:
+    """Delegates to a neo4j Result while counting consumed rows."""
+
+    def __init__(self, result):
+        self._result = result
+        self.rows = 0
+
+    def __iter__(self):
+        for record in self._result:
+            self.rows += 1
+            yield record
+
+    def single(self, *args, **kwargs):
+        record = self._result.single(*args, **kwargs)
+        if record is not None:
+            self.rows += 1
+        return record
+
+    def data(self, *args, **kwargs):
+        rows = self._result.data(*args, **kwargs)
+        self.rows += len(rows)
+        return rows
+
+    def values(self, *args, **kwargs):
+        rows = self._result.values(*args, **kwargs)
+        self.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+
+class _TxProxy:
+    """Wraps a managed transaction and remembers every query it runs."""
+
+    def __init__(self, tx, function: str):
+        self._tx = tx
+        self._function = function
+        self.queries = []
+
+    def run(self, query, parameters=None, **kwargs):
+        text = query.text if hasattr(query, "text") else query
+        params = dict(parameters or {}, **kwargs)
+        for listener in query_listeners:
+            listener(self._function, text, params)
+        if settings.profile and not text.lstrip().upper().startswith(("EXPLAIN", "PROFILE")):
+            text = "PROFILE " + text
+            query = type(query)(text, metadata=query.metadata, timeout=query.timeout) \
+                if hasattr(query, "text") else text
+        result = _ResultProxy(self._tx.run(query, parameters, **kwargs))
+        self.queries.append((text, params, result, time.perf_counter()))
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._tx, name)
+
+    def record(self, function: str):
+        for text, params, result, started in self.queries:
+            query_rows.observe(result.rows, function)
+            try:
+                summary = result.consume()
+            except Exception:
+                continue
+            available = (summary.result_available_after or 0) / 1000.0
+            consumed = (summary.result_consumed_after or 0) / 1000.0
+            result_available_seconds.observe(available, function)
+            result_consumed_seconds.observe(consumed, function)
+            if settings.profile and summary.profile:
+                query_db_hits.inc(function, amount=_sum_db_hits(summary.profile))
+            if available + consumed >= settings.slow_query_seconds:
+                shown = repr(params)
+                if len(shown) > settings.max_param_chars:
+                    shown = shown[:settings.max_param_chars] + "..."
+                slow_query_log.warning(
+                    "slow query in %s: %.3fs (available %.3fs, consumed %.3fs, rows %d)\n%s\nparams=%s",
+                    function, available + consumed, available, consumed, result.rows,
+                    " ".join(text.split()), shown
+                )
+
+
+def _wrap_tx_function(name: str, fn):
+    @functools.wraps(fn)
+    def wrapper(tx, *args, **kwargs):
+        if isinstance(tx, _TxProxy):
+            # Called from another tx function: its proxy already records these queries
+            return fn(tx, *args, **kwargs)
+        proxy = _TxProxy(tx, name)
+        start = time.perf_counter()
+        try:
+            return fn(proxy, *args, **kwargs)
+        finally:
+            tx_function_seconds.observe(time.perf_counter() - start, name)
+            proxy.record(name)
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def _wrap_method(name: str, fn):
+    if inspect.isgeneratorfunction(fn):
+        return _wrap_generator(name, fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            driver_method_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            driver_method_seconds.observe(time.perf_counter() - start, name)
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def _wrap_generator(name: str, fn):
+    # Streams do their work while being iterated, so the latency is observed
+    # when the stream is exhausted, fails or is closed by the consumer
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            yield from fn(*args, **kwargs)
+        except Exception as e:
+            driver_method_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            driver_method_seconds.observe(time.perf_counter() - start, name)
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_driver(cls, profile: bool = False, slow_query_ms: Optional[float] = None):
+    """Patch ``cls`` in place; safe to call more than once."""
+    settings.profile = profile
+    if slow_query_ms is not None:
+        settings.slow_query_seconds = slow_query_ms / 1000.0
+
+    for name, attr in list(vars(cls).items()):
+        if isinstance(attr, staticmethod):
+            fn = attr.__func__
+            if getattr(fn, "__instrumented__", False) or not name.startswith("_"):
+                continue
+            params = list(inspect.signature(fn).parameters)
+            if params and params[0] == "tx":
+                setattr(cls, name, staticmethod(_wrap_tx_function(name, fn)))
+        elif inspect.isfunction(attr) and not name.startswith("_"):
+            if not getattr(attr, "__instrumented__", False):
+                setattr(cls, name, _wrap_method(name, attr))
+    return cls
+
+
+def instrument_app(app):
+    """Record per-endpoint HTTP latency (time to first byte for streams)."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = getattr(g, "_metrics_start", None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            http_request_seconds.observe(
+                time.perf_counter() - start, endpoint, request.method, str(response.status_code)
+            )
+        return response
+
+    return app
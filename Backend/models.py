@@ -28,6 +28,26 @@ class RelConnection:
     relationship: str
 
 
+@dataclass
+class SearchHit:
+    node: Any
+    score: float
+
+
+@dataclass
+class RiskyTransaction:
+    transaction: Transaction
+    riskScore: float
+    riskReasons: List[str]
+
+
+@dataclass
+class EntityMatch:
+    user: User
+    score: float
+    reasons: List[str]
+
+
 @dataclass
 class UserConnections:
     users: List[RelConnection]
@@ -82,6 +102,15 @@ class TransactionClustersResponse:
     clusters: List[TransactionCluster]
 
 
+@dataclass
+class ClusterSummary:
+    clusterId: int
+    transactionCount: int
+    userCount: int
+    deviceCount: int
+    totalAmount: float
+
+
 @dataclass
 class GraphNode:
     id: int
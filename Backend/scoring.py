@@ -0,0 +1,301 @@
+"""
+Real-time velocity and anomaly scoring for incoming transactions.
+
+RiskScorer keeps sliding-window counters in memory per sender, per device and
+per sender/receiver pair. Each window is a ring buffer of time buckets, so an
+update or read is O(1) amortized and never queries the graph. Windows follow
+the transactions' own timestamps, not the time they arrive: a backlog drained
+at once is not a burst, and a late transaction lands in the bucket of its
+time (or nowhere, once that has left the window). A score combines velocity
+rules with a z-score of the amount against the sender's history.
+
+ScoringPipeline is the ingest stage: it scores committed transactions
+synchronously (in memory) and persists riskScore / riskReasons on the
+Transaction nodes from a background writer in batches.
+"""
+import math
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+# name -> (window seconds, buckets)
+WINDOWS = (("1m", 60, 6), ("1h", 3600, 12), ("24h", 86400, 24))
+
+DEFAULT_THRESHOLDS = {
+    "user_count_1m": 5,
+    "user_count_1h": 30,
+    "user_amount_24h": 20000.0,
+    "device_count_1h": 20,
+    "pair_count_24h": 10,
+    "amount_zscore": 3.0,
+    # Sender history needed before the z-score is trusted
+    "zscore_min_samples": 5,
+}
+
+# Contribution of each rule to the score, capped at 1.0 overall
+RULE_WEIGHTS = {
+    "user_velocity_1m": 0.3,
+    "user_velocity_1h": 0.2,
+    "user_amount_24h": 0.2,
+    "device_velocity_1h": 0.2,
+    "pair_repeat_24h": 0.2,
+    "amount_outlier": 0.3,
+}
+
+
+class RingCounter:
+    """Count and amount total over a sliding window, kept in fixed time buckets."""
+
+    __slots__ = ("bucket_seconds", "counts", "sums", "head", "head_bucket", "count", "total")
+
+    def __init__(self, window_seconds: float, buckets: int):
+        self.bucket_seconds = window_seconds / buckets
+        self.counts = [0] * buckets
+        self.sums = [0.0] * buckets
+        self.head = 0
+        self.head_bucket = None
+        self.count = 0
+        self.total = 0.0
+
+    def _advance(self, now: float):
+        bucket = int(now // self.bucket_seconds)
+        if self.head_bucket is None:
+            self.head_bucket = bucket
+            return
+        steps = bucket - self.head_bucket
+        if steps <= 0:
+            return
+        # Each bucket is cleared at most once per time it was filled
+        size = len(self.counts)
+        for _ in range(min(steps, size)):
+            self.head = (self.head + 1) % size
+            self.count -= self.counts[self.head]
+            self.total -= self.sums[self.head]
+            self.counts[self.head] = 0
+            self.sums[self.head] = 0.0
+        if self.count == 0:
+            self.total = 0.0
+        self.head_bucket = bucket
+
+    def _age(self, now: float) -> int:
+        # Buckets between ``now`` and the head; > 0 for an out-of-order time
+        return self.head_bucket - int(now // self.bucket_seconds)
+
+    def add(self, now: float, amount: float):
+        self._advance(now)
+        age = self._age(now)
+        size = len(self.counts)
+        if age >= size:
+            return
+        slot = (self.head - age) % size
+        self.counts[slot] += 1
+        self.sums[slot] += amount
+        self.count += 1
+        self.total += amount
+
+    def read(self, now: float) -> Tuple[int, float]:
+        """Count and total of the window ending at ``now`` (as far as it is still held)."""
+        self._advance(now)
+        age = self._age(now)
+        if age <= 0:
+            return self.count, self.total
+        size = len(self.counts)
+        count, total = 0, 0.0
+        for back in range(age, size):
+            slot = (self.head - back) % size
+            count += self.counts[slot]
+            total += self.sums[slot]
+        return count, total
+
+
+class Velocity:
+    """Windowed counters plus running amount statistics for one entity."""
+
+    __slots__ = ("windows", "n", "mean", "m2")
+
+    def __init__(self):
+        self.windows = {name: RingCounter(seconds, buckets) for name, seconds, buckets in WINDOWS}
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, now: float, amount: float):
+        for counter in self.windows.values():
+            counter.add(now, amount)
+        # Welford's update
+        self.n += 1
+        delta = amount - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (amount - self.mean)
+
+    def read(self, window: str, now: float) -> Tuple[int, float]:
+        return self.windows[window].read(now)
+
+    def zscore(self, amount: float, min_samples: int) -> Optional[float]:
+        if self.n < min_samples:
+            return None
+        std = math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+        if std == 0.0:
+            return None
+        return (amount - self.mean) / std
+
+
+class _EntityTable:
+    """LRU-bounded map of entity key -> Velocity."""
+
+    def __init__(self, max_entities: int):
+        self.max_entities = max_entities
+        self._entries = OrderedDict()
+
+    def get(self, key) -> Velocity:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = Velocity()
+            if len(self._entries) > self.max_entities:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def event_time(timestamp) -> Optional[float]:
+    """Epoch seconds of an ISO-8601 timestamp (naive means UTC, as in Neo4j); None if unparseable."""
+    if not isinstance(timestamp, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(timestamp.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class RiskScorer:
+    def __init__(self, max_entities: int = 200000, thresholds: Optional[dict] = None):
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self._users = _EntityTable(max_entities)
+        self._devices = _EntityTable(max_entities)
+        self._pairs = _EntityTable(max_entities)
+        self._lock = threading.Lock()
+
+    def score(self, from_id: int, to_id: int, amount: float, device_id: str = "",
+              now: Optional[float] = None) -> Tuple[float, List[str]]:
+        """
+        Record the transaction in every window and return (score, reasons).
+        ``now`` is the transaction's time in epoch seconds (default: wall clock).
+        """
+        now = time.time() if now is None else now
+        amount = float(amount or 0.0)
+        limits = self.thresholds
+        with self._lock:
+            user = self._users.get(from_id)
+            pair = self._pairs.get((from_id, to_id))
+            # Compare against history before this transaction joins it
+            z = user.zscore(amount, limits["zscore_min_samples"])
+            user.add(now, amount)
+            pair.add(now, amount)
+            user_1m, _ = user.read("1m", now)
+            user_1h, _ = user.read("1h", now)
+            _, user_amount_24h = user.read("24h", now)
+            pair_24h, _ = pair.read("24h", now)
+            device_1h = 0
+            if device_id:
+                device = self._devices.get(device_id)
+                device.add(now, amount)
+                device_1h, _ = device.read("1h", now)
+
+        reasons = []
+        if user_1m > limits["user_count_1m"]:
+            reasons.append("user_velocity_1m")
+        if user_1h > limits["user_count_1h"]:
+            reasons.append("user_velocity_1h")
+        if user_amount_24h > limits["user_amount_24h"]:
+            reasons.append("user_amount_24h")
+        if device_1h > limits["device_count_1h"]:
+            reasons.append("device_velocity_1h")
+        if pair_24h > limits["pair_count_24h"]:
+            reasons.append("pair_repeat_24h")
+        if z is not None and z > limits["amount_zscore"]:
+            reasons.append("amount_outlier")
+        score = min(1.0, sum((RULE_WEIGHTS[r] for r in reasons), 0.0))
+        return round(score, 4), reasons
+
+    def tracked(self) -> int:
+        with self._lock:
+            return len(self._users) + len(self._devices) + len(self._pairs)
+
+
+class ScoringPipeline:
+    """Scores committed transactions and persists the scores in batches."""
+
+    def __init__(self, db, scorer: RiskScorer, batch_size: int = 500, flush_interval: float = 0.5,
+                 max_pending: int = 100000):
+        self.db = db
+        self.scorer = scorer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stop = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="risk-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def observe(self, tx_id: int, row: dict) -> Tuple[float, List[str]]:
+        """
+        Score one newly created transaction (a create_transactions_batch row),
+        windowed on its ``timestamp``.
+        """
+        score, reasons = self.scorer.score(
+            row.get("fromId"), row.get("toId"), row.get("amount"), row.get("deviceId") or "",
+            now=event_time(row.get("timestamp"))
+        )
+        try:
+            self._queue.put_nowait({"id": tx_id, "score": score, "reasons": reasons})
+        except queue.Full:
+            # Scores are advisory; never hold up ingestion to persist them
+            self.dropped += 1
+        return score, reasons
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self.db.set_risk_scores(batch)
+            except Exception as e:
+                print(f"Persisting risk scores failed: {e}")
@@ -0,0 +1,94 @@
+"""
+Request coalescing for expensive read endpoints.
+
+Concurrent calls with the same key share one execution: the first caller
+(the leader) runs the function, the others wait for its result instead of
+issuing their own query. A finished result is kept for a short reuse window,
+so a burst of identical requests that arrive just after it completes is also
+served without touching the database. Failures are handed to the callers that
+were waiting but never reused.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Tuple
+
+# How a call was answered, for the response header and metrics
+LEADER = "leader"
+SHARED = "shared"
+REUSED = "reused"
+
+
+class _Call:
+    __slots__ = ("done", "value", "error", "finished_at")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.finished_at = None
+
+
+class SingleFlight:
+    def __init__(self, reuse_seconds: float = 2.0, max_entries: int = 256):
+        self.reuse_seconds = reuse_seconds
+        self.max_entries = max_entries
+        self._calls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, str]:
+        """Return ``(value, how)`` where ``how`` is LEADER, SHARED or REUSED."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.done.is_set() and not self._reusable(call):
+                del self._calls[key]
+                call = None
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self._evict()
+            else:
+                leader = False
+                how = REUSED if call.done.is_set() else SHARED
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, how
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            raise
+        finally:
+            call.finished_at = time.monotonic()
+            call.done.set()
+        return call.value, LEADER
+
+    def forget(self, key: Hashable):
+        """Drop a finished result so the next call runs again."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.done.is_set():
+                del self._calls[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def _reusable(self, call: _Call) -> bool:
+        return call.error is None and time.monotonic() - call.finished_at < self.reuse_seconds
+
+    def _evict(self):
+        # Oldest finished entries go first; in-flight calls are never dropped
+        if len(self._calls) <= self.max_entries:
+            return
+        for key in [k for k, c in self._calls.items() if c.done.is_set()]:
+            del self._calls[key]
+            if len(self._calls) <= self.max_entries:
+                break
@@ -0,0 +1,236 @@
+"""
+Segmented, checksummed write-ahead log for the ingest path.
+
+Every accepted write is appended as a data record before it is applied to
+Neo4j and acknowledged with an ack record once it is committed. Records are
+spread over numbered segment files; a segment is deleted as soon as every data
+record in it (and in all older segments) has been acknowledged. Appends are
+made durable by a single flusher thread that fsyncs once per group of
+concurrent writers instead of once per record.
+
+Record layout (little endian):
+    type:u8  length:u32  crc32:u32  lsn:u64  timestamp:f64  payload[length]
+The CRC covers the payload. A torn or corrupt record ends the scan of its
+segment during recovery.
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import List, Tuple
+
+_HEADER = struct.Struct("<BIIQd")
+
+REC_DATA = 1
+REC_ACK = 2
+
+
+class WriteAheadLog:
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024,
+                 fsync_interval: float = 0.005):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._cond = threading.Condition()
+        self._next_lsn = 1
+        self._written_lsn = 0
+        self._synced_lsn = 0
+        self._closed = False
+        # lsn -> (segment id, record offset, append time)
+        self._unacked = {}
+        # segment id -> number of unacknowledged data records
+        self._segment_unacked = {}
+        self._segments = []
+        self._retired_fds = []
+
+        self._recover()
+        self._open_segment(self._segments[-1] + 1 if self._segments else 1)
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+        self._flusher.start()
+
+    # ----- public API -----
+
+    def append(self, payload: dict) -> int:
+        """Append a data record and block until it is durable. Returns its LSN."""
+        data = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-ahead log is closed")
+            lsn = self._next_lsn
+            self._next_lsn += 1
+            ts = time.time()
+            offset = self._write_record(REC_DATA, lsn, ts, data)
+            self._unacked[lsn] = (self._active_id, offset, ts)
+            self._segment_unacked[self._active_id] += 1
+            self._written_lsn = lsn
+            self._cond.notify_all()
+            while self._synced_lsn < lsn:
+                self._cond.wait()
+            return lsn
+
+    def ack(self, lsns: List[int]):
+        """Mark records as applied. Ack records are synced with the next group."""
+        lsns = [lsn for lsn in lsns if lsn is not None]
+        if not lsns:
+            return
+        data = json.dumps(lsns, separators=(",", ":")).encode("utf-8")
+        with self._cond:
+            self._write_record(REC_ACK, 0, time.time(), data)
+            for lsn in lsns:
+                entry = self._unacked.pop(lsn, None)
+                if entry:
+                    self._segment_unacked[entry[0]] -= 1
+            self._drop_acked_segments()
+            self._cond.notify_all()
+
+    def pending(self, older_than: float = 0.0) -> List[Tuple[int, dict]]:
+        """Unacknowledged records appended at least ``older_than`` seconds ago."""
+        cutoff = time.time() - older_than
+        with self._cond:
+            entries = sorted(
+                (lsn, seg_id, offset)
+                for lsn, (seg_id, offset, ts) in self._unacked.items()
+                if ts <= cutoff
+            )
+        out = []
+        files = {}
+        try:
+            for lsn, seg_id, offset in entries:
+                f = files.get(seg_id)
+                if f is None:
+                    try:
+                        f = files[seg_id] = open(self._segment_path(seg_id), "rb")
+                    except FileNotFoundError:
+                        # Acknowledged and dropped while we were reading
+                        continue
+                f.seek(offset)
+                record = self._read_record(f)
+                if record and record[0] == REC_DATA and record[1] == lsn:
+                    out.append((lsn, json.loads(record[3])))
+        finally:
+            for f in files.values():
+                f.close()
+        return out
+
+    def unacked_count(self) -> int:
+        with self._cond:
+            return len(self._unacked)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        with self._cond:
+            os.fsync(self._active_fd)
+            os.close(self._active_fd)
+
+    # ----- segments -----
+
+    def _segment_path(self, seg_id: int) -> str:
+        return os.path.join(self.directory, f"{seg_id:012d}.wal")
+
+    def _open_segment(self, seg_id: int):
+        self._active_id = seg_id
+        self._active_fd = os.open(self._segment_path(seg_id), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._active_size = os.fstat(self._active_fd).st_size
+        self._segments.append(seg_id)
+        self._segment_unacked.setdefault(seg_id, 0)
+
+    def _write_record(self, rec_type: int, lsn: int, ts: float, data: bytes) -> int:
+        if self._active_size >= self.segment_bytes:
+            # The flusher syncs and closes the old descriptor with the next group
+            self._retired_fds.append(self._active_fd)
+            self._open_segment(self._active_id + 1)
+        offset = self._active_size
+        header = _HEADER.pack(rec_type, len(data), zlib.crc32(data), lsn, ts)
+        os.write(self._active_fd, header + data)
+        self._active_size += len(header) + len(data)
+        return offset
+
+    def _drop_acked_segments(self):
+        while len(self._segments) > 1 and self._segment_unacked.get(self._segments[0], 0) == 0:
+            seg_id = self._segments.pop(0)
+            self._segment_unacked.pop(seg_id, None)
+            try:
+                os.remove(self._segment_path(seg_id))
+            except FileNotFoundError:
+                pass
+
+    # ----- recovery -----
+
+    @staticmethod
+    def _read_record(f):
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        rec_type, length, crc, lsn, ts = _HEADER.unpack(header)
+        data = f.read(length)
+        if len(data) < length or zlib.crc32(data) != crc:
+            return None
+        return rec_type, lsn, ts, data
+
+    def _recover(self):
+        seg_ids = sorted(
+            int(name[:-4]) for name in os.listdir(self.directory)
+            if name.endswith(".wal") and name[:-4].isdigit()
+        )
+        acked = set()
+        for seg_id in seg_ids:
+            self._segments.append(seg_id)
+            self._segment_unacked[seg_id] = 0
+            path = self._segment_path(seg_id)
+            with open(path, "rb") as f:
+                while True:
+                    offset = f.tell()
+                    record = self._read_record(f)
+                    if record is None:
+                        break
+                    rec_type, lsn, ts, data = record
+                    if rec_type == REC_DATA:
+                        self._unacked[lsn] = (seg_id, offset, ts)
+                        self._next_lsn = max(self._next_lsn, lsn + 1)
+                    elif rec_type == REC_ACK:
+                        acked.update(json.loads(data))
+            if offset < os.path.getsize(path):
+                # Drop the torn tail so the segment stays scannable
+                with open(path, "r+b") as f:
+                    f.truncate(offset)
+
+        for lsn in acked:
+            self._unacked.pop(lsn, None)
+        for seg_id, _, _ in self._unacked.values():
+            self._segment_unacked[seg_id] += 1
+        self._written_lsn = self._synced_lsn = self._next_lsn - 1
+        self._drop_acked_segments()
+        if self._segments and self._segment_unacked[self._segments[-1]] == 0 and len(self._segments) == 1:
+            os.remove(self._segment_path(self._segments.pop()))
+
+    # ----- group fsync -----
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while self._written_lsn == self._synced_lsn and not self._retired_fds and not self._closed:
+                    self._cond.wait()
+                if self._closed and self._written_lsn == self._synced_lsn and not self._retired_fds:
+                    return
+            if self.fsync_interval:
+                # Let concurrent writers join this group
+                time.sleep(self.fsync_interval)
+            with self._cond:
+                target = self._written_lsn
+                fd = self._active_fd
+                retired, self._retired_fds = self._retired_fds, []
+            for old_fd in retired:
+                os.fsync(old_fd)
+                os.close(old_fd)
+            os.fsync(fd)
+            with self._cond:
+                self._synced_lsn = max(self._synced_lsn, target)
+                self._cond.notify_all()
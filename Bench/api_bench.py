@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+End-to-end API benchmark.
+
+Optionally loads a skewed synthetic dataset (power-law user activity, several
+currencies, shared emails/phones/devices) straight into Neo4j, then drives the
+backend's endpoints from a pool of worker threads and reports throughput and
+p50/p95/p99 latency per endpoint as JSON.
+
+Usage:
+    docker compose -f docker-compose.bench.yml up -d --build
+    python api_bench.py --load --users 5000 --transactions 200000 --reset
+    python api_bench.py --concurrency 16 --duration 60 --out results.json
+    python api_bench.py --concurrency 16 --duration 60 --compare results.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, os.path.join(ROOT, "Populate"))
+
+
+# ----- dataset -----
+
+def load_dataset(args):
+    from neo4j import GraphDatabase
+    from generate_rows import batch_rows, generate_transaction_batches, generate_users, user_rows
+    from populate import bulk_users, bulk_transactions
+
+    users = user_rows(generate_users(args.users, seed=args.seed))
+    batches = generate_transaction_batches(
+        args.users, args.transactions, batch_size=5000, seed=args.seed,
+        activity_exponent=args.activity_exponent, fraud_rings=args.fraud_rings,
+        now=datetime(2025, 1, 1)
+    )
+    driver = GraphDatabase.driver(args.neo4j_uri, auth=(args.neo4j_user, args.neo4j_pass))
+    try:
+        with driver.session() as session:
+            existing = session.run("MATCH (n) RETURN count(n) AS c").single()["c"]
+            if existing and not args.reset:
+                sys.exit(f"database has {existing} nodes; pass --reset to wipe it first")
+            if existing:
+                session.run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS")
+
+            start = time.perf_counter()
+            user_ids = []
+            for i in range(0, len(users), 5000):
+                user_ids.extend(bulk_users(session, users[i:i + 5000]))
+            for batch in batches:
+                bulk_transactions(session, batch_rows(batch, user_ids))
+            elapsed = time.perf_counter() - start
+    finally:
+        driver.close()
+    print(f"Loaded {len(users)} users and {args.transactions} transactions in {elapsed:.1f}s", file=sys.stderr)
+
+
+# ----- scenarios -----
+
+class Context:
+    """Ids sampled from the running backend so requests hit real nodes."""
+
+    def __init__(self, client):
+        status, body = client.request("GET", "/api/users?page=1&pageSize=200")
+        self.user_ids = [u["id"] for u in json.loads(body)["data"]] if status == 200 else []
+        status, body = client.request("GET", "/api/transactions?page=1&pageSize=200")
+        self.tx_ids = [t["id"] for t in json.loads(body)["data"]] if status == 200 else []
+        status, body = client.request("GET", "/api/transactions/currencies")
+        self.currencies = json.loads(body) if status == 200 else ["USD"]
+        if not self.user_ids:
+            sys.exit("backend returned no users; load a dataset first (--load)")
+
+
+def scenarios(ctx):
+    """name -> (weight, heavy, request builder returning (method, path, body))."""
+    def user():
+        return random.choice(ctx.user_ids)
+
+    def tx():
+        return random.choice(ctx.tx_ids) if ctx.tx_ids else 0
+
+    def tx_body():
+        return {
+            "fromUserId": user(), "toUserId": user(),
+            "amount": round(random.uniform(5, 500), 2),
+            "currency": random.choice(ctx.currencies),
+            "timestamp": datetime.now().isoformat(),
+            "description": "bench", "deviceId": f"dev-bench-{random.randrange(100)}"
+        }
+
+    return {
+        "users_page": (10, False, lambda: ("GET", "/api/users?" + urlencode(
+            {"page": random.randint(1, 20), "pageSize": 20}), None)),
+        "users_search": (5, False, lambda: ("GET", "/api/users?" + urlencode(
+            {"page": 1, "pageSize": 20, "search": f"user{random.randrange(1000)}"}), None)),
+        "users_fulltext": (5, False, lambda: ("GET", "/api/users/search?" + urlencode(
+            {"q": f"user{random.randrange(1000)}", "pageSize": 20}), None)),
+        "transactions_fulltext": (3, False, lambda: ("GET", "/api/transactions/search?" + urlencode(
+            {"q": f"tx {random.randrange(1000)}", "pageSize": 20}), None)),
+        "users_all": (1, True, lambda: ("GET", "/api/users", None)),
+        "users_create": (2, False, lambda: ("POST", "/api/users", {
+            "name": "bench", "email": f"bench{random.randrange(10 ** 6)}@example.com",
+            "phone": f"{random.randrange(10 ** 9, 10 ** 10)}"})),
+        "transactions_page": (10, False, lambda: ("GET", "/api/transactions?" + urlencode(
+            {"page": random.randint(1, 20), "pageSize": 20}), None)),
+        "transactions_filtered": (5, False, lambda: ("GET", "/api/transactions?" + urlencode({
+            "page": 1, "pageSize": 20, "currency": random.choice(ctx.currencies),
+            "minAmount": random.choice([0, 50, 500])}), None)),
+        "transactions_all": (1, True, lambda: ("GET", "/api/transactions", None)),
+        "transactions_create": (5, False, lambda: ("POST", "/api/transactions", tx_body())),
+        "currencies": (3, False, lambda: ("GET", "/api/transactions/currencies", None)),
+        "user_relationships": (8, False, lambda: ("GET", f"/api/relationships/user/{user()}", None)),
+        "transaction_relationships": (8, False, lambda: ("GET", f"/api/relationships/transaction/{tx()}", None)),
+        "shortest_path": (2, True, lambda: ("GET", f"/api/analytics/shortest-path/users/{user()}/{user()}", None)),
+        "transaction_clusters": (1, True, lambda: ("GET", "/api/analytics/transaction-clusters", None)),
+        "statistics": (3, False, lambda: ("GET", "/api/analytics/statistics", None)),
+        "export_csv": (1, True, lambda: ("GET", "/api/export/csv", None)),
+    }
+
+
+# ----- load generator -----
+
+class Client:
+    """One keep-alive connection per worker thread."""
+
+    def __init__(self, base_url: str, timeout: float):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload else {}
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                if response.will_close:
+                    self.conn.close()
+                    self.conn = None
+                return response.status, data
+            except (http.client.HTTPException, ConnectionError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies, errors, elapsed):
+    lat = sorted(latencies)
+    return {
+        "requests": len(lat) + errors,
+        "errors": errors,
+        "throughputRps": round((len(lat) + errors) / elapsed, 2) if elapsed else 0.0,
+        "p50Ms": round(percentile(lat, 50) * 1000, 2) if lat else None,
+        "p95Ms": round(percentile(lat, 95) * 1000, 2) if lat else None,
+        "p99Ms": round(percentile(lat, 99) * 1000, 2) if lat else None,
+        "maxMs": round(lat[-1] * 1000, 2) if lat else None,
+    }
+
+
+def run(args):
+    random.seed(args.seed)
+    ctx = Context(Client(args.base_url, args.timeout))
+    available = scenarios(ctx)
+    if args.endpoints:
+        chosen = {name: available[name] for name in args.endpoints.split(",")}
+    else:
+        chosen = {n: s for n, s in available.items() if args.include_heavy or not s[1]}
+    names = list(chosen)
+    weights = [chosen[n][0] for n in names]
+
+    latencies = {n: [] for n in names}
+    errors = {n: 0 for n in names}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    warmup_end = time.perf_counter() + args.warmup
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = Client(args.base_url, args.timeout)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights=weights)[0]
+            method, path, body = chosen[name][2]()
+            start = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body)
+                ok = status < 400 or (name == "shortest_path" and status == 404)
+            except Exception:
+                ok = False
+            took = time.perf_counter() - start
+            if start < warmup_end:
+                continue
+            with lock:
+                if ok:
+                    latencies[name].append(took)
+                else:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=worker, args=(args.seed + i,)) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = max(args.duration - args.warmup, 1e-9)
+
+    all_lat = [x for n in names for x in latencies[n]]
+    return {
+        "meta": {
+            "baseUrl": args.base_url,
+            "concurrency": args.concurrency,
+            "durationSeconds": args.duration,
+            "warmupSeconds": args.warmup,
+            "seed": args.seed,
+            "revision": git_revision(),
+            "startedAt": datetime.now().isoformat(),
+        },
+        "overall": summarize(all_lat, sum(errors.values()), elapsed),
+        "endpoints": {n: summarize(latencies[n], errors[n], elapsed) for n in names},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current, previous_path):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    rows = []
+    for name, stats in current["endpoints"].items():
+        old = previous.get("endpoints", {}).get(name)
+        if not old:
+            continue
+        for key in ("throughputRps", "p50Ms", "p95Ms", "p99Ms"):
+            if stats.get(key) is not None and old.get(key):
+                change = (stats[key] - old[key]) / old[key] * 100
+                rows.append(f"{name:28} {key:14} {old[key]:>10} -> {stats[key]:>10} ({change:+.1f}%)")
+    print("\n".join(rows), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.getenv("BENCH_BASE_URL", "http://localhost:8080"))
+    parser.add_argument("--neo4j-uri", default=os.getenv("NEO4J_URI", "bolt://localhost:7687"))
+    parser.add_argument("--neo4j-user", default=os.getenv("NEO4J_USER", "neo4j"))
+    parser.add_argument("--neo4j-pass", default=os.getenv("NEO4J_PASS", "password"))
+    parser.add_argument("--load", action="store_true", help="generate and load a dataset, then exit")
+    parser.add_argument("--reset", action="store_true", help="wipe the database before loading")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--activity-exponent", type=float, default=1.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fraud-rings", type=int, default=0, help="cyclic money-flow rings to inject")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--endpoints", help="comma-separated scenario names (default: all light ones)")
+    parser.add_argument("--include-heavy", action="store_true", help="also run full-list, clustering and export")
+    parser.add_argument("--out", help="write results JSON here instead of stdout")
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    args = parser.parse_args()
+
+    if args.load:
+        load_dataset(args)
+        return
+
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
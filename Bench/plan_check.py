@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression check.
+
+Loads a deterministic fixture graph through the Populate generators, runs every
+Neo4jDriver method against it while capturing the Cypher it executes, then
+EXPLAINs and PROFILEs each captured query (writes are profiled inside a
+transaction that is rolled back). Cypher string literals in Backend/database.py
+and Backend/app.py that no driver call exercised are EXPLAINed without
+parameters so nothing goes unchecked.
+
+The check fails when a plan contains a forbidden operator the query is not
+allowed to use, or when db hits grow past the recorded baseline. A missing
+baseline is an error unless --update-baseline is given.
+
+Usage:
+    python plan_check.py --reset                      # load fixture and check
+    python plan_check.py --reset --update-baseline    # record db-hit baselines
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, os.path.join(ROOT, "Backend"))
+sys.path.insert(0, os.path.join(ROOT, "Populate"))
+
+from neo4j import GraphDatabase  # noqa: E402
+
+import metrics  # noqa: E402
+from database import Neo4jDriver  # noqa: E402
+from generate_rows import generate_transactions  # noqa: E402
+from populate import bulk_users, bulk_transactions  # noqa: E402
+
+
+FORBIDDEN = {"CartesianProduct", "AllNodesScan", "NodeByLabelScan"}
+
+# Queries whose job is to read a whole label (or the whole graph); every other
+# query must reach its nodes through an index or id seek
+ALLOWED = {
+    "_get_all_users_tx": {"NodeByLabelScan"},
+    "_get_users_paginated_tx": {"NodeByLabelScan"},
+    "_get_all_transactions_tx": {"NodeByLabelScan"},
+    "stream_users": {"NodeByLabelScan"},
+    "stream_transactions": {"NodeByLabelScan"},
+    "stream_user_identifiers": {"NodeByLabelScan"},
+    "_get_all_currencies_tx": {"NodeByLabelScan"},
+    "_get_transactions_paginated_tx": {"NodeByLabelScan"},
+    "_get_transaction_facets_tx": {"NodeByLabelScan"},
+    "_get_all_transaction_ids": {"NodeByLabelScan"},
+    "_get_transaction_pairs": {"NodeByLabelScan"},
+    "_get_all_nodes": {"AllNodesScan"},
+    "_get_all_relationships": {"AllNodesScan"},
+    "_get_transaction_transaction_rels": {"NodeByLabelScan"},
+    "app.py:export_graph_csv_batched": {"AllNodesScan"},
+    "migrate_identifier_nodes": {"NodeByLabelScan"},
+    "_get_export_bounds_tx": {"AllNodesScan"},
+    "stream_export_table": {"NodeByLabelScan", "AllNodesScan"},
+    "stream_money_flow_edges": {"NodeByLabelScan"},
+    "stream_money_flow_pairs": {"NodeByLabelScan"},
+    "_compute_centrality_gds_tx": {"NodeByLabelScan"},
+}
+
+DEFAULT_BASELINE = os.path.join(HERE, "plan_baseline.json")
+# Fixed so the fixture (and so its plans and db hits) is the same on every run
+FIXTURE_NOW = datetime(2024, 6, 1)
+CYPHER_START = re.compile(r"^(MATCH|OPTIONAL MATCH|MERGE|CREATE|UNWIND|CALL|WITH|RETURN)[\s(]")
+SCHEMA_PREFIXES = ("CREATE CONSTRAINT", "CREATE INDEX", "CREATE FULLTEXT", "DROP ")
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def query_key(label: str, text: str) -> str:
+    digest = hashlib.sha1(normalize(text).encode("utf-8")).hexdigest()[:10]
+    return f"{label}#{digest}"
+
+
+def operator_nodes(plan) -> list:
+    """(operator name, plan node) pairs, without the '@neo4j' runtime suffix."""
+    if not plan:
+        return []
+    nodes = [(plan.get("operatorType", "").split("@")[0], plan)]
+    for child in plan.get("children", []) or []:
+        nodes.extend(operator_nodes(child))
+    return nodes
+
+
+def is_violation(op: str, node: dict, allowed: set) -> bool:
+    if op not in FORBIDDEN or op in allowed:
+        return False
+    if op == "CartesianProduct":
+        # Joining two single-row id seeks (MATCH (a),(b) WHERE id(a)=.. AND id(b)=..)
+        # is harmless; only flag products where both sides can fan out
+        estimates = [
+            (child.get("args", {}) or {}).get("EstimatedRows", 2)
+            for child in node.get("children", []) or []
+        ]
+        return sum(1 for e in estimates if e > 1) > 1
+    return True
+
+
+def db_hits(plan) -> int:
+    if not plan:
+        return 0
+    return (plan.get("dbHits", 0) or 0) + sum(db_hits(c) for c in plan.get("children", []) or [])
+
+
+# ----- fixture -----
+
+def load_fixture(driver, users: int, transactions: int, seed: int, reset: bool):
+    with driver.session() as session:
+        existing = session.run("MATCH (n) RETURN count(n) AS c").single()["c"]
+        if existing and not reset:
+            sys.exit(f"database has {existing} nodes; pass --reset to wipe it for the fixture")
+        if existing:
+            session.run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS")
+
+        # Every fifth user shares an email, every seventh a phone
+        rows = [
+            {
+                "name": f"User{i}",
+                "email": f"user{i - i % 5}@x.com" if i % 5 == 1 else f"user{i}@x.com",
+                "phone": f"{1000000000 + i - i % 7}" if i % 7 == 1 else f"{1000000000 + i}",
+            }
+            for i in range(users)
+        ]
+        user_ids = bulk_users(session, rows)
+        tx_rows = generate_transactions(transactions, user_ids, seed=seed, now=FIXTURE_NOW)
+        for i in range(0, len(tx_rows), 5000):
+            bulk_transactions(session, tx_rows[i:i + 5000])
+        tx_ids = [r["id"] for r in session.run("MATCH (t:Transaction) RETURN id(t) AS id ORDER BY id LIMIT 10")]
+    return user_ids, tx_ids
+
+
+# ----- capture -----
+
+def driver_calls(db: Neo4jDriver, user_ids: list, tx_ids: list) -> list:
+    """One representative call per public Neo4jDriver method."""
+    a, b = user_ids[0], user_ids[1]
+    t = tx_ids[0]
+    ts = "2024-01-01T00:00:00"
+    return [
+        ("create_user", lambda: db.create_user("Plan Check", "user0@x.com", "1000000000")),
+        ("create_transaction", lambda: db.create_transaction(a, b, 10.0, "USD", ts, "plan", "dev-1")),
+        ("create_transaction", lambda: db.create_transaction(
+            a, b, 10.0, "USD", ts, "plan", "dev-1", external_id="plan-check-2")),
+        ("create_transactions_batch", lambda: db.create_transactions_batch([
+            {"fromId": a, "toId": b, "amount": 1.0, "currency": "USD",
+             "timestamp": ts, "description": "plan", "deviceId": "dev-2"},
+            {"fromId": a, "toId": b, "amount": 1.0, "currency": "USD",
+             "timestamp": ts, "description": "plan", "deviceId": "dev-2", "externalId": "plan-check-1"}
+        ])),
+        ("get_all_users", db.get_all_users),
+        ("get_users_paginated", lambda: db.get_users_paginated(1, 20, "user1")),
+        ("search_users", lambda: db.search_users("user1 x.com", 1, 20)),
+        ("search_transactions", lambda: db.search_transactions("auto", 1, 20)),
+        ("get_all_transactions", db.get_all_transactions),
+        ("stream_users", lambda: list(db.stream_users())),
+        ("stream_transactions", lambda: list(db.stream_transactions())),
+        ("get_device_transactions", lambda: db.get_device_transactions("dev-1", 1, 20)),
+        ("get_all_currencies", db.get_all_currencies),
+        ("set_risk_scores", lambda: db.set_risk_scores([{"id": t, "score": 0.5, "reasons": ["plan"]}])),
+        ("get_risky_transactions", lambda: db.get_risky_transactions(20, 0.1)),
+        ("get_transactions_paginated", lambda: db.get_transactions_paginated(
+            1, 20, 10.0, 1000.0, "USD", "2000-01-01", "2100-01-01", "auto", "dev-1")),
+        ("get_transaction_facets", lambda: (db.get_transaction_facets(),
+                                            db.get_transaction_facets(10.0, 1000.0, "USD", interval="day"))),
+        ("get_user_relationships", lambda: db.get_user_relationships(a)),
+        ("get_transaction_relationships", lambda: db.get_transaction_relationships(t)),
+        ("get_users_relationships", lambda: db.get_users_relationships([a, b])),
+        ("set_entity_keys", lambda: db.set_entity_keys([
+            {"id": a, "emailKey": "user0@x.com", "phoneKey": "1000000000",
+             "blocks": ["email:x.com:user", "phone:0000000"]}])),
+        ("stream_user_identifiers", lambda: list(db.stream_user_identifiers())),
+        ("get_pending_entity_users", lambda: db.get_pending_entity_users(100)),
+        ("get_unindexed_entity_users", lambda: db.get_unindexed_entity_users(100)),
+        ("get_entity_candidates", lambda: db.get_entity_candidates([a, b], 200)),
+        ("write_entity_links", lambda: db.write_entity_links(
+            [{"a": a, "b": b, "score": 1.0, "reasons": ["email"]}], [a])),
+        ("get_entity_matches", lambda: db.get_entity_matches(a)),
+        ("get_transactions_relationships", lambda: db.get_transactions_relationships([t])),
+        ("shortest_path_segments", lambda: db.shortest_path_segments(a, b)),
+        ("get_money_flow_edges", lambda: db.get_money_flow_edges([a, b], 10.0, 0, 2 ** 50)),
+        ("stream_money_flow_edges", lambda: list(db.stream_money_flow_edges(10.0))),
+        ("cluster_transactions", db.cluster_transactions),
+        ("get_cluster_summaries", lambda: db.get_cluster_summaries(1, 20)),
+        ("get_cluster_members", lambda: db.get_cluster_members(t, 1, 20)),
+        ("gds_available", db.gds_available),
+        ("compute_centrality_gds", lambda: db.compute_centrality_gds(["pageRank", "betweenness"], "plan-check", 16)),
+        ("stream_money_flow_pairs", lambda: list(db.stream_money_flow_pairs())),
+        ("write_user_scores", lambda: db.write_user_scores(
+            [{"id": a, "props": {"pageRank": 0.1, "centralityRunId": "plan-check"}}])),
+        ("clear_stale_user_scores", lambda: db.clear_stale_user_scores(["pageRank", "betweenness"], "plan-check")),
+        ("get_user_rankings", lambda: (db.get_user_rankings("pageRank", 1, 20),
+                                       db.get_user_rankings("betweenness", 1, 20))),
+        ("get_statistics", db.get_statistics),
+        ("export_graph", db.export_graph),
+        ("get_export_bounds", db.get_export_bounds),
+        ("export_partition", lambda: (db.export_partition("nodes", 0, 1000),
+                                      db.export_partition("relationships", 0, 1000))),
+        ("get_change_watermark", db.get_change_watermark),
+        ("stream_changes", lambda: list(db.stream_changes(0, 2 ** 62))),
+        ("stream_export_table", lambda: [list(db.stream_export_table(t)) for t in ("users", "transactions", "edges")]),
+        ("get_archivable_transactions", lambda: db.get_archivable_transactions("2000-01-01T00:00:00Z", 100)),
+        ("count_existing_transactions", lambda: db.count_existing_transactions([t])),
+        # Nothing is archived: the statements are planned with empty batches
+        ("archive_transactions", lambda: db.archive_transactions([], [])),
+    ]
+
+
+def capture_driver_queries(db: Neo4jDriver, user_ids: list, tx_ids: list):
+    captured = {}
+    errors = {}
+
+    def listener(function, text, params):
+        captured.setdefault(query_key(function, text), (function, text, params))
+
+    metrics.instrument_driver(Neo4jDriver)
+    metrics.query_listeners.append(listener)
+    calls = driver_calls(db, user_ids, tx_ids)
+    try:
+        for name, call in calls:
+            try:
+                call()
+            except Exception as e:
+                # A failing call (e.g. no path in the fixture) still ran its queries
+                errors[name] = str(e)
+    finally:
+        metrics.query_listeners.remove(listener)
+
+    public = {n for n in vars(Neo4jDriver) if not n.startswith("_") and callable(getattr(Neo4jDriver, n))}
+    unexercised = sorted(public - {name for name, _ in calls} - {"close", "ensure_schema", "migrate_identifier_nodes"})
+    return captured, errors, unexercised
+
+
+def literal_queries(paths: list) -> dict:
+    """Cypher string literals per file, labelled with their enclosing function."""
+    found = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        base = os.path.basename(path)
+
+        def visit(node, scope):
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    # Nested helpers (e.g. a route's generator) keep the route's name
+                    visit(child, child.name if scope == "<module>" else scope)
+                    continue
+                if isinstance(child, ast.JoinedStr):
+                    # f-string fragments are not runnable; these queries are
+                    # covered by the driver calls
+                    continue
+                if isinstance(child, ast.Constant) and isinstance(child.value, str):
+                    text = child.value.strip()
+                    if text.startswith(SCHEMA_PREFIXES):
+                        continue
+                    if CYPHER_START.match(text) and any(
+                        k in text for k in ("RETURN", "MERGE", "CREATE", "SET", "DELETE")
+                    ):
+                        label = scope if base == "database.py" else f"{base}:{scope}"
+                        found[query_key(label, text)] = (label, text, {})
+                visit(child, scope)
+
+        visit(tree, "<module>")
+    return found
+
+
+# ----- plans -----
+
+def explain(session, text: str, params: dict):
+    summary = session.run("EXPLAIN " + text, params).consume()
+    return summary.plan
+
+
+def profile(driver, text: str, params: dict):
+    with driver.session() as session:
+        tx = session.begin_transaction()
+        try:
+            summary = tx.run("PROFILE " + text, params).consume()
+            return summary.profile
+        finally:
+            tx.rollback()
+
+
+def check(driver, queries: dict, profiled: set, baseline: dict, tolerance: float) -> list:
+    results = []
+    with driver.session() as session:
+        for key, (label, text, params) in sorted(queries.items()):
+            entry = {"key": key, "label": label, "query": normalize(text)}
+            allowed = ALLOWED.get(label, set())
+            try:
+                plan = explain(session, text, params)
+            except Exception as e:
+                entry["error"] = f"EXPLAIN failed: {e}"
+                results.append(entry)
+                continue
+            nodes = operator_nodes(plan)
+            entry["operators"] = sorted({op for op, _ in nodes})
+            entry["forbidden"] = sorted({op for op, node in nodes if is_violation(op, node, allowed)})
+
+            if key in profiled and not text.lstrip().upper().startswith("CALL GDS"):
+                try:
+                    entry["dbHits"] = db_hits(profile(driver, text, params))
+                except Exception as e:
+                    entry["profileError"] = str(e)
+            base = baseline.get(key, {}).get("dbHits")
+            if base is not None and entry.get("dbHits") is not None:
+                entry["baselineDbHits"] = base
+                entry["regressed"] = entry["dbHits"] > base * (1 + tolerance) + 10
+            results.append(entry)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default=os.getenv("NEO4J_URI", "bolt://localhost:7687"))
+    parser.add_argument("--user", default=os.getenv("NEO4J_USER", "neo4j"))
+    parser.add_argument("--password", default=os.getenv("NEO4J_PASS", "password"))
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--transactions", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="wipe the database before loading the fixture")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative db-hit growth")
+    parser.add_argument("--report", help="write the full JSON report here")
+    args = parser.parse_args()
+    if not args.update_baseline and not os.path.exists(args.baseline):
+        # Without one every db-hit regression would pass unnoticed
+        sys.exit(f"no baseline at {args.baseline}; record it on the seeded fixture with --update-baseline")
+
+    db = Neo4jDriver(args.uri, args.user, args.password)
+    db.ensure_schema()
+    driver = GraphDatabase.driver(args.uri, auth=(args.user, args.password))
+    try:
+        user_ids, tx_ids = load_fixture(driver, args.users, args.transactions, args.seed, args.reset)
+        captured, call_errors, unexercised = capture_driver_queries(db, user_ids, tx_ids)
+
+        queries = dict(captured)
+        covered = {normalize(text) for _, text, _ in captured.values()}
+        backend = os.path.join(ROOT, "Backend")
+        for key, value in literal_queries([os.path.join(backend, "database.py"), os.path.join(backend, "app.py")]).items():
+            if normalize(value[1]) not in covered:
+                queries[key] = value
+
+        baseline = {}
+        if not args.update_baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+
+        results = check(driver, queries, set(captured), baseline, args.tolerance)
+    finally:
+        driver.close()
+        db.close()
+
+    failures = [r for r in results if r.get("forbidden") or r.get("regressed") or r.get("error")]
+    report = {
+        "fixture": {"users": args.users, "transactions": args.transactions, "seed": args.seed},
+        "queries": results,
+        "callErrors": call_errors,
+        "unexercisedMethods": unexercised,
+        "failures": len(failures),
+    }
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({r["key"]: {"label": r["label"], "dbHits": r.get("dbHits")} for r in results}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+
+    for r in results:
+        status = "FAIL" if r in failures else "ok"
+        detail = ", ".join(r.get("forbidden", [])) or r.get("error", "")
+        if r.get("regressed"):
+            detail = f"db hits {r['baselineDbHits']} -> {r['dbHits']}"
+        print(f"{status:4} {r['label']:40} {r.get('dbHits', '-'):>10} {detail}")
+    if unexercised:
+        print(f"Not exercised by driver_calls: {', '.join(unexercised)}")
+    sys.exit(1 if failures or unexercised else 0)
+
+
+if __name__ == "__main__":
+    main()
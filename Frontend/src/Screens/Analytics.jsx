@@ -102,7 +102,9 @@ export default function Analytics() {
                 label:
                   n.type === "User"
                     ? n.name
-                    : `Txn #${n.id}${n.deviceId ? ` (${n.deviceId})` : ""}`,
+                    : n.type === "Transaction"
+                    ? `Txn #${n.id}${n.deviceId ? ` (${n.deviceId})` : ""}`
+                    : `${n.type} ${n.name || n.deviceId || `#${n.id}`}`,
               },
             };
           }
@@ -1,17 +1,238 @@
-import random
-from datetime import datetime, timedelta
-
-def generate_transactions(n, user_ids):
-    out = []
-    now = datetime.now()
-    for i in range(n):
-        out.append({
-            "fromId": random.choice(user_ids),
-            "toId": random.choice(user_ids),
-            "amount": round(random.uniform(5, 5000), 2),
-            "currency": "USD",
-            "timestamp": (now - timedelta(minutes=i)).isoformat(),
-            "description": f"Auto tx {i}",
-            "deviceId": f"dev-{random.randint(1,3000)}"
-        })
-    return out
\ No newline at end of file
+"""
+Synthetic users and transactions for loading and benchmarks.
+
+Generation is vectorized with NumPy and seedable: with the same ``seed``,
+``now`` and ``batch_size`` the output is identical across runs.
+Transactions come as columnar batches (one array per field) yielded lazily,
+so a loader can stream millions of rows without materializing them;
+batch_rows() turns a batch into the row dicts the UNWIND loaders take.
+"""
+from datetime import datetime
+
+import numpy as np
+
+CURRENCIES = {"USD": 0.55, "EUR": 0.2, "GBP": 0.1, "INR": 0.08, "JPY": 0.05, "CHF": 0.02}
+
+
+def _resolve(source: np.ndarray) -> np.ndarray:
+    # Every entry points at an earlier one; follow the chains to their roots
+    while True:
+        nxt = source[source]
+        if np.array_equal(nxt, source):
+            return source
+        source = nxt
+
+
+def generate_users(num_users, seed=None, shared_email_rate=0.05, shared_phone_rate=0.05):
+    """
+    Columnar users: ``{"name", "email", "phone"}`` arrays. A fraction of users
+    reuse an earlier user's email or phone.
+    """
+    rng = np.random.default_rng(seed)
+    index = np.arange(num_users)
+    columns = {"name": np.char.add("bench-user-", index.astype(str))}
+    for field, rate, prefix, suffix in (
+        ("email", shared_email_rate, "user", "@example.com"),
+        ("phone", shared_phone_rate, "", ""),
+    ):
+        shared = (rng.random(num_users) < rate) & (index > 0)
+        source = np.where(shared, (rng.random(num_users) * index).astype(np.int64), index)
+        source = _resolve(source)
+        if field == "email":
+            columns[field] = np.char.add(np.char.add(prefix, source.astype(str)), suffix)
+        else:
+            columns[field] = (source + 2000000000).astype(str)
+    return columns
+
+
+def _activity_cdf(num_users, exponent, rng):
+    # Zipf-like: the k-th most active user has weight k^-s; ranks are shuffled
+    ranks = rng.permutation(num_users)
+    weights = 1.0 / (ranks + 1.0) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def _fraud_rings(num_users, num_transactions, rings, ring_size, ring_cycles, window_seconds,
+                 span_seconds, rng):
+    """
+    Loops A -> B -> ... -> A repeated ``ring_cycles`` times, each hop later
+    than the one before, inside ``window_seconds``, on one shared device per
+    ring, with slowly shrinking amounts. Returns the ring rows as columns plus
+    their target positions in the transaction sequence.
+    """
+    if rings <= 0 or num_users < ring_size:
+        return None
+    hops = ring_size * ring_cycles
+    members = np.stack([rng.choice(num_users, size=ring_size, replace=False) for _ in range(rings)])
+    senders = np.tile(members, ring_cycles)
+    receivers = np.tile(np.roll(members, -1, axis=1), ring_cycles)
+    start = rng.integers(window_seconds, span_seconds, size=rings)
+    # Offsets back from "now": the first hop is the oldest
+    steps = np.sort(rng.integers(0, window_seconds, size=(rings, hops)), axis=1)
+    ages = start[:, None] - steps
+    base = rng.lognormal(7.0, 0.5, size=rings)
+    amounts = base[:, None] * (0.97 ** np.arange(hops))[None, :]
+    total = rings * hops
+    return {
+        "fromIndex": senders.ravel(),
+        "toIndex": receivers.ravel(),
+        "amount": np.round(amounts.ravel(), 2),
+        "ageSeconds": ages.ravel(),
+        "deviceId": np.repeat(np.char.add("dev-ring-", np.arange(rings).astype(str)), hops),
+        "ringId": np.repeat(np.arange(rings), hops),
+        "position": rng.choice(num_transactions, size=min(total, num_transactions), replace=False),
+    }
+
+
+def generate_transaction_batches(
+    num_users, num_transactions, batch_size=100000, seed=None, activity_exponent=1.2,
+    devices_per_user=3, shared_device_rate=0.1, currencies=None, days=90, now=None,
+    fraud_rings=0, ring_size=4, ring_cycles=3, ring_window_hours=24
+):
+    """
+    Yield transaction batches as column arrays: ``fromIndex``, ``toIndex``
+    (indexes into the user list), ``amount``, ``currency``, ``timestamp``
+    (datetime64[s]), ``deviceId`` and ``ringId`` (-1 outside fraud rings).
+
+    Sender and receiver activity follow a power law. Each user owns one to
+    ``devices_per_user`` devices and a fraction of transactions use a device
+    from a pool shared across users. Amounts are log-normal. ``fraud_rings``
+    loops of ``ring_size`` users are mixed in at random positions.
+    """
+    rng = np.random.default_rng(seed)
+    currencies = currencies or CURRENCIES
+    currency_names = np.array(list(currencies))
+    currency_p = np.array([currencies[c] for c in currency_names], dtype=np.float64)
+    currency_p /= currency_p.sum()
+
+    cdf = _activity_cdf(num_users, activity_exponent, rng)
+    device_counts = rng.integers(1, devices_per_user + 1, size=num_users)
+    shared_pool = max(1, num_users // 50)
+    span = days * 24 * 3600
+    now = np.datetime64(now or datetime.now(), "s")
+    rings = _fraud_rings(num_users, num_transactions, fraud_rings, ring_size, ring_cycles,
+                         int(ring_window_hours * 3600), span, rng)
+    if rings is not None:
+        # Positions ascending so each batch takes a contiguous slice; rows
+        # beyond num_transactions (tiny datasets) are dropped
+        order = np.argsort(rings["position"])
+        rings = {k: v[:len(order)][order] for k, v in rings.items()}
+
+    for start in range(0, num_transactions, batch_size):
+        size = min(batch_size, num_transactions - start)
+        senders = np.searchsorted(cdf, rng.random(size), side="right")
+        receivers = np.searchsorted(cdf, rng.random(size), side="right")
+        # No self-transfers
+        receivers = np.where(receivers == senders, (receivers + 1) % num_users, receivers)
+
+        own = (rng.random(size) * device_counts[senders]).astype(np.int64)
+        own_devices = np.char.add(np.char.add(np.char.add("dev-", senders.astype(str)), "-"), own.astype(str))
+        shared = np.char.add("dev-shared-", rng.integers(0, shared_pool, size=size).astype(str))
+        devices = np.where(rng.random(size) < shared_device_rate, shared, own_devices).astype(object)
+
+        amounts = np.round(np.minimum(rng.lognormal(4.0, 1.2, size=size), 250000.0), 2)
+        ages = rng.integers(0, span, size=size)
+        batch_currencies = rng.choice(currency_names, size=size, p=currency_p)
+        ring_ids = np.full(size, -1, dtype=np.int64)
+
+        if rings is not None:
+            lo, hi = np.searchsorted(rings["position"], [start, start + size])
+            if hi > lo:
+                at = rings["position"][lo:hi] - start
+                senders[at] = rings["fromIndex"][lo:hi]
+                receivers[at] = rings["toIndex"][lo:hi]
+                amounts[at] = rings["amount"][lo:hi]
+                ages[at] = rings["ageSeconds"][lo:hi]
+                devices[at] = rings["deviceId"][lo:hi]
+                ring_ids[at] = rings["ringId"][lo:hi]
+                batch_currencies[at] = "USD"
+
+        yield {
+            "fromIndex": senders,
+            "toIndex": receivers,
+            "amount": amounts,
+            "currency": batch_currencies,
+            "timestamp": now - ages.astype("timedelta64[s]"),
+            "deviceId": devices.astype(str),
+            "ringId": ring_ids,
+            "offset": start,
+        }
+
+
+def batch_rows(batch, user_ids=None):
+    """
+    Row dicts for the UNWIND loaders. With ``user_ids`` (node id per user
+    index) rows carry ``fromId`` / ``toId``; otherwise ``fromIndex`` /
+    ``toIndex``.
+    """
+    timestamps = np.datetime_as_string(batch["timestamp"], unit="s")
+    if user_ids is not None:
+        ids = np.asarray(user_ids)
+        senders, receivers = ids[batch["fromIndex"]].tolist(), ids[batch["toIndex"]].tolist()
+        from_key, to_key = "fromId", "toId"
+    else:
+        senders, receivers = batch["fromIndex"].tolist(), batch["toIndex"].tolist()
+        from_key, to_key = "fromIndex", "toIndex"
+    offset = batch["offset"]
+    return [
+        {
+            from_key: s, to_key: r, "amount": a, "currency": c, "timestamp": t,
+            "description": f"Bench tx {offset + i}", "deviceId": d
+        }
+        for i, (s, r, a, c, t, d) in enumerate(zip(
+            senders, receivers, batch["amount"].tolist(), batch["currency"].tolist(),
+            timestamps.tolist(), batch["deviceId"].tolist()
+        ))
+    ]
+
+
+def user_rows(users):
+    """Row dicts for bulk_users from generate_users() columns."""
+    return [
+        {"name": n, "email": e, "phone": p}
+        for n, e, p in zip(users["name"].tolist(), users["email"].tolist(), users["phone"].tolist())
+    ]
+
+
+def generate_transactions(n, user_ids, seed=None, now=None):
+    """
+    ``n`` uniformly random transactions between ``user_ids``, newest first,
+    one minute apart ending at ``now`` (default: the current time).
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.asarray(user_ids)
+    senders = ids[rng.integers(0, len(ids), size=n)].tolist()
+    receivers = ids[rng.integers(0, len(ids), size=n)].tolist()
+    amounts = np.round(rng.uniform(5, 5000, size=n), 2).tolist()
+    now = np.datetime64(now or datetime.now(), "us")
+    timestamps = np.datetime_as_string(now - np.arange(n).astype("timedelta64[m]"), unit="us").tolist()
+    devices = np.char.add("dev-", rng.integers(1, 3001, size=n).astype(str)).tolist()
+    return [
+        {
+            "fromId": s, "toId": r, "amount": a, "currency": "USD", "timestamp": t,
+            "description": f"Auto tx {i}", "deviceId": d
+        }
+        for i, (s, r, a, t, d) in enumerate(zip(senders, receivers, amounts, timestamps, devices))
+    ]
+
+
+def generate_dataset(
+    num_users, num_transactions, seed=None, activity_exponent=1.2,
+    shared_email_rate=0.05, shared_phone_rate=0.05, shared_device_rate=0.1,
+    currencies=None, days=90, now=None, fraud_rings=0
+):
+    """
+    Skewed synthetic dataset, materialized: ``(users, rows)`` where rows
+    reference users by index as ``fromIndex`` / ``toIndex``. Use
+    generate_users() and generate_transaction_batches() to stream instead.
+    """
+    users = generate_users(num_users, seed, shared_email_rate, shared_phone_rate)
+    rows = []
+    for batch in generate_transaction_batches(
+        num_users, num_transactions, seed=seed, activity_exponent=activity_exponent,
+        shared_device_rate=shared_device_rate, currencies=currencies, days=days, now=now,
+        fraud_rings=fraud_rings
+    ):
+        rows.extend(batch_rows(batch))
+    return user_rows(users), rows
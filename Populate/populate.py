@@ -1,24 +1,58 @@
 from neo4j import GraphDatabase
 import json
 import os
-from generate_rows import generate_transactions
+import uuid
+from generate_rows import batch_rows, generate_transaction_batches, generate_users, user_rows
 
 
 URI      = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
 USER     = os.getenv("NEO4J_USER", "neo4j")
 PASSWORD = os.getenv("NEO4J_PASS", "password")
 
-driver = GraphDatabase.driver(URI, auth=(USER, PASSWORD))
+NUM_USERS        = int(os.getenv("POPULATE_USERS", "500"))
+NUM_TRANSACTIONS = int(os.getenv("POPULATE_TRANSACTIONS", "100000"))
+FRAUD_RINGS      = int(os.getenv("POPULATE_FRAUD_RINGS", "10"))
+SEED             = int(os.getenv("POPULATE_SEED")) if os.getenv("POPULATE_SEED") else None
+BATCH            = 5000
+
+def create_constraints(session):
+    # Identifier nodes are MERGEd per row; the constraints make that an index seek
+    for statement in [
+        "CREATE CONSTRAINT device_id IF NOT EXISTS FOR (d:Device) REQUIRE d.deviceId IS UNIQUE",
+        "CREATE CONSTRAINT email_address IF NOT EXISTS FOR (e:Email) REQUIRE e.address IS UNIQUE",
+        "CREATE CONSTRAINT phone_number IF NOT EXISTS FOR (p:Phone) REQUIRE p.number IS UNIQUE",
+        "CREATE CONSTRAINT user_ingest_key IF NOT EXISTS FOR (u:User) REQUIRE u.ingestKey IS UNIQUE",
+    ]:
+        session.run(statement).consume()
 
 def bulk_users(session, user_rows):
-    session.run("""
+    """
+    Create one User per row and return their ids in row order. Each row gets
+    a fresh ingestKey, so ids map back to rows even when names repeat or the
+    database already holds users from an earlier load.
+    """
+    rows = [dict(row, ingestKey=uuid.uuid4().hex) for row in user_rows]
+    result = session.run("""
         UNWIND $rows AS row
-        CREATE (:User {
+        CREATE (u:User {
             name: row.name,
             email: row.email,
-            phone: row.phone
+            phone: row.phone,
+            ingestKey: row.ingestKey,
+            entityPending: true,
+            createdAt: timestamp(),
+            updatedAt: timestamp()
         })
-    """, rows=user_rows)
+        MERGE (e:Email { address: row.email })
+        ON CREATE SET e.createdAt = timestamp(), e.updatedAt = timestamp()
+        CREATE (u)-[:HAS_EMAIL { createdAt: timestamp(), updatedAt: timestamp() }]->(e)
+        MERGE (p:Phone { number: row.phone })
+        ON CREATE SET p.createdAt = timestamp(), p.updatedAt = timestamp()
+        CREATE (u)-[:HAS_PHONE { createdAt: timestamp(), updatedAt: timestamp() }]->(p)
+        RETURN row.ingestKey AS key, id(u) AS id
+    """, rows=rows)
+    ids = {r["key"]: r["id"] for r in result}
+    return [ids[row["ingestKey"]] for row in rows]
 
 def fetch_user_ids(session):
     recs = session.run("MATCH (u:User) RETURN id(u) AS id")
@@ -34,57 +68,42 @@ def bulk_transactions(session, tx_rows):
             currency: tx.currency,
             timestamp: datetime(tx.timestamp),
             description: tx.description,
-            deviceId: tx.deviceId
+            deviceId: tx.deviceId,
+            deviceIdLower: toLower(tx.deviceId),
+            createdAt: timestamp(),
+            updatedAt: timestamp()
         })
-        CREATE (u1)-[:SENT]->(t)
-        CREATE (t)-[:RECEIVED_BY]->(u2)
+        CREATE (u1)-[:SENT { createdAt: timestamp(), updatedAt: timestamp() }]->(t)
+        CREATE (t)-[:RECEIVED_BY { createdAt: timestamp(), updatedAt: timestamp() }]->(u2)
+        MERGE (d:Device { deviceId: tx.deviceId })
+        ON CREATE SET d.createdAt = timestamp(), d.updatedAt = timestamp()
+        CREATE (t)-[:USED_DEVICE { createdAt: timestamp(), updatedAt: timestamp() }]->(d)
     """, rows=tx_rows)
 
-def build_shared(session):
-    session.run("""
-        MATCH (u1:User),(u2:User)
-        WHERE u1.email = u2.email AND id(u1) < id(u2)
-        MERGE (u1)-[:SHARED_EMAIL]-(u2)
-    """)
-
-    session.run("""
-        MATCH (u1:User),(u2:User)
-        WHERE u1.phone = u2.phone AND id(u1) < id(u2)
-        MERGE (u1)-[:SHARED_PHONE]-(u2)
-    """)
-
-    session.run("""
-        MATCH (t:Transaction)
-        WITH t.deviceId AS did, collect(t) AS txs
-        UNWIND range(0, size(txs)-2) AS i
-        WITH txs[i] AS a, txs[i+1] AS b
-        MERGE (a)-[:SHARED_DEVICE]->(b)
-    """)
-
 def main():
+    driver = GraphDatabase.driver(URI, auth=(USER, PASSWORD))
     with driver.session() as session:
-        # 1. Pre-create users (small dataset)
-        users = [
-            {"name": f"User{i}", "email": f"user{i}@x.com", "phone": f"{1000000000+i}"}
-            for i in range(500)                                  # choose any number
-        ]
-        bulk_users(session, users)
-
-        # 2. Fetch real ids
-        user_ids = fetch_user_ids(session)
+        create_constraints(session)
 
-        # 3. Generate 100k transactions
-        tx_data = generate_transactions(100000, user_ids)
+        # 1. Pre-create users; ids come back in generator index order
+        users = user_rows(generate_users(NUM_USERS, seed=SEED))
+        user_ids = []
+        for i in range(0, len(users), BATCH):
+            user_ids.extend(bulk_users(session, users[i:i+BATCH]))
 
-        # 4. Insert in batches
-        BATCH = 5000
-        for i in range(0, len(tx_data), BATCH):
-            chunk = tx_data[i:i+BATCH]
-            bulk_transactions(session, chunk)
-            print("Insert", i + len(chunk))
+        # 2. Generate and insert transactions batch by batch; nothing beyond
+        #    one batch is held in memory
+        inserted = 0
+        for batch in generate_transaction_batches(
+            NUM_USERS, NUM_TRANSACTIONS, batch_size=BATCH, seed=SEED, fraud_rings=FRAUD_RINGS
+        ):
+            bulk_transactions(session, batch_rows(batch, user_ids))
+            inserted += len(batch["amount"])
+            print("Insert", inserted)
 
-        # 5. Build shared-* edges once
-        #build_shared(session).  // Ommitted now causing memory issues on 100000 transactions
+        # Shared email/phone/device links are made per row through the
+        # Email / Phone / Device nodes, so there is no quadratic post-pass
+    driver.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Replay a transaction dump (CSV or NDJSON, optionally gzipped) into Neo4j.
+
+The file is read in chunks with pandas, so memory is bounded by the chunk
+size. Sender and receiver are external identifiers (email, phone, name or
+graph id) resolved through an id map loaded once at start. Each chunk is
+validated and coerced column-wise; rows that fail are counted and skipped.
+Valid rows are written in batched UNWIND transactions.
+
+Every written transaction is MERGEd on its ``externalId`` when the dump has
+one, otherwise on an ``ingestKey`` derived from the file and row number. After
+each batch the number of rows consumed goes to a checkpoint file. A restarted
+replay skips that many rows and a batch that committed just before a crash is
+matched instead of duplicated.
+
+Usage:
+    python replay.py transactions-2025-01-01.csv.gz
+    python replay.py feed.ndjson --user-key phone --map from=sender,to=recipient
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+from neo4j import GraphDatabase
+
+FIELDS = ("from", "to", "amount", "currency", "timestamp", "description", "deviceId", "externalId")
+REQUIRED = ("from", "to", "amount", "timestamp")
+
+# One literal query per key so each is a plain label scan with a projection
+USER_KEY_QUERIES = {
+    "id": "MATCH (u:User) RETURN toString(id(u)) AS key, id(u) AS id",
+    "email": "MATCH (u:User) WHERE u.email IS NOT NULL RETURN u.email AS key, id(u) AS id ORDER BY id",
+    "phone": "MATCH (u:User) WHERE u.phone IS NOT NULL RETURN u.phone AS key, id(u) AS id ORDER BY id",
+    "name": "MATCH (u:User) WHERE u.name IS NOT NULL RETURN u.name AS key, id(u) AS id ORDER BY id",
+}
+
+DEVICE_LINK = """
+    FOREACH (_ IN CASE WHEN tx.deviceId <> '' THEN [1] ELSE [] END |
+        MERGE (d:Device { deviceId: tx.deviceId })
+        ON CREATE SET d.createdAt = timestamp(), d.updatedAt = timestamp()
+        MERGE (t)-[ud:USED_DEVICE]->(d)
+        ON CREATE SET ud.createdAt = timestamp(), ud.updatedAt = timestamp()
+    )
+"""
+
+TRANSACTION_PROPERTIES = """
+        t.amount = tx.amount,
+        t.currency = tx.currency,
+        t.timestamp = datetime(tx.timestamp),
+        t.description = tx.description,
+        t.deviceId = tx.deviceId,
+        t.deviceIdLower = toLower(tx.deviceId),
+        t.createdAt = timestamp(),
+        t.updatedAt = timestamp()
+"""
+
+REPLAY_BY_EXTERNAL_ID = """
+    UNWIND $rows AS tx
+    MATCH (u1:User) WHERE id(u1) = tx.fromId
+    MATCH (u2:User) WHERE id(u2) = tx.toId
+    MERGE (t:Transaction { externalId: tx.externalId })
+    ON CREATE SET""" + TRANSACTION_PROPERTIES + """
+    MERGE (u1)-[s:SENT]->(t)
+    ON CREATE SET s.createdAt = timestamp(), s.updatedAt = timestamp()
+    MERGE (t)-[r:RECEIVED_BY]->(u2)
+    ON CREATE SET r.createdAt = timestamp(), r.updatedAt = timestamp()
+""" + DEVICE_LINK
+
+REPLAY_BY_INGEST_KEY = """
+    UNWIND $rows AS tx
+    MATCH (u1:User) WHERE id(u1) = tx.fromId
+    MATCH (u2:User) WHERE id(u2) = tx.toId
+    MERGE (t:Transaction { ingestKey: tx.ingestKey })
+    ON CREATE SET""" + TRANSACTION_PROPERTIES + """
+    MERGE (u1)-[s:SENT]->(t)
+    ON CREATE SET s.createdAt = timestamp(), s.updatedAt = timestamp()
+    MERGE (t)-[r:RECEIVED_BY]->(u2)
+    ON CREATE SET r.createdAt = timestamp(), r.updatedAt = timestamp()
+""" + DEVICE_LINK
+
+
+def fingerprint(path: str) -> str:
+    """Size plus a hash of the first MiB: stable for a file, distinct across dumps."""
+    digest = hashlib.sha1(str(os.path.getsize(path)).encode("ascii"))
+    with open(path, "rb") as f:
+        digest.update(f.read(1 << 20))
+    return digest.hexdigest()[:16]
+
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "ndjson" if name.endswith((".ndjson", ".jsonl", ".json")) else "csv"
+
+
+def read_chunks(path: str, fmt: str, chunk_size: int):
+    if fmt == "csv":
+        # Everything as text; coercion happens per column below
+        return pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False, compression="infer")
+    return pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False, compression="infer")
+
+
+def load_user_map(session, key: str) -> dict:
+    """External identifier -> node id. Duplicates keep the lowest id."""
+    id_map = {}
+    for record in session.run(USER_KEY_QUERIES[key]):
+        id_map.setdefault(str(record["key"]), record["id"])
+    return id_map
+
+
+def coerce(chunk, columns: dict, id_map: dict, timestamp_format: str, first_row: int, file_key: str):
+    """
+    Validated rows of one chunk as UNWIND parameters, their file row numbers,
+    and the rejection reason of every invalid row indexed by its row number.
+    ``first_row`` is the file row number of the chunk's first row.
+    """
+    frame = pd.DataFrame(index=chunk.index)
+    for field in FIELDS:
+        source = columns.get(field, field)
+        frame[field] = chunk[source] if source in chunk.columns else ""
+
+    from_ids = frame["from"].astype(str).str.strip().map(id_map)
+    to_ids = frame["to"].astype(str).str.strip().map(id_map)
+    amounts = pd.to_numeric(frame["amount"], errors="coerce")
+    if timestamp_format in ("s", "ms", "us"):
+        timestamps = pd.to_datetime(pd.to_numeric(frame["timestamp"], errors="coerce"),
+                                    unit=timestamp_format, utc=True, errors="coerce")
+    else:
+        timestamps = pd.to_datetime(frame["timestamp"], format=timestamp_format, utc=True, errors="coerce")
+
+    checks = {
+        "unknown_sender": from_ids.isna(),
+        "unknown_receiver": to_ids.isna(),
+        "bad_amount": amounts.isna() | (amounts <= 0),
+        "bad_timestamp": timestamps.isna(),
+    }
+    reasons = pd.Series("", index=frame.index)
+    # Each row is reported under the first check it fails
+    for reason, mask in reversed(list(checks.items())):
+        reasons[mask] = reason
+    valid = reasons == ""
+    file_rows = pd.RangeIndex(first_row, first_row + len(frame))
+    rejected = pd.Series(reasons[~valid].to_numpy(), index=file_rows[(~valid).to_numpy()])
+
+    external = frame["externalId"].fillna("").astype(str).str.strip()[valid]
+    row_numbers = file_rows[valid.to_numpy()]
+    out = pd.DataFrame({
+        "fromId": from_ids[valid].astype("int64"),
+        "toId": to_ids[valid].astype("int64"),
+        "amount": amounts[valid].round(2).astype("float64"),
+        "currency": frame["currency"][valid].fillna("").astype(str).str.strip().str.upper().replace("", "USD"),
+        "timestamp": timestamps[valid].dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "description": frame["description"][valid].fillna("").astype(str),
+        "deviceId": frame["deviceId"][valid].fillna("").astype(str).str.strip(),
+        "externalId": external,
+        "ingestKey": [f"replay:{file_key}:{n}" for n in row_numbers],
+    })
+    return out.to_dict("records"), list(row_numbers), rejected
+
+
+def write_batch(tx, rows: list):
+    by_external = [r for r in rows if r["externalId"]]
+    by_ingest = [r for r in rows if not r["externalId"]]
+    if by_external:
+        tx.run(REPLAY_BY_EXTERNAL_ID, rows=by_external).consume()
+    if by_ingest:
+        tx.run(REPLAY_BY_INGEST_KEY, rows=by_ingest).consume()
+
+
+class Checkpoint:
+    def __init__(self, path: str, file_key: str):
+        self.path = path
+        self.file_key = file_key
+        self.rows = 0
+        self.written = 0
+        self.rejected = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("fingerprint") == file_key:
+                self.rows = state["rows"]
+                self.written = state["written"]
+                self.rejected = state.get("rejected", {})
+            else:
+                print(f"Checkpoint {path} belongs to another file; starting from the beginning", file=sys.stderr)
+
+    def advance(self, position: int, rejected):
+        """Mark every row before ``position`` done, counting the rejected ones among them."""
+        skipped = rejected[(rejected.index >= self.rows) & (rejected.index < position)]
+        for reason, count in skipped.value_counts().items():
+            self.rejected[reason] = self.rejected.get(reason, 0) + int(count)
+        self.rows = position
+        self.save()
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "fingerprint": self.file_key, "rows": self.rows, "written": self.written,
+                "rejected": self.rejected, "updatedAt": time.time()
+            }, f)
+        os.replace(tmp, self.path)
+
+
+class Throughput:
+    """Overall and recent rows/sec, printed at most every ``interval`` seconds."""
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self.started = self.window_start = time.perf_counter()
+        self.total = self.window_rows = 0
+
+    def add(self, rows: int, position: int):
+        self.total += rows
+        self.window_rows += rows
+        now = time.perf_counter()
+        if now - self.window_start >= self.interval:
+            recent = self.window_rows / (now - self.window_start)
+            print(f"row {position}: {self.total} written, {recent:,.0f} rows/s now, "
+                  f"{self.sustained():,.0f} rows/s sustained", file=sys.stderr)
+            self.window_start = now
+            self.window_rows = 0
+
+    def sustained(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.total / elapsed if elapsed > 0 else 0.0
+
+
+def parse_map(value: str) -> dict:
+    columns = {}
+    for item in (value or "").split(","):
+        field, _, source = item.partition("=")
+        if field.strip() and source.strip():
+            if field.strip() not in FIELDS:
+                raise SystemExit(f"unknown field in --map: {field.strip()} (fields: {', '.join(FIELDS)})")
+            columns[field.strip()] = source.strip()
+    return columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a CSV / NDJSON transaction dump into Neo4j")
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="default: from the file name")
+    parser.add_argument("--user-key", choices=sorted(USER_KEY_QUERIES), default="email",
+                        help="User property the from / to columns refer to")
+    parser.add_argument("--map", default="", help="field=column pairs, e.g. from=sender,to=recipient")
+    parser.add_argument("--timestamp-format", default="ISO8601",
+                        help="strftime format, ISO8601, or s / ms / us for epoch numbers")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="rows parsed and validated at once")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per write transaction")
+    parser.add_argument("--checkpoint", help="default: <file>.checkpoint.json")
+    parser.add_argument("--uri", default=os.getenv("NEO4J_URI", "bolt://neo4j:7687"))
+    parser.add_argument("--user", default=os.getenv("NEO4J_USER", "neo4j"))
+    parser.add_argument("--password", default=os.getenv("NEO4J_PASS", "password"))
+    args = parser.parse_args()
+
+    columns = parse_map(args.map)
+    fmt = args.format or detect_format(args.file)
+    file_key = fingerprint(args.file)
+    checkpoint = Checkpoint(args.checkpoint or args.file + ".checkpoint.json", file_key)
+    if checkpoint.rows:
+        print(f"Resuming after row {checkpoint.rows} ({checkpoint.written} written)", file=sys.stderr)
+
+    driver = GraphDatabase.driver(args.uri, auth=(args.user, args.password))
+    try:
+        with driver.session() as session:
+            start = time.perf_counter()
+            id_map = load_user_map(session, args.user_key)
+            print(f"Loaded {len(id_map)} user keys by {args.user_key} in {time.perf_counter() - start:.1f}s",
+                  file=sys.stderr)
+
+            throughput = Throughput()
+            position = 0
+            for chunk in read_chunks(args.file, fmt, args.chunk_size):
+                chunk_start = position
+                position += len(chunk)
+                if position <= checkpoint.rows:
+                    continue
+                if chunk_start < checkpoint.rows:
+                    chunk = chunk.iloc[checkpoint.rows - chunk_start:]
+                    chunk_start = checkpoint.rows
+                missing = [c for c in REQUIRED if columns.get(c, c) not in chunk.columns]
+                if missing:
+                    raise SystemExit(f"missing columns: {', '.join(columns.get(c, c) for c in missing)}")
+
+                rows, row_numbers, rejected = coerce(
+                    chunk, columns, id_map, args.timestamp_format, chunk_start, file_key
+                )
+                for i in range(0, len(rows), args.batch_size):
+                    batch = rows[i:i + args.batch_size]
+                    session.execute_write(write_batch, batch)
+                    checkpoint.written += len(batch)
+                    # The last batch of a chunk also covers the rejected rows after it
+                    last = i + len(batch) >= len(rows)
+                    checkpoint.advance(position if last else row_numbers[i + len(batch) - 1] + 1, rejected)
+                    throughput.add(len(batch), checkpoint.rows)
+                if not rows:
+                    checkpoint.advance(position, rejected)
+    finally:
+        driver.close()
+
+    print(json.dumps({
+        "file": args.file,
+        "rows": checkpoint.rows,
+        "written": checkpoint.written,
+        "rejected": checkpoint.rejected,
+        "rowsPerSecond": round(throughput.sustained(), 1),
+    }))
+
+
+if __name__ == "__main__":
+    main()